@@ -2,17 +2,55 @@
 
 Installed as the ``check-my-sample-sheet`` command (see pyproject.toml). Any
 extra arguments are forwarded to ``streamlit run`` (e.g. ``--server.port``).
+
+Subcommands:
+
+- ``check-my-sample-sheet validate FILES...``: validate sheets without the web
+  interface (see :mod:`check_my_sample_sheet.batch`).
+- ``check-my-sample-sheet serve``: JSON HTTP validation API (see
+  :mod:`check_my_sample_sheet.api`).
+- ``check-my-sample-sheet benchmark``: time the validation stages on synthetic
+  sheets (see :mod:`check_my_sample_sheet.benchmark`).
+- ``check-my-sample-sheet watch DIRECTORIES...``: validate the sheets of run folders
+  as they are written (see :mod:`check_my_sample_sheet.watch`).
+- ``check-my-sample-sheet loadtest``: throughput, latency and memory of the web app
+  under concurrent sessions (see :mod:`check_my_sample_sheet.loadtest`).
 """
 import sys
 from pathlib import Path
 
-from streamlit.web import cli as stcli
 
+def run_streamlit(args):
+    from streamlit.web import cli as stcli
 
-def main():
     app = str(Path(__file__).resolve().parent / "app.py")
-    sys.argv = ["streamlit", "run", app, *sys.argv[1:]]
-    sys.exit(stcli.main())
+    sys.argv = ["streamlit", "run", app, *args]
+    return stcli.main()
+
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] == "validate":
+        from check_my_sample_sheet.batch import main as validate
+
+        sys.exit(validate(args[1:]))
+    if args and args[0] == "serve":
+        from check_my_sample_sheet.api import main as serve
+
+        sys.exit(serve(args[1:]))
+    if args and args[0] == "benchmark":
+        from check_my_sample_sheet.benchmark import main as benchmark
+
+        sys.exit(benchmark(args[1:]))
+    if args and args[0] == "watch":
+        from check_my_sample_sheet.watch import main as watch
+
+        sys.exit(watch(args[1:]))
+    if args and args[0] == "loadtest":
+        from check_my_sample_sheet.loadtest import main as loadtest
+
+        sys.exit(loadtest(args[1:]))
+    sys.exit(run_streamlit(args))
 
 
 if __name__ == "__main__":
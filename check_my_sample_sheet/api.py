@@ -0,0 +1,335 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""JSON HTTP API for machine clients: ``check-my-sample-sheet serve``.
+
+Endpoints:
+
+- ``POST /validate``: the body is the sample sheet (plain text) or a JSON object
+  ``{"samplesheet": "..."}``. The response is the JSON record of
+  :meth:`~check_my_sample_sheet.validation.ValidationResult.to_dict`, plus the
+  ``cross_run`` checks when the history is enabled (see :mod:`check_my_sample_sheet.history`).
+  With ``?format=json``, ``ndjson`` or ``html``, the response is the typed report of
+  the checks in that format instead (see :mod:`check_my_sample_sheet.results`).
+- ``GET /health``: liveness and queue occupancy.
+- ``GET /metrics``: stage timings and sheet sizes in the Prometheus text format
+  (see :mod:`check_my_sample_sheet.metrics`).
+
+Each validation runs in its own worker process, a
+:class:`~check_my_sample_sheet.worker.ValidationJob` with the time and memory limits of
+the service: a worker that reaches one is killed, and the server answers ``504``
+(time) or ``422`` (memory). At most ``workers`` validations run at once and
+``workers + queue_size`` are accepted; beyond that the server answers ``503`` with a
+``Retry-After`` header instead of queuing without limit. Sheets already validated are
+answered from the result cache without using a worker.
+Only the standard library is used; the server is meant to run behind a reverse proxy.
+"""
+import argparse
+import json
+import os
+import threading
+import urllib.parse
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from check_my_sample_sheet import config, metrics
+from check_my_sample_sheet.history import cross_run_checks
+from check_my_sample_sheet.results import EXPORT_FORMATS, export_report
+from check_my_sample_sheet.validation import (
+    get_validation_cache,
+    normalize_sample_sheet,
+    sample_sheet_digest,
+)
+from check_my_sample_sheet.worker import (
+    MEMORY_LIMIT,
+    ValidationCancelled,
+    ValidationJob,
+    ValidationLimitExceeded,
+    ValidationTimeout,
+)
+
+MAX_BODY_SIZE = config.get("API_MAX_BODY_SIZE", 10 * 1024 * 1024, int)
+
+
+class ServiceBusy(Exception):
+    """Raised when the validation queue is full."""
+
+
+class ValidationService:
+    """Run validations in worker processes, a bounded number at once.
+
+    Parameters:
+    workers (int): number of validations running at once.
+    queue_size (int): number of validations allowed to wait for a worker.
+    timeout (float): seconds allowed to a running validation; its worker is killed then.
+    memory_limit (int): memory allowed to a worker, in MB (0 for no limit); defaults to
+        ``CHECK_MY_SAMPLE_SHEET_MEMORY_LIMIT``.
+    """
+
+    def __init__(self, workers=None, queue_size=None, timeout=60, memory_limit=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = self.workers * 4 if queue_size is None else queue_size
+        self.timeout = timeout
+        self.memory_limit = MEMORY_LIMIT if memory_limit is None else memory_limit
+        # running jobs, and jobs accepted (running or waiting for a running slot)
+        self._running = threading.BoundedSemaphore(self.workers)
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._jobs = set()
+        self.pending = 0
+
+    def validate(self, samplesheet):
+        """Return the result of *samplesheet* as a dict, with ``cached`` telling whether a worker was used.
+
+        Raises ServiceBusy when the queue is full, and the errors of
+        :meth:`ValidationJob.result <check_my_sample_sheet.worker.ValidationJob.result>`
+        (e.g. ValidationTimeout) when the validation did not produce a result.
+        """
+        return self._record(*self.validate_result(samplesheet))
+
+    def validate_result(self, samplesheet):
+        """Return a tuple (ValidationResult, cached) for *samplesheet*; see :meth:`validate`."""
+        samplesheet = normalize_sample_sheet(samplesheet)
+        digest = sample_sheet_digest(samplesheet)
+        cache = get_validation_cache()
+        result = cache.get(digest)
+        if result is not None:
+            return result, True
+
+        if not self._slots.acquire(blocking=False):
+            raise ServiceBusy()
+        job = None
+        try:
+            with self._lock:
+                self.pending += 1
+            job = ValidationJob(
+                samplesheet, time_limit=self.timeout, memory_limit=self.memory_limit, slots=self._running
+            )
+            with self._lock:
+                self._jobs.add(job)
+            # the job ends with its worker: killed when it reaches a limit
+            result = job.result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self._jobs.discard(job)
+            self._slots.release()
+
+        # the stages ran in a worker process: report them to this process' registry
+        metrics.record(result.timings)
+        metrics.observe_sheet(samplesheet, 0 if result.df is None else len(result.df))
+        cache.set(digest, result)
+        return result, False
+
+    def _record(self, result, cached):
+        record = {**result.to_dict(), "cached": cached}
+        cross_run = cross_run_checks(result)
+        if cross_run is not None:
+            record["cross_run"] = cross_run
+        return record
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "pending": self.pending,
+            "cache": get_validation_cache().stats,
+        }
+
+    def shutdown(self):
+        """Stop the validations in progress."""
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            job.cancel()
+
+
+class ValidationRequestHandler(BaseHTTPRequestHandler):
+    # keep-alive connections: clients posting many sheets reuse their connection
+    protocol_version = "HTTP/1.1"
+    access_log = False
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.access_log:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message, headers=None):
+        self.send_json(status, {"error": message}, headers=headers)
+
+    def send_text(self, status, body, content_type):
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(HTTPStatus.OK, {"status": "ok", **self.service.stats()})
+        elif self.path == "/metrics":
+            body = metrics.prometheus_text().encode("utf-8")
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error_json(HTTPStatus.NOT_FOUND, f"Unknown endpoint {self.path}")
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/validate":
+            self.send_error_json(HTTPStatus.NOT_FOUND, f"Unknown endpoint {url.path}")
+            return
+        fmt = urllib.parse.parse_qs(url.query).get("format", [None])[0]
+        if fmt is not None and fmt not in EXPORT_FORMATS:
+            formats = ", ".join(EXPORT_FORMATS)
+            self.send_error_json(HTTPStatus.BAD_REQUEST, f"Unknown format {fmt}; expected one of {formats}")
+            return
+
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self.close_connection = True
+            self.send_error_json(HTTPStatus.LENGTH_REQUIRED, "Content-Length is required")
+            return
+        try:
+            length = int(length)
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            self.close_connection = True
+            self.send_error_json(HTTPStatus.BAD_REQUEST, f"Invalid Content-Length: {length}")
+            return
+        if length > MAX_BODY_SIZE:
+            self.close_connection = True
+            self.send_error_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Sample sheet larger than {MAX_BODY_SIZE} bytes")
+            return
+
+        try:
+            samplesheet = self.read_samplesheet(self.rfile.read(length))
+        except ValueError as err:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, str(err))
+            return
+
+        try:
+            result, cached = self.service.validate_result(samplesheet)
+            if fmt is None:
+                payload = self.service._record(result, cached)
+            else:
+                payload = export_report(result, fmt)
+        except ServiceBusy:
+            self.send_error_json(HTTPStatus.SERVICE_UNAVAILABLE, "Validation queue is full", {"Retry-After": "1"})
+        except ValidationTimeout as err:
+            self.send_error_json(HTTPStatus.GATEWAY_TIMEOUT, str(err))
+        except ValidationLimitExceeded as err:
+            self.send_error_json(HTTPStatus.UNPROCESSABLE_ENTITY, str(err))
+        except ValidationCancelled as err:
+            self.send_error_json(HTTPStatus.SERVICE_UNAVAILABLE, str(err))
+        except Exception as err:
+            self.send_error_json(HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(err).__name__}: {err}")
+        else:
+            if fmt is None:
+                self.send_json(HTTPStatus.OK, payload)
+            else:
+                self.send_text(HTTPStatus.OK, payload, EXPORT_FORMATS[fmt][0])
+
+    def read_samplesheet(self, body):
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            raise ValueError("The sample sheet must be UTF-8 encoded")
+
+        if self.headers.get_content_type() == "application/json":
+            try:
+                text = json.loads(text)["samplesheet"]
+            except (ValueError, KeyError, TypeError):
+                raise ValueError('Expected a JSON object {"samplesheet": "..."}')
+            if not isinstance(text, str):
+                raise ValueError("'samplesheet' must be a string")
+        if not text.strip():
+            raise ValueError("Empty sample sheet")
+        return text
+
+
+class ValidationServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # default (5) is too small for bursts of clients
+    request_queue_size = 128
+
+    def __init__(self, address, service, handler=ValidationRequestHandler):
+        super().__init__(address, handler)
+        self.service = service
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="check-my-sample-sheet serve", description="Serve the sample sheet validation as a JSON HTTP API."
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: 8000)")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None, help="validations running at once (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=None,
+        help="validations allowed to wait for a worker before answering 503 (default: 4 per worker)",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=60, help="seconds allowed per validation, once running (default: 60)"
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        default=MEMORY_LIMIT,
+        help=f"memory allowed per validation, in MB; 0 for no limit (default: {MEMORY_LIMIT})",
+    )
+    parser.add_argument("--access-log", action="store_true", help="log every request on stderr")
+    return parser
+
+
+def main(args=None):
+    """Run the ``serve`` subcommand until interrupted."""
+    options = get_parser().parse_args(args)
+    ValidationRequestHandler.access_log = options.access_log
+    service = ValidationService(
+        workers=options.workers,
+        queue_size=options.queue_size,
+        timeout=options.timeout,
+        memory_limit=options.memory_limit,
+    )
+    server = ValidationServer((options.host, options.port), service)
+    print(f"Serving on http://{options.host}:{server.server_port} ({service.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
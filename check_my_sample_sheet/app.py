@@ -11,50 +11,119 @@
 #
 ##############################################################################
 
-import tempfile
+import functools
+import sys
 import time
 from collections import defaultdict
+from dataclasses import dataclass, replace
 from pathlib import Path
 
-import requests
 import streamlit as st
-from sequana.iem import SampleSheetFactory, get_sample_sheet_version
-from streamlit_option_menu import option_menu
 
 # directory holding this module, used to resolve packaged assets (imgs, examples)
 # regardless of the current working directory.
 HERE = Path(__file__).resolve().parent
 LOGO = str(HERE / "imgs" / "logo_256x256.png")
 
-st.set_page_config(
-    page_title="Check My Sample Sheet",
-    page_icon=LOGO,
-    layout="wide",
-    menu_items={"Report a bug": "https://github.com/sequana/webapp_samplesheet/issues/new/choose"},
-)
+# ``streamlit run check_my_sample_sheet/app.py`` executes this file as a script with
+# only its own directory on sys.path: make the package importable from a source checkout.
+if not __package__ and str(HERE.parent) not in sys.path:
+    sys.path.insert(0, str(HERE.parent))
+
+# Only light modules are imported here: importing the app (e.g. for its helpers) has no
+# Streamlit side effect and does not load sequana, pandas or numpy. Those are imported
+# by the functions that need them, on the first validation.
+from check_my_sample_sheet import config, metrics  # noqa: E402
 
 version = "1.0.0"
 
 
-def print_checks(checks):
+# per-check animation of the results bar (0.15s per check). Off by default: it holds the
+# script thread for several seconds per submission. Set CHECK_MY_SAMPLE_SHEET_ANIMATE_CHECKS=1
+# to enable it.
+ANIMATE_CHECKS = config.get("ANIMATE_CHECKS", False, config.as_bool)
+
+STATUS_EMOJI = {"Error": ":x:", "Success": ":white_check_mark:", "Warning": ":warning:"}
+
+
+def summarize_checks(checks):
+    """Count the checks per status and format their messages in a single pass.
+
+    Returns a tuple (counter, msgs) where counter maps each status (Error, Warning,
+    Success) to its number of checks and msgs maps each status to its formatted messages.
     """
-    This function processes a list of checks and displays them in a Streamlit application.
-    Each check is represented as a dictionary with 'status' and 'msg' keys. The function
-    updates a color-coded progress bar based on the number of errors, warnings, and successes.
-    It also prints the messages associated with each check in the appropriate Streamlit function
-    (st.error, st.warning, st.success).
+    counter = {"Error": 0, "Warning": 0, "Success": 0}
+    msgs = defaultdict(list)
+    for check in checks:
+        status = check["status"]
+        counter[status] += 1
+        msgs[status].append(_format_check(status, check["msg"]))
+    return counter, msgs
 
-    Parameters:
-    checks (list): A list of dictionaries, where each dictionary represents a check.
-                   The dictionary should have 'status' and 'msg' keys.
 
-    Returns:
-    dict: A dictionary containing the messages associated with each status (Error, Warning, Success).
+def summarize_report(report):
+    """Like :func:`summarize_checks`, for a :class:`~check_my_sample_sheet.results.CheckReport`.
+
+    The counter is the one of the report: the page and the exports show the same counts.
     """
+    msgs = defaultdict(list)
+    for check in report.checks:
+        msgs[check.status.value].append(_format_check(check.status.value, check.message))
+    return dict(report.counts), msgs
+
+
+def _format_check(status, msg):
+    return f"{status} {STATUS_EMOJI[status]}. {msg}\n\n"
+
+
+@dataclass(eq=False)
+class SheetReport:
+    """The validation report of one sheet, as displayed by :func:`render_report`.
+
+    Streamlit reruns the whole script on each widget interaction (sidebar menu, example
+    buttons, downloads...). The report of the last Process is kept in the session state
+    (``st.session_state.report``) and displayed again by the next runs: the sheet is not
+    validated again and the messages of the checks are formatted once.
+    """
+
+    #: the outcome of the validation (ValidationResult)
+    result: object
+    #: the content of the sample sheet
+    samplesheet: str
+    #: prefix of the widget keys, unique per report shown on the page
+    key: str = "data"
+    #: number of results taken from the section memo, mentioned in the caption
+    reused: int = 0
+    #: cross-run checks of the sheet, None without history database
+    cross_run: list = None
+
+    @property
+    def check_report(self):
+        """The :class:`~check_my_sample_sheet.results.CheckReport` of the sheet, shared with the exports."""
+        from check_my_sample_sheet.results import check_report
 
-    # func to update colorbar
-    def colored_bar(success, warning, error, completed=0):
-        return f"""
+        return check_report(self.result)
+
+    @functools.cached_property
+    def summary(self):
+        """The (counter, msgs) pair of :func:`summarize_report` for the checks of the sheet."""
+        return summarize_report(self.check_report)
+
+
+@dataclass(eq=False)
+class BatchReport:
+    """The summary of a multi-file validation, kept in the session state as :class:`SheetReport`."""
+
+    #: UploadedSheet objects (see :mod:`check_my_sample_sheet.uploads`)
+    sheets: list
+    #: the ValidationResult of each sheet, None for the sheets that could not be read
+    results: list
+    #: cross-run checks of each sheet, None without history database or result
+    cross_runs: list = None
+
+
+def _colored_bar(success, warning, error, completed=0):
+    return f"""
         <div style="display: flex; width: {completed}%; height: 30px; border: 1px solid black;">
             <div style="width: {success}%; background-color: green;"></div>
             <div style="width: {warning}%; background-color: yellow;"></div>
@@ -62,11 +131,10 @@ def print_checks(checks):
         </div>
         """
 
-    def add_legend(success, warning, error):
-        # finally add the legend
-        st.markdown(
-            f"""
-            <div style="display: flex; justify-content: space-between; width: 50%;">
+
+def _legend(success, warning, error, style="width: 50%;"):
+    return f"""
+            <div style="display: flex; justify-content: space-between; {style}">
                  <div style="display: flex; align-items: center;">
                      <div style="width: 20px; height: 20px; background-color: green; margin-right: 5px;"></div>
                     <span>Success ({success})</span>
@@ -80,17 +148,61 @@ def print_checks(checks):
                     <span>Error ({error})</span>
                 </div>
             </div>
-            """,
-            unsafe_allow_html=True,
-        )
+            """
+
+
+def print_checks(checks, animate=None):
+    """
+    This function processes a list of checks and displays them in a Streamlit application.
+    Each check is represented as a dictionary with 'status' and 'msg' keys. The function
+    draws a color-coded bar based on the number of errors, warnings, and successes, and
+    prints the messages associated with each check in the appropriate Streamlit function
+    (st.error, st.warning, st.success).
+
+    By default the counters are computed in one pass and the bar, legend and messages
+    (one box per status) are emitted at once. With ``animate=True`` the bar is filled
+    check by check, with one box per message.
+
+    Parameters:
+    checks (list): A list of dictionaries, where each dictionary represents a check.
+                   The dictionary should have 'status' and 'msg' keys.
+    animate (bool): Animate the bar. Defaults to ANIMATE_CHECKS.
+
+    Returns:
+    dict: A dictionary containing the messages associated with each status (Error, Warning, Success).
+    """
+    if animate is None:
+        animate = ANIMATE_CHECKS
+
+    if animate:
+        return _print_checks_animated(checks)
+
+    return _render_checks(*summarize_checks(checks))
 
+
+def _render_checks(counter, msgs):
+    S = sum(counter.values()) or 1
+    bar = _colored_bar(
+        counter["Success"] / S * 100, counter["Warning"] / S * 100, counter["Error"] / S * 100, completed=100
+    )
+    legend = _legend(counter["Success"], counter["Warning"], counter["Error"], style="width: 33%; margin: 10px auto;")
+    st.markdown(bar + legend, unsafe_allow_html=True)
+
+    if msgs["Error"]:
+        st.error("".join(msgs["Error"]))
+    if msgs["Warning"]:
+        st.warning("".join(msgs["Warning"]))
+    if msgs["Success"]:
+        st.success("".join(msgs["Success"]))
+    return dict(msgs)
+
+
+def _print_checks_animated(checks):
     msgs = defaultdict(list)
-    emoji = {"Error": ":x:", "Success": ":white_check_mark:", "Warning": ":warning:"}
 
     # Placeholder for the colored bar
     bar_placeholder = st.empty()
-    bar_placeholder.markdown(colored_bar(0, 0, 0, 0), unsafe_allow_html=True)
-    # add_legend(0,0,0)
+    bar_placeholder.markdown(_colored_bar(0, 0, 0, 0), unsafe_allow_html=True)
 
     counter = {"Error": 0, "Warning": 0, "Success": 0}
 
@@ -99,7 +211,7 @@ def print_checks(checks):
         status = check["status"]
         msg = check["msg"]
 
-        msgs[status].append(f"{status} {emoji[status]}. {msg}\n\n")
+        msgs[status].append(_format_check(status, msg))
         time.sleep(0.15)
 
         counter[status] += 1
@@ -110,12 +222,12 @@ def print_checks(checks):
         error = counter["Error"] / S * 100
 
         completed = min(round(100 * (S / float(N))), 100)
-        bar_placeholder.markdown(colored_bar(success, warning, error, completed), unsafe_allow_html=True)
+        bar_placeholder.markdown(_colored_bar(success, warning, error, completed), unsafe_allow_html=True)
 
     # finally add the legend
     _, col2, _ = st.columns([1, 4, 1])
     with col2:
-        add_legend(counter["Success"], counter["Warning"], counter["Error"])
+        st.markdown(_legend(counter["Success"], counter["Warning"], counter["Error"]), unsafe_allow_html=True)
 
     # prints all message
     for error in msgs["Error"]:
@@ -127,18 +239,177 @@ def print_checks(checks):
     return dict(msgs)
 
 
-if "code_input" not in st.session_state:
-    st.session_state.code_input = ""
+def print_index_report(reports):
+    """Display the index distance analysis: metrics, close pairs and a heatmap per lane.
+
+    Parameters:
+    reports (list): LaneIndexReport objects from :func:`check_my_sample_sheet.indexes.analyse_indexes`.
+    """
+    import altair as alt
+    import numpy as np
+    import pandas as pd
+
+    from check_my_sample_sheet.indexes import MAX_MATRIX_SAMPLES
+
+    for report in reports:
+        n = len(report.samples)
+        if len(reports) > 1 or report.lane != "all":
+            st.markdown(f"**Lane {report.lane}**")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Samples", n)
+        col2.metric("Minimum distance", "-" if report.min_distance is None else report.min_distance)
+        col3.metric("Mismatches allowed", "-" if report.mismatch_tolerance is None else report.mismatch_tolerance)
+
+        if n > 1 and report.mismatch_tolerance is None:
+            st.error("Some samples share the same index (or index pair): they cannot be demultiplexed.")
+        elif n > 1 and report.mismatch_tolerance == 0:
+            st.warning("Some indexes are close: demultiplex without mismatches (--barcode-mismatches 0).")
+
+        if not report.close_pairs.empty:
+            st.dataframe(report.close_pairs, hide_index=True)
+
+        if report.matrix is not None and n > 1:
+            names = [str(x) for x in report.samples]
+            data = pd.DataFrame(
+                {"sample_1": np.repeat(names, n), "sample_2": np.tile(names, n), "distance": report.matrix.ravel()}
+            )
+            chart = (
+                alt.Chart(data)
+                .mark_rect()
+                .encode(
+                    x=alt.X("sample_2:N", sort=names, title=None),
+                    y=alt.Y("sample_1:N", sort=names, title=None),
+                    color=alt.Color("distance:Q", scale=alt.Scale(scheme="viridis")),
+                    tooltip=["sample_1", "sample_2", "distance"],
+                )
+            )
+            st.altair_chart(chart, use_container_width=True)
+        elif n > 1:
+            st.caption(f"Heatmap not shown for lanes of more than {MAX_MATRIX_SAMPLES} samples.")
+
+
+PAGE_SIZES = [50, 100, 500, 1000]
+
+#: lines of the original sheet shown before the user asks for all of them
+PREVIEW_LINES = 200
+
+#: lines of the sheet quoted in the issue opened from an unexpected error
+ISSUE_LINES = 50
+
+
+def head_lines(text, n):
+    """Return a tuple (head, n_lines): the first *n* lines of *text* and its number of lines."""
+    n_lines = text.count("\n") + (not text.endswith("\n"))
+    end = -1
+    for _ in range(min(n, n_lines)):
+        end = text.find("\n", end + 1)
+        if end < 0:
+            return text, n_lines
+    return text[:end], n_lines
+
+
+def filter_data(df, lanes=None, projects=None, sample=None):
+    """Return the rows of the [Data] frame *df* matching the filters.
+
+    Parameters:
+    lanes (list): keep these lanes (Lane column), all if empty.
+    projects (list): keep these projects (Sample_Project column), all if empty.
+    sample (str): keep samples whose Sample_ID or Sample_Name contains this text (case-insensitive).
+    """
+    mask = None
+
+    def combine(condition):
+        return condition if mask is None else mask & condition
+
+    if lanes and "lane" in df.columns:
+        mask = combine(df["lane"].isin(lanes))
+    if projects and "sample_project" in df.columns:
+        mask = combine(df["sample_project"].isin(projects))
+    if sample:
+        columns = [c for c in ("sample_id", "sample_name") if c in df.columns]
+        if columns:
+            found = df[columns[0]].astype(str).str.contains(sample, case=False, regex=False)
+            for column in columns[1:]:
+                found |= df[column].astype(str).str.contains(sample, case=False, regex=False)
+            mask = combine(found)
+    return df if mask is None else df[mask]
+
+
+def count_pages(n_rows, page_size):
+    """Number of pages needed to show *n_rows* rows (at least one)."""
+    return max(1, -(-n_rows // page_size))
+
 
-# used to reset the file_uploader when an example is loaded: bumping this counter
-# changes the widget key, which forces Streamlit to drop any previously uploaded file.
-if "uploader_key" not in st.session_state:
-    st.session_state.uploader_key = 0
+def paginate(df, page, page_size):
+    """Return the rows of page *page* (1-based, clamped to the valid range) of *df*."""
+    page = min(max(1, page), count_pages(len(df), page_size))
+    return df.iloc[(page - 1) * page_size : page * page_size]
 
 
+@st.fragment
+def data_table(df, key="data"):
+    """Display the [Data] frame one page at a time, with lane/project/sample filters.
+
+    Filtering and paging happen on the server: only the rows of the current page are
+    sent to the browser. Running as a fragment, changing a filter or a page re-renders
+    this table only.
+    """
+    if len(df) <= PAGE_SIZES[0]:
+        st.dataframe(df)
+        return
+
+    col1, col2, col3, col4, col5 = st.columns([2, 2, 3, 1, 1])
+    lanes = projects = None
+    if "lane" in df.columns:
+        lanes = col1.multiselect("Lane", sorted(df["lane"].dropna().unique().tolist()), key=f"{key}_lanes")
+    if "sample_project" in df.columns:
+        projects = col2.multiselect(
+            "Project", sorted(df["sample_project"].dropna().astype(str).unique()), key=f"{key}_projects"
+        )
+    sample = col3.text_input("Sample contains", key=f"{key}_sample")
+    page_size = col4.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+
+    filtered = filter_data(df, lanes=lanes, projects=projects, sample=sample)
+    n_pages = count_pages(len(filtered), page_size)
+    # the filters may have reduced the number of pages below the current one
+    if st.session_state.get(f"{key}_page", 1) > n_pages:
+        st.session_state[f"{key}_page"] = n_pages
+    page = col5.number_input("Page", min_value=1, max_value=n_pages, key=f"{key}_page")
+    rows = paginate(filtered, page, page_size)
+
+    st.dataframe(rows)
+    start = (page - 1) * page_size
+    st.caption(
+        f"Page {page} of {n_pages}: rows {start + 1 if len(rows) else 0}-{start + len(rows)} "
+        f"of {len(filtered)} ({len(df)} in total)"
+    )
+
+
+def print_timings(timings, rows, nbytes):
+    """Show the time spent in each stage of the current request in the sidebar.
+
+    Parameters:
+    timings (list): (stage, seconds) pairs from :func:`check_my_sample_sheet.metrics.request_timings`.
+    rows (int): number of rows of the [Data] section.
+    nbytes (int): size of the sample sheet in bytes.
+    """
+    with st.sidebar:
+        st.markdown("**Timings**")
+        st.dataframe(
+            [{"stage": stage, "ms": round(seconds * 1000, 1)} for stage, seconds in timings],
+            hide_index=True,
+        )
+        st.caption(f"{rows} rows, {nbytes} bytes. Stages missing from the list were served from the cache.")
+
+
+@functools.lru_cache(maxsize=None)
 def load_example(filename):
-    """Load example file from examples directory."""
-    examples_dir = Path(__file__).parent / "examples"
+    """Load example file from examples directory.
+
+    The content is memoized for the lifetime of the process: examples are packaged
+    files that never change.
+    """
+    examples_dir = HERE / "examples"
     with open(examples_dir / filename, "r") as f:
         return f.read()
 
@@ -153,7 +424,73 @@ def set_example(filename):
     st.session_state.uploader_key += 1
 
 
+def examples_page():
+    """Render the Examples page from the sheets packaged in the examples directory (no network access)."""
+    st.write("Below are several sample sheet examples, both valid and invalid, to illustrate the expected format.")
+    st.subheader("1 - Minimalist Example (only [Data] section)")
+    st.write(
+        "In this example, the sample sheet is simplified to keep only the [Data] section and the mandatory columns "
+        "(index and Sample_ID). Note that 'Sample_ID' is not strictly mandatory in bcl2fastq, but we make it "
+        "mandatory in this application as a design choice for better traceability."
+    )
+    st.code(
+        """[Data]
+Sample_ID,index
+ID1,TGACCA
+ID2,CATTTT"""
+    )
+
+    st.subheader("2 - [Data] section with dual indexing and no [Settings] section")
+    data = load_example("sample_sheet.csv")
+    st.write(
+        "A more common example is shown below. The Illumina sample sheet uses sections enclosed in square brackets. "
+        "Up to four sections may appear: [Header], [Reads], [Settings] and [Data]. This example shows the [Header], "
+        "[Reads] and [Data] sections (the [Settings] section is missing). According to the Illumina specification, "
+        "all sections are optional, including [Data]. However, when [Data] is missing, all reads are stored as "
+        "undetermined, which is rarely useful. For this reason, we require the [Data] section in this application."
+    )
+    st.code(data, language="bash")
+
+    st.subheader("3 - [Data] section with single index and a [Settings] section")
+    data = load_example("sample_sheet_settings_index.csv")
+    st.code(data, language="bash")
+
+    st.subheader("4 - Example of an erroneous sample sheet (invalid sample ID name)")
+    data = load_example("Bad_SampleSheet_alphanum.csv")
+    st.code(data, language="bash")
+
+    st.subheader("5 - Example of an erroneous sample sheet (extra trailing semicolons)")
+    data = load_example("Bad_SampleSheet_extra_semicolons.csv")
+    st.code(data, language="bash")
+
+
+def setup_page():
+    """Configure the page; must be the first Streamlit command of each run."""
+    st.set_page_config(
+        page_title="Check My Sample Sheet",
+        page_icon=LOGO,
+        layout="wide",
+        menu_items={"Report a bug": "https://github.com/sequana/webapp_samplesheet/issues/new/choose"},
+    )
+
+
+def init_session_state():
+    """Set the default values of the session state keys used by the app."""
+    if "code_input" not in st.session_state:
+        st.session_state.code_input = ""
+
+    # used to reset the file_uploader when an example is loaded: bumping this counter
+    # changes the widget key, which forces Streamlit to drop any previously uploaded file.
+    if "uploader_key" not in st.session_state:
+        st.session_state.uploader_key = 0
+
+
 def main():
+    from streamlit_option_menu import option_menu
+
+    setup_page()
+    init_session_state()
+
     st.sidebar.write("Provided by the [Sequana team](https://github.com/sequana/sequana)")
     st.sidebar.image(LOGO)
     st.title(f"Check My Sample Sheet (v{version})")
@@ -171,6 +508,7 @@ def main():
             "- [Report a bug](https://github.com/sequana/webapp_samplesheet/issues/new/choose)\n"
             "- [Sequana documentation](https://sequana.readthedocs.io)"
         )
+        show_timings = st.toggle("Show timings", help="Time spent in each stage of the last validation")
 
     if choice == "Sample Sheet Validation (Illumina)":
 
@@ -186,9 +524,11 @@ def main():
         # create a 3-column layout
         col1, col2, col3 = st.columns([4, 1, 4])
         with col1:
-            data_file = st.file_uploader(
-                "Drop a sample sheet below and press the **Process** button. ",
-                type=["csv", "txt"],
+            data_files = st.file_uploader(
+                "Drop one or more sample sheets (or a zip of sheets) below and press the **Process** button. "
+                "Sheets compressed with gzip or bzip2 are accepted.",
+                type=["csv", "txt", "zip", "gz", "bz2"],
+                accept_multiple_files=True,
                 key=f"uploader_{st.session_state.uploader_key}",
             )
         with col2:
@@ -216,82 +556,55 @@ def main():
         with example_col4:
             st.button("Example 4: BCL Convert (v2)", on_click=set_example, args=("sample_sheet_v2_bclconvert.csv",))
 
-        if st.button(":gear: Process :gear:"):
-
-            try:
-                samplesheet = data_file.read().decode()
-                # st.experimental_rerun()
-            except:
-                samplesheet = code  # if there is no drag/drop data, we use the pasted code (if any)
-                data_file = None
-
-            try:
-                process_sample_sheet(data_file, samplesheet)
-            except Exception as err:
-                import urllib.parse
-
-                base_url = f"https://github.com/sequana/webapp_samplesheet/issues/new"
-
-                samplesheet = "\n".join(["    " + x for x in samplesheet.split("\n")])
-                params = {
-                    "title": "Automatic error from the check-my-sample-sheet website",
-                    "body": f"Dear developer(s),\n\nI encountered an unexpected error using the following sample sheet:\n\n{samplesheet}\n\nHere is the full error message:\n\n     {err}\n\nPlease let us know what you think might be the reason for the error.",
-                }
-                url = f"{base_url}?{urllib.parse.urlencode(params)}"
-                st.markdown(
-                    f'<div style="background-color: #ffcccc; padding: 10px; border-radius: 5px;"> Sorry, an unknown error occurred. Please create an issue <a href="{url}">here</a> to report it. A page will open; you will need to click on the "Submit new issue" button. </div>',
-                    unsafe_allow_html=True,
-                )
-
-                raise Exception(err)
+        process = st.button(":gear: Process :gear:")
+        if st.session_state.pop("validation_cancelled", False):
+            st.warning("Validation cancelled.")
+
+        if process:
+            # the report of the previous Process is replaced, or dropped if this one fails
+            st.session_state.pop("report", None)
+
+            from check_my_sample_sheet.uploads import read_uploads
+
+            sheets = read_uploads(data_files)
+            if len(sheets) > 1:
+                with metrics.timed("process_sample_sheets"):
+                    process_sample_sheets(sheets)
+                return
+
+            data_file = None
+            if sheets and sheets[0].preflight is None:
+                st.error(f"{sheets[0].name}: {sheets[0].error}")
+                return
+            elif sheets:
+                preflight = sheets[0].preflight
+                data_file = data_files[0]
+            else:
+                from check_my_sample_sheet.preflight import lint_text
+
+                # if there is no drag/drop data, we use the pasted code (if any)
+                with metrics.timed("preflight"):
+                    preflight = lint_text(code)
+
+            # structural problems found in a single scan are shown at once; the sheet is not
+            # validated when they make the checks pointless (encoding, size, no [Data]...)
+            print_preflight(preflight)
+            if preflight.fatal:
+                return
+            report_sample_sheet(data_file, preflight.text, show_timings)
+        elif "validation_batch" in st.session_state:
+            # the page was rerun while the sheets of an upload were validated: wait for them
+            with metrics.timed("process_sample_sheets"):
+                process_sample_sheets(st.session_state.validation_batch)
+        elif "validation_job" in st.session_state:
+            # the page was rerun (e.g. by a widget) while a validation was running: wait for it
+            report_sample_sheet(None, st.session_state.validation_job.samplesheet, show_timings)
+        elif "report" in st.session_state:
+            # the page was rerun by another widget (menu, example...): the last report is shown again
+            print_last_report(st.session_state.report, None if data_files else code)
 
     elif choice == "Examples":
-        st.write("Below are several sample sheet examples, both valid and invalid, to illustrate the expected format.")
-        st.subheader("1 - Minimalist Example (only [Data] section)")
-        st.write(
-            "In this example, the sample sheet is simplified to keep only the [Data] section and the mandatory columns "
-            "(index and Sample_ID). Note that 'Sample_ID' is not strictly mandatory in bcl2fastq, but we make it "
-            "mandatory in this application as a design choice for better traceability."
-        )
-        st.code(
-            """[Data]
-Sample_ID,index
-ID1,TGACCA
-ID2,CATTTT"""
-        )
-
-        st.subheader("2 - [Data] section with dual indexing and no [Settings] section")
-        url = "https://raw.githubusercontent.com/sequana/webapp_samplesheet/main/examples/sample_sheet.csv"
-        r = requests.get(url, allow_redirects=True)
-        data = r.content.decode()
-        st.write(
-            "A more common example is shown below. The Illumina sample sheet uses sections enclosed in square brackets. "
-            "Up to four sections may appear: [Header], [Reads], [Settings] and [Data]. This example shows the [Header], "
-            "[Reads] and [Data] sections (the [Settings] section is missing). According to the Illumina specification, "
-            "all sections are optional, including [Data]. However, when [Data] is missing, all reads are stored as "
-            "undetermined, which is rarely useful. For this reason, we require the [Data] section in this application."
-        )
-        st.code(data, language="bash")
-
-        st.subheader("3 - [Data] section with single index and a [Settings] section")
-        url = (
-            "https://raw.githubusercontent.com/sequana/webapp_samplesheet/main/examples/sample_sheet_settings_index.csv"
-        )
-        r = requests.get(url, allow_redirects=True)
-        data = r.content.decode()
-        st.code(data, language="bash")
-
-        st.subheader("4 - Example of an erroneous sample sheet (invalid sample ID name)")
-        url = "https://raw.githubusercontent.com/sequana/webapp_samplesheet/main/examples/Bad_SampleSheet_alphanum.csv"
-        r = requests.get(url, allow_redirects=True)
-        data = r.content.decode()
-        st.code(data, language="bash")
-
-        st.subheader("5 - Example of an erroneous sample sheet (extra trailing semicolons)")
-        url = "https://raw.githubusercontent.com/sequana/webapp_samplesheet/main/examples/Bad_SampleSheet_extra_semicolons.csv"
-        r = requests.get(url, allow_redirects=True)
-        data = r.content.decode()
-        st.code(data, language="bash")
+        examples_page()
 
     elif choice == "About":
         st.subheader("About")
@@ -315,95 +628,556 @@ ID2,CATTTT"""
         )
 
 
+def print_preflight(report):
+    """Show the problems found by the pre-flight lint of a sheet, if any.
+
+    Parameters:
+    report (PreflightReport): see :mod:`check_my_sample_sheet.preflight`.
+    """
+    if not report.issues:
+        return
+    st.subheader("Pre-flight checks", divider="blue")
+    for issue in report.issues:
+        show = st.error if issue["status"] == "Error" else st.warning
+        show(f"{issue['status']} {STATUS_EMOJI[issue['status']]}. {issue['msg']}")
+    if report.fatal:
+        st.info("The sample sheet was not validated: fix the problem above and submit it again.")
+
+
+def report_sample_sheet(data_file, samplesheet, show_timings=False):
+    """Validate and display one sheet, recording its metrics; report unexpected errors.
+
+    Parameters:
+    data_file (FileIO): The uploaded sample sheet file (None for a pasted sheet).
+    samplesheet (str): The content of the sample sheet file.
+    show_timings (bool): show the time spent in each stage in the sidebar.
+    """
+    try:
+        with metrics.request_timings() as timings:
+            with metrics.timed("process_sample_sheet"):
+                result = process_sample_sheet(data_file, samplesheet)
+        if result is None:
+            # stopped by a limit of the background validation (already reported)
+            return
+        rows = 0 if result.df is None else len(result.df)
+        metrics.observe_sheet(samplesheet, rows)
+        metrics.export(timings, rows=rows, bytes=len(samplesheet.encode("utf-8")), version=result.version)
+        if show_timings:
+            print_timings(timings, rows=rows, nbytes=len(samplesheet.encode("utf-8")))
+    except Exception as err:
+        import urllib.parse
+
+        base_url = f"https://github.com/sequana/webapp_samplesheet/issues/new"
+
+        # the issue URL quotes the beginning of the sheet only: a large sheet would not fit in a URL
+        head, n_lines = head_lines(samplesheet, ISSUE_LINES)
+        if n_lines > ISSUE_LINES:
+            head += f"\n... ({n_lines - ISSUE_LINES} more lines)"
+        samplesheet = "\n".join(["    " + x for x in head.split("\n")])
+        params = {
+            "title": "Automatic error from the check-my-sample-sheet website",
+            "body": f"Dear developer(s),\n\nI encountered an unexpected error using the following sample sheet:\n\n{samplesheet}\n\nHere is the full error message:\n\n     {err}\n\nPlease let us know what you think might be the reason for the error.",
+        }
+        url = f"{base_url}?{urllib.parse.urlencode(params)}"
+        st.markdown(
+            f'<div style="background-color: #ffcccc; padding: 10px; border-radius: 5px;"> Sorry, an unknown error occurred. Please create an issue <a href="{url}">here</a> to report it. A page will open; you will need to click on the "Submit new issue" button. </div>',
+            unsafe_allow_html=True,
+        )
+
+        raise Exception(err)
+
+
 def process_sample_sheet(data_file, samplesheet):
     """
     This function processes an uploaded sample sheet file and performs validation checks.
-    It saves the file locally, creates a SampleSheet object using the Sequana library,
-    and then validates the sample sheet. If errors are found, they are displayed in the
-    Streamlit application. The function also provides options to download the corrected
-    sample sheet file and view the data section as a CSV file.
+    Results are cached by :mod:`check_my_sample_sheet.validation` so that a sheet already
+    checked is not validated again; other sheets are validated in a background process
+    with a time and a memory limit (see :func:`validate_in_background`). If errors
+    are found, they are displayed in the Streamlit application. The function also provides
+    options to download the corrected sample sheet file and view the data section as a CSV file.
 
     Parameters:
     data_file (FileIO): The uploaded sample sheet file.
     samplesheet (str): The content of the sample sheet file.
 
     Returns:
-    None
+    ValidationResult: the result displayed, None if the validation was stopped by a limit.
     """
+    # sequana and pandas are loaded here, on the first validation of the process
+    from check_my_sample_sheet.samplesheet import section_memo
+    from check_my_sample_sheet.validation import (
+        get_validation_cache,
+        sample_sheet_digest,
+    )
+    from check_my_sample_sheet.worker import (
+        ValidationCancelled,
+        ValidationLimitExceeded,
+    )
+
     if data_file is not None:
         file_details = {"Filename": data_file.name, "FileType": data_file.type, "FileSize": data_file.size}
     else:
         pass
 
-    if 1 == 1:
-
-        # read to save locally
-        # samplesheet = data_file.read().decode()
-
-        with tempfile.NamedTemporaryFile(delete=False, mode="w") as fout:
-            fout.write(samplesheet)
-            fout.close()
-            version = get_sample_sheet_version(fout.name)
-            iem = SampleSheetFactory(fout.name)
-
-        if version == "v2":
-            st.info(":information_source: Detected an Illumina **v2** sample sheet: validating against the **BCL Convert** specification.")
-        else:
-            st.info(":information_source: Detected an Illumina **v1** sample sheet: validating against the **bcl2fastq v2.20** specification.")
-
-        try:
-            # st.write(f"This sample sheet contains {len(iem.df)} samples")
-            iem.validate()
-        except SystemExit as err:
-            st.header("Validation Results", divider="blue")
-            msg = "Error(s) found. :sob: See the message below from Sequana for details."
-            st.error(msg)
-            st.info(err)
-        else:
-            st.header("Validation Results", divider="blue")
-            # emoji within div do not seem to work
-            msg = ":champagne: Your sample sheet looks correct. :champagne:"
-            st.success(msg)
-        # =============================================================== validation
-        st.subheader("Details about the checks", divider="blue")
-        checks = iem.checker()
-
-        msgs = print_checks(checks)
-
-        # =============================================================== original file
-        st.subheader("Original file", divider="blue")
-        st.code(samplesheet)
-
-        # =============================================================== corrected file
-        if len(msgs["Error"]):
-            st.subheader("Corrected file", divider="blue")
-            st.caption(
-                "The quick fix below removes extra trailing semicolons. Other types of errors are difficult to correct "
-                "automatically, so you will need to fix the file manually. We strongly recommend using the IEM software "
-                "from Illumina for that purpose. If you need to edit the file quickly, do not use Excel: although the "
-                "extension is usually .csv, an Illumina sample sheet is not a standard CSV file and Excel may corrupt it."
-            )
-            with tempfile.NamedTemporaryFile(delete=False, mode="w") as fout:
-                iem.quick_fix(fout.name)
-                fout.close()
-                with open(fout.name, "r") as fin:
-
-                    st.download_button(
-                        label="Download data as CSV",
-                        data=fin.read(),
-                        file_name="sample.csv",
-                        mime="text/csv",
-                    )
-
-        # =============================================================== data section
-        st.subheader("Data section", divider="blue")
+    # identical sheets (e.g. re-submissions) are served from the process-wide cache; for an
+    # edited sheet, the results of the unchanged sections are taken from the session's memo
+    if "section_memo" not in st.session_state:
+        st.session_state.section_memo = section_memo()
+    hits = st.session_state.section_memo.hits
+    cache = get_validation_cache()
+    digest = sample_sheet_digest(samplesheet)
+    with metrics.timed("validation"):
+        result = cache.get(digest)
+        if result is None:
+            try:
+                job = validate_in_background(samplesheet, st.session_state.section_memo)
+                result = job.result()
+            except ValidationLimitExceeded as err:
+                st.error(
+                    f":hourglass: {err}. The validation was stopped to keep the service available. "
+                    "Check that the file is a sample sheet, or split it into smaller sheets."
+                )
+                return None
+            except ValidationCancelled:
+                st.warning("Validation cancelled.")
+                return None
+            # the stages ran in the worker: report them to this process' registry
+            metrics.record(result.timings)
+            cache.set(digest, result)
+            st.session_state.section_memo = job.memo
+
+    cross_run = check_history(result)
+    # kept for the next runs of the page, which display it again (see print_last_report)
+    reused = st.session_state.section_memo.hits - hits
+    st.session_state.report = print_result(result, samplesheet, reused=reused, cross_run=cross_run)
+    return result
+
+
+def check_history(result):
+    """Compare a sheet just submitted with the history of the runs, then store it.
+
+    Called once per submission (not by the reruns showing the report again), so that a
+    sheet is recorded and queried once.
+
+    Returns:
+    list: the cross-run checks of *result*, None without history database.
+    """
+    from check_my_sample_sheet.history import cross_run_checks
+
+    with metrics.timed("cross_run"):
+        return cross_run_checks(result)
+
+
+def validate_in_background(samplesheet, memo):
+    """Run a :class:`~check_my_sample_sheet.worker.ValidationJob` on *samplesheet* and wait for its end.
+
+    A spinner shows the progress of the job, with a Cancel button. The job is kept in the
+    session state: when the page is rerun before its end (e.g. by another widget), the
+    next run waits for the same job instead of starting a new one.
+
+    Parameters:
+    samplesheet (str): the content of the sample sheet.
+    memo (LRUCache): the section memo of the session, copied to the job.
+
+    Returns:
+    ValidationJob: the finished job.
+    """
+    from check_my_sample_sheet.validation import sample_sheet_digest
+    from check_my_sample_sheet.worker import ValidationJob
+
+    job = st.session_state.get("validation_job")
+    if job is None or job.digest != sample_sheet_digest(samplesheet):
+        if job is not None:
+            job.cancel()
+        job = st.session_state.validation_job = ValidationJob(samplesheet, memo=memo)
+
+    placeholder = st.empty()
+    with placeholder.container():
+        with st.spinner("Validating the sample sheet..."):
+            progress = st.empty()
+            st.button("Cancel", key="cancel_validation", on_click=cancel_validation)
+            # each update gives Streamlit the opportunity to stop this run (Cancel, other widgets)
+            while not job.wait(0.2):
+                if job.state == "queued":
+                    progress.caption("Waiting for a free worker...")
+                else:
+                    progress.caption(f"Running for {job.elapsed:.0f} s (limit: {job.time_limit:g} s)")
+    placeholder.empty()
+    del st.session_state.validation_job
+    return job
+
+
+def validate_batch_in_background(samplesheets):
+    """Run a :class:`~check_my_sample_sheet.worker.ValidationJob` per sheet and wait for their end.
+
+    Each sheet of a multi-file upload is validated under the same time and memory limits
+    as a single sheet; at most MAX_JOBS run at once (the others are queued). A spinner
+    shows the progress, with a Cancel button stopping all the jobs. As for a single
+    sheet, the jobs are kept in the session state while they run.
+
+    Parameters:
+    samplesheets (dict): the content of each sheet, by digest.
+
+    Returns:
+    dict: the finished ValidationJob of each sheet, by digest.
+    """
+    from check_my_sample_sheet.worker import ValidationJob
+
+    jobs = st.session_state.get("validation_jobs")
+    if jobs is None or list(jobs) != list(samplesheets):
+        for job in (jobs or {}).values():
+            job.cancel()
+        jobs = st.session_state.validation_jobs = {
+            digest: ValidationJob(samplesheet) for digest, samplesheet in samplesheets.items()
+        }
+
+    placeholder = st.empty()
+    with placeholder.container():
+        with st.spinner("Validating the sample sheets..."):
+            progress = st.empty()
+            st.button("Cancel", key="cancel_validation", on_click=cancel_validation)
+            for job in jobs.values():
+                # each update gives Streamlit the opportunity to stop this run (Cancel, other widgets)
+                while not job.wait(0.2):
+                    done = sum(other.state == "done" for other in jobs.values())
+                    progress.caption(f"{done} of {len(jobs)} sample sheets validated...")
+    placeholder.empty()
+    del st.session_state.validation_jobs
+    return jobs
+
+
+def cancel_validation():
+    """Callback of the Cancel button: stop the background validations of the session."""
+    jobs = list(st.session_state.pop("validation_jobs", {}).values())
+    job = st.session_state.pop("validation_job", None)
+    if job is not None:
+        jobs.append(job)
+    for job in jobs:
+        job.cancel()
+    if jobs:
+        st.session_state.validation_cancelled = True
+
+
+def print_result(result, samplesheet, key="data", reused=0, cross_run=None):
+    """Display the validation report of one sheet: summary, checks, quick fix, data and indexes.
+
+    Parameters:
+    result (ValidationResult): the outcome of the validation.
+    samplesheet (str): the content of the sample sheet.
+    key (str): prefix of the widget keys, unique per report shown on the page.
+    reused (int): number of results taken from the section memo, mentioned in the caption.
+    cross_run (list): cross-run checks of the sheet (see :func:`check_history`), None without history.
+
+    Returns:
+    SheetReport: the report displayed, to be displayed again by :func:`render_report`.
+    """
+    report = SheetReport(result, samplesheet, key=key, reused=reused, cross_run=cross_run)
+    render_report(report, animate=ANIMATE_CHECKS)
+    return report
+
+
+def render_report(report, animate=False):
+    """Display a :class:`SheetReport`.
+
+    The sections holding widgets or heavy elements (checks, original file, corrected
+    file, [Data] table, index distances) are fragments: an interaction with one of them
+    (e.g. a download) re-renders that section only.
+
+    Parameters:
+    report (SheetReport): the report to display.
+    animate (bool): fill the results bar check by check (see :func:`print_checks`).
+    """
+    result = report.result
+    if result.version == "v2":
+        st.info(":information_source: Detected an Illumina **v2** sample sheet: validating against the **BCL Convert** specification.")
+    else:
+        st.info(":information_source: Detected an Illumina **v1** sample sheet: validating against the **bcl2fastq v2.20** specification.")
+
+    st.header("Validation Results", divider="blue")
+    caption = f"Checked in {result.seconds * 1000:.0f} ms (single pass over the sheet)."
+    if report.reused:
+        caption += f" {report.reused} results reused from the unchanged sections of the previous version."
+    st.caption(caption)
+    if result.error is not None:
+        msg = "Error(s) found. :sob: See the message below from Sequana for details."
+        st.error(msg)
+        st.info(result.error)
+    else:
+        # emoji within div do not seem to work
+        msg = ":champagne: Your sample sheet looks correct. :champagne:"
+        st.success(msg)
+
+    with metrics.timed("print_checks"):
+        checks_section(report, animate)
+    original_file(report)
+    if report.summary[0]["Error"]:
+        corrected_file(report)
+
+    # =============================================================== data section
+    st.subheader("Data section", divider="blue")
+    st.caption(
+        "For convenience, the [Data] section is shown below as a parsed table. "
+        "Check that the values are consistent with your expectations (for example, that each index appears in a single column)."
+    )
+    if result.df is None:
+        st.error(f"The [Data] section could not be parsed: {result.df_error}")
+    else:
+        # the cached frame is shared and never modified: no defensive copy
+        with metrics.timed("render_data"):
+            data_table(result.df, key=report.key)
+
+    if result.indexes:
+        with metrics.timed("render_indexes"):
+            index_distances(report)
+
+
+@st.fragment
+def checks_section(report, animate=False):
+    """The checks of a :class:`SheetReport`, from its messages formatted once, and its cross-run checks."""
+    st.subheader("Details about the checks", divider="blue")
+    if animate:
+        checks = [{"status": check.status.value, "msg": check.message} for check in report.check_report.checks]
+        print_checks(checks, animate=True)
+    else:
+        _render_checks(*report.summary)
+    export_buttons(report)
+
+    if report.cross_run is not None:
+        st.subheader("Cross-run checks", divider="blue")
         st.caption(
-            "For convenience, the [Data] section is shown below as a parsed table. "
-            "Check that the values are consistent with your expectations (for example, that each index appears in a single column)."
+            "The samples of this sheet compared with the runs validated before: index pairs recently used on the "
+            "same instrument (risk of carry-over) and sample IDs already used."
+        )
+        print_checks(report.cross_run, animate=False)
+
+
+def export_buttons(report):
+    """Download buttons for the report of the checks in each of the export formats.
+
+    An export is only built when its button is clicked, then cached under the digest of the
+    sheet (see :mod:`check_my_sample_sheet.results`): the runs of the page do not serialize it.
+    """
+    from check_my_sample_sheet.results import EXPORT_FORMATS, export_report
+
+    for column, (fmt, (mime, extension)) in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS.items()):
+        column.download_button(
+            label=f"Report as {fmt.upper()}",
+            data=functools.partial(export_report, report.result, fmt),
+            file_name=f"samplesheet_report.{extension}",
+            mime=mime,
+            key=f"{report.key}_export_{fmt}",
         )
-        df = iem.df.copy()
-        st.write(df)
 
 
+@st.fragment
+def original_file(report):
+    """The sample sheet of a :class:`SheetReport`, as submitted.
+
+    Sheets longer than :data:`PREVIEW_LINES` lines are cut, unless the user asks for
+    all of them: the whole sheet is not sent to the browser on each run.
+    """
+    st.subheader("Original file", divider="blue")
+    head, n_lines = head_lines(report.samplesheet, PREVIEW_LINES)
+    if n_lines <= PREVIEW_LINES:
+        st.code(report.samplesheet)
+    elif st.toggle(f"Show all {n_lines} lines", key=f"{report.key}_original"):
+        st.code(report.samplesheet)
+    else:
+        st.code(head)
+        st.caption(f"First {PREVIEW_LINES} lines of {n_lines}.")
+
+
+@st.fragment
+def corrected_file(report):
+    """The quick fix of a :class:`SheetReport`, computed when the user asks for it.
+
+    The changed lines are shown as a diff with the original sheet. Running as a
+    fragment, showing the fix or downloading it re-renders this section only.
+    """
+    from check_my_sample_sheet.validation import quick_fix, quick_fix_diff
+
+    st.subheader("Corrected file", divider="blue")
+    st.caption(
+        "The quick fix below removes extra trailing semicolons. Other types of errors are difficult to correct "
+        "automatically, so you will need to fix the file manually. We strongly recommend using the IEM software "
+        "from Illumina for that purpose. If you need to edit the file quickly, do not use Excel: although the "
+        "extension is usually .csv, an Illumina sample sheet is not a standard CSV file and Excel may corrupt it."
+    )
+    if not st.toggle("Show the quick fix", key=f"{report.key}_quick_fix"):
+        return
+
+    fixed = quick_fix(report.samplesheet, digest=report.result.digest)
+    diff, omitted = quick_fix_diff(report.samplesheet, fixed)
+    if diff:
+        st.code(diff, language="diff")
+    else:
+        st.caption("The quick fix does not change this sheet.")
+    if omitted:
+        st.caption(f"{omitted} more lines of differences are not shown: download the corrected file to see them.")
+    st.download_button(
+        label="Download data as CSV",
+        data=fixed,
+        file_name="sample.csv",
+        mime="text/csv",
+        key=f"{report.key}_download",
+    )
+
+
+@st.fragment
+def index_distances(report):
+    """The index distance analysis of a :class:`SheetReport`."""
+    st.subheader("Index distances", divider="blue")
+    st.caption(
+        "Hamming distances between the indexes (I7 + I5) of the samples of each lane. Pairs of samples closer "
+        "than 3 mismatches are listed: they cannot be demultiplexed when one mismatch is allowed. "
+        "'Mismatches allowed' is the largest --barcode-mismatches (bcl2fastq) or BarcodeMismatchesIndex1/2 "
+        "(BCL Convert) value that keeps all samples separable."
+    )
+    print_index_report(report.result.indexes)
+
+
+def print_last_report(report, samplesheet=None):
+    """Display again the report kept in the session state by the last Process.
+
+    Parameters:
+    report (SheetReport or BatchReport): the report of the last Process.
+    samplesheet (str): the sheet currently pasted (None for uploads). A note is shown
+        when it is not the sheet of the report.
+    """
+    if isinstance(report, BatchReport):
+        st.header("Validation Results", divider="blue")
+        batch_summary(report.sheets, report.results, report.cross_runs)
+        return
+    if samplesheet is not None and samplesheet != report.samplesheet:
+        st.info("The report below is for the sample sheet processed last: press **Process** to check the current one.")
+    render_report(report)
+
+
+def summary_table(sheets, results):
+    """One row per sheet for the summary of a multi-file validation.
+
+    Parameters:
+    sheets (list): UploadedSheet objects (see :mod:`check_my_sample_sheet.uploads`).
+    results (list): the ValidationResult of each sheet, None for the sheets that could not be read.
+    """
+    rows = []
+    for sheet, result in zip(sheets, results):
+        if result is None:
+            status = "unreadable" if sheet.text is None else "stopped"
+            rows.append({"file": sheet.name, "status": f"{status}: {sheet.error}", "version": None})
+            continue
+        counts = result.counts
+        rows.append(
+            {
+                "file": sheet.name,
+                "status": "valid" if result.is_valid else "errors",
+                "version": result.version,
+                "errors": counts["Error"],
+                "warnings": counts["Warning"],
+                "successes": counts["Success"],
+                "ms": round(result.seconds * 1000, 1),
+            }
+        )
+    return rows
+
+
+def process_sample_sheets(sheets):
+    """Validate several sheets concurrently and show a summary table.
+
+    Each sheet is validated in a background process, under the time and memory limits
+    of a single sheet (see :func:`validate_batch_in_background`); identical sheets and
+    sheets already checked are served from the cache. The sheets stopped by a limit are
+    reported in the table. All the results are compared with the history of the runs
+    (see :func:`check_history`) here, once; the full report of a sheet is only rendered
+    when its row is selected.
+
+    Parameters:
+    sheets (list): UploadedSheet objects (see :mod:`check_my_sample_sheet.uploads`).
+
+    Returns:
+    list: the ValidationResult of each sheet (None for the unreadable or stopped ones),
+    None if the validation was cancelled.
+    """
+    from check_my_sample_sheet.validation import (
+        get_validation_cache,
+        sample_sheet_digest,
+    )
+    from check_my_sample_sheet.worker import (
+        ValidationCancelled,
+        ValidationFailed,
+        ValidationLimitExceeded,
+    )
+
+    # kept while the jobs run: a rerun of the page waits for them (see main)
+    st.session_state.validation_batch = sheets
+    cache = get_validation_cache()
+    digests = [None if sheet.text is None else sample_sheet_digest(sheet.text) for sheet in sheets]
+    found = {digest: cache.get(digest) for digest in digests if digest is not None}
+    errors = {}
+    with metrics.timed("validation"):
+        missing = {digest: sheet.text for digest, sheet in zip(digests, sheets) if digest and found[digest] is None}
+        if missing:
+            for digest, job in validate_batch_in_background(missing).items():
+                try:
+                    result = job.result()
+                except ValidationCancelled:
+                    del st.session_state.validation_batch
+                    st.warning("Validation cancelled.")
+                    return None
+                except (ValidationLimitExceeded, ValidationFailed) as err:
+                    errors[digest] = str(err)
+                    continue
+                # the stages ran in the worker: report them to this process' registry
+                metrics.record(result.timings)
+                cache.set(digest, result)
+                found[digest] = result
+    del st.session_state.validation_batch
+
+    sheets = [
+        replace(sheet, error=errors[digest]) if digest in errors else sheet for sheet, digest in zip(sheets, digests)
+    ]
+    results = [found.get(digest) for digest in digests]
+    cross_runs = [None if result is None else check_history(result) for result in results]
+
+    st.header("Validation Results", divider="blue")
+    batch_summary(sheets, results, cross_runs)
+    st.session_state.report = BatchReport(sheets, results, cross_runs)
+    return results
+
+
+@st.fragment
+def batch_summary(sheets, results, cross_runs=None):
+    """Summary table of a multi-file validation; selecting a row shows the report of that sheet.
+
+    Running as a fragment, a selection re-renders this area only. The sheets were compared
+    with the history of the runs when they were validated: *cross_runs* holds the checks of
+    each sheet.
+    """
+    rows = summary_table(sheets, results)
+    failed = sum(row["status"] != "valid" for row in rows)
+    if failed:
+        st.error(f"{failed} of {len(rows)} sample sheets have errors or could not be read.")
+    else:
+        st.success(f"All {len(rows)} sample sheets look correct. :champagne:")
+
+    event = st.dataframe(rows, hide_index=True, on_select="rerun", selection_mode="single-row", key="batch_summary")
+    selected = [index for index in event.selection.rows if index < len(rows)]
+    if not selected:
+        st.caption("Select a row to see the full report of a sample sheet.")
+        return
+
+    index = selected[0]
+    sheet, result = sheets[index], results[index]
+    st.subheader(sheet.name, divider="blue")
+    if sheet.preflight is not None:
+        print_preflight(sheet.preflight)
+    if result is None and (sheet.preflight is None or not sheet.preflight.fatal):
+        st.error(sheet.error)
+    if result is not None:
+        print_result(result, sheet.text, key=f"sheet_{index}", cross_run=cross_runs[index] if cross_runs else None)
+
+
+# the validation workers import this script as __mp_main__ (see
+# validation.get_worker_context): the page only runs behind this guard
 if __name__ == "__main__":
     main()
@@ -0,0 +1,139 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Headless validation of many sample sheets: ``check-my-sample-sheet validate``.
+
+Files are spread over a pool of worker processes and one JSON record per sheet is
+written to stdout as soon as it is validated::
+
+    check-my-sample-sheet validate --jobs 8 "runs/**/SampleSheet*.csv" > report.ndjson
+
+The exit status is 1 if any sheet has errors (or could not be read), 0 otherwise.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def expand_paths(patterns):
+    """Expand files and glob patterns (``**`` is recursive) into a list of unique paths.
+
+    Patterns that match nothing are kept as-is so that they are reported as unreadable.
+    """
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        paths.extend(path for path in matches if not os.path.isdir(path))
+    return list(dict.fromkeys(paths))
+
+
+def validate_file(path):
+    """Validate the sample sheet stored in *path* and return its JSON-serialisable record.
+
+    The record is :meth:`ValidationResult.to_dict` plus the file name, the runtime and
+    the ``cross_run`` checks when the history is enabled.
+    If the file cannot be read or validated, ``valid`` is False and ``exception`` holds
+    the reason.
+    """
+    from check_my_sample_sheet.history import cross_run_checks
+    from check_my_sample_sheet.validation import validate_sample_sheet
+
+    start = time.perf_counter()
+    try:
+        with open(path, "r") as fin:
+            result = validate_sample_sheet(fin.read())
+        record = result.to_dict()
+        cross_run = cross_run_checks(result)
+        if cross_run is not None:
+            record["cross_run"] = cross_run
+    except Exception as err:
+        record = {"valid": False, "exception": f"{type(err).__name__}: {err}"}
+    return {"file": path, **record, "seconds": round(time.perf_counter() - start, 6)}
+
+
+def iter_results(paths, jobs=1):
+    """Yield the record of each path as soon as it is validated (completion order).
+
+    With more than one job, files are validated in a pool of *jobs* processes.
+    """
+    if jobs <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield validate_file(path)
+        return
+
+    # load sequana once in the parent: forked workers inherit it instead of each importing it
+    import check_my_sample_sheet.validation  # noqa: F401
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+        futures = [executor.submit(validate_file, path) for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def has_errors(record):
+    return not record["valid"] or record.get("errors", 0) > 0
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="check-my-sample-sheet validate",
+        description="Validate Illumina sample sheets (v1 and v2) without the web interface.",
+    )
+    parser.add_argument("paths", nargs="+", help="sample sheet files or glob patterns (quote them; ** is recursive)")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["ndjson", "json"],
+        default="ndjson",
+        help="ndjson: one record per line, written as each sheet finishes (default); "
+        "json: a single array, in input order, written at the end",
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print the summary on stderr")
+    return parser
+
+
+def main(args=None, stdout=None):
+    """Run the ``validate`` subcommand and return the exit status."""
+    options = get_parser().parse_args(args)
+    stdout = stdout or sys.stdout
+
+    paths = expand_paths(options.paths)
+    if not paths:
+        get_parser().error("no sample sheet found")
+
+    records = []
+    for record in iter_results(paths, jobs=options.jobs):
+        records.append(record)
+        if options.format == "ndjson":
+            stdout.write(json.dumps(record) + "\n")
+            stdout.flush()
+
+    if options.format == "json":
+        order = {path: i for i, path in enumerate(paths)}
+        records.sort(key=lambda record: order[record["file"]])
+        json.dump(records, stdout, indent=2)
+        stdout.write("\n")
+
+    failed = sum(has_errors(record) for record in records)
+    if not options.quiet:
+        print(f"{len(records)} sample sheet(s) checked, {failed} with errors", file=sys.stderr)
+    return 1 if failed else 0
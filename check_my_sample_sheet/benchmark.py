@@ -0,0 +1,314 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Benchmark suite: ``check-my-sample-sheet benchmark``.
+
+Synthetic sheets (see :mod:`check_my_sample_sheet.synthetic`) of increasing size are
+pushed through each stage of the application:
+
+- ``parse``: scan of the sections (:func:`~check_my_sample_sheet.samplesheet.load_sample_sheet`)
+- ``version``: version detection
+- ``checks``: sequana's check suite on a parsed sheet
+- ``index_analysis``: index distance analysis of the [Data] section
+- ``lane_checks``: lane by lane checks and index analysis of a multi-lane sheet
+  (:func:`~check_my_sample_sheet.lanes.check_lanes`), one lane after the other
+- ``lane_checks_parallel``: the same on ``CHECK_MY_SAMPLE_SHEET_LANE_WORKERS`` threads,
+  whatever the size of the sheet (compare with ``lane_checks``: ``checks`` plus
+  ``index_analysis`` is the cost of the whole-frame alternative)
+- ``quick_fix``: corrected sheet
+- ``validation``: the whole uncached validation (all the above, as done by the app)
+- ``revalidation``: validation of the sheet with an edited [Header], the other sections
+  being reused from a section memo (the fix/recheck loop of the app)
+- ``render``: full :func:`~check_my_sample_sheet.app.process_sample_sheet` run in a
+  headless Streamlit session (``AppTest``)
+
+Each stage is repeated up to ``--repeat`` times, but stops after ``--budget`` seconds
+so that large sheets are measured once. Results are written as JSON::
+
+    check-my-sample-sheet benchmark --sizes 10 1000 100000 -o before.json
+    check-my-sample-sheet benchmark --sizes 10 1000 100000 -o after.json --compare before.json
+
+With ``--compare``, each stage is matched with the same case in the reference file
+and the exit status is 1 when one of them is slower by more than ``--tolerance``.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from importlib import metadata
+
+from check_my_sample_sheet.synthetic import ERRORS, generate_sample_sheet
+
+STAGES = [
+    "parse",
+    "version",
+    "checks",
+    "index_analysis",
+    "lane_checks",
+    "lane_checks_parallel",
+    "quick_fix",
+    "validation",
+    "revalidation",
+    "render",
+]
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+
+#: version of the benchmark results format
+FORMAT = 1
+
+
+def measure(function, setup=None, repeat=5, budget=5.0):
+    """Time ``function(setup())`` (or ``function()``) and return the list of durations.
+
+    The setup is not timed. *function* runs at least once, then until *repeat* runs are
+    done or *budget* seconds were spent.
+    """
+    durations = []
+    while len(durations) < repeat and (not durations or sum(durations) < budget):
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        function(*args)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+# the validation workers import the main script (see validation.get_worker_context): the
+# page is rendered behind a main guard, as in app.py
+_RENDER_SCRIPT = """
+import streamlit as st
+
+from check_my_sample_sheet.app import process_sample_sheet
+
+if __name__ == "__main__":
+    process_sample_sheet(None, st.session_state.samplesheet)
+"""
+
+
+def _render(samplesheet, timeout=600):
+    from streamlit.logger import set_log_level
+    from streamlit.testing.v1 import AppTest
+
+    from check_my_sample_sheet.validation import get_validation_cache
+
+    # the app would answer a second run from the cache
+    get_validation_cache().clear()
+    # bare-mode and deprecation warnings would drown the results
+    set_log_level("error")
+    at = AppTest.from_string(_RENDER_SCRIPT, default_timeout=timeout)
+    at.session_state.samplesheet = samplesheet
+    main = sys.modules["__main__"]
+    try:
+        at.run()
+    finally:
+        # AppTest leaves its script as the main module
+        sys.modules["__main__"] = main
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+
+def stage_functions(text):
+    """Return {stage: (function, setup)} for the sheet *text*."""
+    from check_my_sample_sheet.indexes import analyse_indexes
+    from check_my_sample_sheet.lanes import LANE_WORKERS, check_lanes
+    from check_my_sample_sheet.samplesheet import (
+        get_sample_sheet_version,
+        load_sample_sheet,
+        section_memo,
+    )
+    from check_my_sample_sheet.validation import run_validation
+
+    def parsed():
+        return load_sample_sheet(text)[1]
+
+    def primed_memo():
+        memo = section_memo()
+        run_validation(text, memo=memo)
+        return memo
+
+    edited = text.replace("synthetic", "edited", 1)
+
+    return {
+        "parse": (lambda: load_sample_sheet(text), None),
+        "version": (lambda: get_sample_sheet_version(text), None),
+        "checks": (lambda sheet: sheet.checker(), parsed),
+        "index_analysis": (analyse_indexes, lambda: parsed().df),
+        "lane_checks": (lambda sheet: check_lanes(sheet, sheet.df, workers=1), parsed),
+        "lane_checks_parallel": (lambda sheet: check_lanes(sheet, sheet.df, workers=LANE_WORKERS, min_rows=0), parsed),
+        "quick_fix": (lambda sheet: sheet.quick_fix_text(), parsed),
+        "validation": (lambda: run_validation(text), None),
+        "revalidation": (lambda memo: run_validation(edited, memo=memo), primed_memo),
+        "render": (lambda: _render(text), None),
+    }
+
+
+def iter_cases(sizes, versions, lanes, dual_index, errors):
+    for version in versions:
+        for size in sizes:
+            for errors_ in errors:
+                yield {
+                    "samples": size,
+                    "version": version,
+                    "lanes": lanes,
+                    "dual_index": dual_index,
+                    "errors": list(errors_),
+                }
+
+
+def run_case(case, stages=STAGES, repeat=5, budget=5.0, index_length=10):
+    """Benchmark the stages on the sheet described by *case*; return the list of result records."""
+    text = generate_sample_sheet(index_length=index_length, **case)
+    functions = stage_functions(text)
+    records = []
+    for stage in stages:
+        function, setup = functions[stage]
+        durations = measure(function, setup, repeat=repeat, budget=budget)
+        records.append(
+            {
+                **case,
+                "bytes": len(text.encode("utf-8")),
+                "stage": stage,
+                "runs": len(durations),
+                "min": min(durations),
+                "median": statistics.median(durations),
+                "mean": statistics.mean(durations),
+                "max": max(durations),
+            }
+        )
+    return records
+
+
+def _version(package):
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def environment():
+    return {
+        "format": FORMAT,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "packages": {
+            name: _version(name)
+            for name in ("check-my-sample-sheet", "sequana", "streamlit", "pandas", "numpy", "pyarrow")
+        },
+    }
+
+
+def case_key(record):
+    return (
+        record["version"],
+        record["samples"],
+        record["lanes"],
+        record["dual_index"],
+        tuple(record["errors"]),
+        record["stage"],
+    )
+
+
+def compare(results, reference, tolerance=1.2):
+    """Match *results* with the *reference* records (same case and stage).
+
+    Returns the list of (record, reference record, ratio of the medians) and the list of
+    the comparisons whose ratio exceeds *tolerance*.
+    """
+    previous = {case_key(record): record for record in reference}
+    comparisons = []
+    for record in results:
+        other = previous.get(case_key(record))
+        if other is None:
+            continue
+        ratio = record["median"] / other["median"] if other["median"] > 0 else float("inf")
+        comparisons.append((record, other, ratio))
+    return comparisons, [item for item in comparisons if item[2] > tolerance]
+
+
+def _describe(record):
+    errors = "+".join(record["errors"]) or "clean"
+    index = "dual" if record["dual_index"] else "single"
+    return f"{record['version']} {record['samples']:>7} rows {record['lanes']} lane(s) {index} {errors}"
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="check-my-sample-sheet benchmark",
+        description="Time each stage of the validation on synthetic sample sheets.",
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of [Data] rows")
+    parser.add_argument("--versions", nargs="+", choices=["v1", "v2"], default=["v1", "v2"])
+    parser.add_argument("--lanes", type=int, default=1, help="lanes the samples are spread over (default: 1)")
+    parser.add_argument("--single-index", action="store_true", help="no I5 index (default: dual index)")
+    parser.add_argument("--index-length", type=int, default=10, help="length of the indexes (default: 10)")
+    parser.add_argument(
+        "--errors",
+        nargs="*",
+        default=None,
+        choices=sorted(ERRORS),
+        metavar="ERROR",
+        help=f"errors injected in a second series of sheets, among: {', '.join(sorted(ERRORS))} "
+        "(default: a clean series and one with alphanum; give no value for clean sheets only)",
+    )
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=5, help="maximum runs per stage (default: 5)")
+    parser.add_argument("--budget", type=float, default=5.0, help="seconds after which runs stop (default: 5)")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="JSON results (default: benchmark.json)")
+    parser.add_argument("--compare", metavar="JSON", help="results of a previous run to compare with")
+    parser.add_argument(
+        "--tolerance", type=float, default=1.2, help="slowdown ratio reported as a regression (default: 1.2)"
+    )
+    return parser
+
+
+def main(args=None, stderr=None):
+    """Run the ``benchmark`` subcommand and return the exit status."""
+    options = get_parser().parse_args(args)
+    stderr = stderr or sys.stderr
+
+    if options.errors is None:
+        errors = [(), ("alphanum",)]
+    elif options.errors:
+        errors = [(), tuple(options.errors)]
+    else:
+        errors = [()]
+
+    results = []
+    cases = iter_cases(options.sizes, options.versions, options.lanes, not options.single_index, errors)
+    for case in cases:
+        records = run_case(case, options.stages, options.repeat, options.budget, options.index_length)
+        results.extend(records)
+        timings = "  ".join(f"{record['stage']} {record['median'] * 1000:.1f}ms" for record in records)
+        print(f"{_describe(case)}: {timings}", file=stderr)
+
+    with open(options.output, "w") as fout:
+        json.dump({"environment": environment(), "results": results}, fout, indent=2)
+        fout.write("\n")
+
+    if not options.compare:
+        return 0
+    with open(options.compare) as fin:
+        reference = json.load(fin)["results"]
+    comparisons, regressions = compare(results, reference, options.tolerance)
+    for record, other, ratio in comparisons:
+        flag = "  <-- slower" if ratio > options.tolerance else ""
+        print(
+            f"{_describe(record)} {record['stage']:<15} "
+            f"{other['median'] * 1000:10.1f}ms -> {record['median'] * 1000:10.1f}ms  x{ratio:.2f}{flag}",
+            file=stderr,
+        )
+    print(f"{len(comparisons)} stage(s) compared, {len(regressions)} slower than x{options.tolerance}", file=stderr)
+    return 1 if regressions else 0
@@ -0,0 +1,145 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Small thread-safe LRU cache with an optional time-to-live."""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Mapping bounded in number of entries and, optionally, in bytes and in entry age.
+
+    When full, the least recently used entries are evicted. Entries older than *ttl*
+    seconds are dropped when accessed. The cache is safe to share between threads
+    (Streamlit runs each session in its own thread).
+
+    Parameters:
+    maxsize (int): maximum number of entries (0 disables caching).
+    ttl (float): lifetime of an entry in seconds (None or 0 for no expiry).
+    timer (callable): monotonic clock, overridable in tests.
+    maxbytes (int): maximum total size of the entries, as estimated by *sizeof* (None or 0
+        for no limit). An entry larger than that is not stored.
+    sizeof (callable): estimated size of a value in bytes; a module-level function, so
+        that the cache can be pickled.
+    """
+
+    def __init__(self, maxsize=128, ttl=None, timer=time.monotonic, maxbytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self._timer = timer
+        self._sizeof = sizeof
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        #: estimated size of the entries, in bytes (0 without *sizeof*)
+        self.bytes = 0
+
+    def __getstate__(self):
+        # copies (e.g. sent to a worker process) get their own lock
+        with self._lock:
+            state = {**self.__dict__, "_data": self._data.copy()}
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def _expired(self, stamp):
+        return bool(self.ttl) and self._timer() - stamp > self.ttl
+
+    def get(self, key, default=None, count=True):
+        """Return the value stored under *key* (refreshing its LRU position) or *default*."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and self._expired(item[0]):
+                self._pop(key)
+                self.evictions += 1
+                item = _MISSING
+            if item is _MISSING:
+                if count:
+                    self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return item[1]
+
+    def _pop(self, key=_MISSING):
+        # remove *key* (the least recently used entry by default); the lock is held
+        if key is _MISSING:
+            _, (_, _, size) = self._data.popitem(last=False)
+        else:
+            _, _, size = self._data.pop(key)
+        self.bytes -= size
+
+    def set(self, key, value):
+        """Store *value* under *key*, evicting the least recently used entries if needed."""
+        if self.maxsize <= 0:
+            return
+        size = self._sizeof(value) if self._sizeof else 0
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            if self.maxbytes and size > self.maxbytes:
+                self.evictions += 1
+                return
+            self._data[key] = (self._timer(), value, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes and self.bytes > self.maxbytes):
+                self._pop()
+                self.evictions += 1
+
+    def get_or_set(self, key, factory):
+        """Return the value cached under *key*, computing it with ``factory()`` on a miss.
+
+        The factory runs outside the lock so that slow computations do not serialise
+        unrelated lookups; two concurrent misses on the same key may both compute it.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        """Drop all entries and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = self.bytes = 0
+
+    @property
+    def stats(self):
+        """Counters as a dict: hits, misses, evictions, size, maxsize, bytes and maxbytes."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "bytes": self.bytes,
+                "maxbytes": self.maxbytes or 0,
+            }
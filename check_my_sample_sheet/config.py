@@ -0,0 +1,46 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Runtime settings read from ``CHECK_MY_SAMPLE_SHEET_*`` environment variables.
+
+Deployments tune the application without code changes, e.g.::
+
+    CHECK_MY_SAMPLE_SHEET_CACHE_SIZE=1024 check-my-sample-sheet
+"""
+import os
+
+PREFIX = "CHECK_MY_SAMPLE_SHEET_"
+
+
+def get(name, default, cast=str):
+    """Return the value of ``CHECK_MY_SAMPLE_SHEET_<name>`` converted with *cast*.
+
+    *default* is returned when the variable is unset or empty. A ValueError naming
+    the variable is raised when the value cannot be converted.
+    """
+    value = os.environ.get(PREFIX + name, "").strip()
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f"Invalid value for {PREFIX}{name}: {value!r}")
+
+
+def as_bool(value):
+    """Cast for boolean flags: 1/true/yes/on and 0/false/no/off (case-insensitive)."""
+    value = value.lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(value)
@@ -0,0 +1,298 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Cross-run checks: the samples of the sheets validated before, in a local SQLite file.
+
+Enabled by setting ``CHECK_MY_SAMPLE_SHEET_HISTORY_DB`` to the path of the database
+(created if needed)::
+
+    CHECK_MY_SAMPLE_SHEET_HISTORY_DB=/data/sheets.sqlite check-my-sample-sheet
+
+Every sheet validated without error is stored (run name, date and instrument from the
+[Header] section; sample ID, lane and indexes of each sample). A new version of a sheet
+(same run name and date) replaces the previous one. Sheets without run name (empty
+Experiment Name / RunName) are not stored: nothing tells their versions apart from
+other runs, and each edit would be reported as a collision with the previous version.
+The samples of each new sheet, named or not, are then compared with the stored runs:
+
+- index pairs (I7 + I5) used on the same instrument during the last
+  ``CHECK_MY_SAMPLE_SHEET_HISTORY_DAYS`` days (default 30): possible carry-over;
+- sample IDs already used by any previous run.
+
+Both lookups go through SQL indexes (on index1, index2, lane, run date and on the
+sample ID): they take milliseconds with hundreds of thousands of stored samples.
+Sample sheets carry no flowcell ID, so the instrument is the narrowest scope available.
+"""
+import datetime
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from check_my_sample_sheet import config
+
+HISTORY_DB = config.get("HISTORY_DB", "")
+HISTORY_DAYS = config.get("HISTORY_DAYS", 30, int)
+
+#: examples quoted in a check message before "..."
+MAX_QUOTED = 5
+
+#: [Header] fields holding the run metadata, v1 (bcl2fastq) and v2 (BCL Convert) names
+RUN_NAME_FIELDS = ("Experiment Name", "RunName")
+INSTRUMENT_FIELDS = ("Instrument Type", "InstrumentType", "InstrumentPlatform")
+
+#: formats of the [Header] Date field, IEM writes M/D/YYYY
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d", "%d.%m.%Y", "%Y%m%d")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_key TEXT UNIQUE NOT NULL,
+    digest TEXT NOT NULL,
+    run_name TEXT,
+    run_date TEXT NOT NULL,
+    instrument TEXT NOT NULL,
+    recorded TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    lane TEXT NOT NULL,
+    sample_id TEXT NOT NULL,
+    index1 TEXT NOT NULL,
+    index2 TEXT NOT NULL,
+    run_date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_by_index ON samples (index1, index2, lane, run_date);
+CREATE INDEX IF NOT EXISTS samples_by_sample_id ON samples (sample_id);
+CREATE INDEX IF NOT EXISTS samples_by_run ON samples (run_id);
+"""
+
+# for each sample of the sheet, the matching samples of the other runs; the bare columns
+# come from the row of the most recent run (SQLite's MAX() aggregate semantics)
+_INDEX_QUERY = """
+SELECT c.sample_id, c.index1, c.index2, MAX(s.run_date), r.run_name, s.sample_id, s.lane,
+       COUNT(DISTINCT s.run_id)
+FROM current c
+JOIN samples s ON s.index1 = c.index1 AND s.index2 = c.index2 AND s.run_date >= :since
+JOIN runs r ON r.id = s.run_id
+WHERE c.index1 != '' AND r.run_key != :run_key AND (:instrument = '' OR r.instrument IN (:instrument, ''))
+GROUP BY c.rowid
+ORDER BY c.rowid
+"""
+
+_SAMPLE_ID_QUERY = """
+SELECT c.sample_id, MAX(s.run_date), r.run_name, COUNT(DISTINCT s.run_id)
+FROM (SELECT DISTINCT sample_id FROM current) c
+JOIN samples s ON s.sample_id = c.sample_id
+JOIN runs r ON r.id = s.run_id
+WHERE r.run_key != :run_key
+GROUP BY c.sample_id
+ORDER BY c.sample_id
+"""
+
+
+def _field(header, names):
+    for name in names:
+        value = str(header.get(name, "")).strip()
+        if value:
+            return value
+    return ""
+
+
+def parse_date(value):
+    """ISO date (YYYY-MM-DD) of the [Header] *value*, None if it is not a known format."""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value.strip(), fmt).date().isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+def run_metadata(result, today=None):
+    """Return (run_key, run_name, run_date, instrument) of the validated sheet *result*.
+
+    The run key identifies the successive versions of a sheet: its run name and date.
+    It is None when the sheet has no run name (such sheets are not stored). Without a
+    readable date, the run is dated *today* (when it is first stored).
+    """
+    header = result.header or {}
+    run_name = _field(header, RUN_NAME_FIELDS)
+    date = parse_date(_field(header, ("Date",)))
+    run_date = date or (today or datetime.date.today()).isoformat()
+    run_key = f"{run_name}\t{date or ''}" if run_name else None
+    return run_key, run_name, run_date, _field(header, INSTRUMENT_FIELDS)
+
+
+def sample_rows(df):
+    """(lane, sample_id, index1, index2) tuples of the [Data] frame *df* (lower-case column names)."""
+    columns = df.columns
+
+    def column(name):
+        if name not in columns:
+            return [""] * len(df)
+        return ["" if value != value or value is None else str(value).strip() for value in df[name]]
+
+    indexes = [value.upper() for value in column("index")]
+    indexes2 = [value.upper() for value in column("index2")]
+    return list(zip(column("lane"), column("sample_id"), indexes, indexes2))
+
+
+def _quote(items, count):
+    quoted = "; ".join(items)
+    return quoted + "; ..." if count > len(items) else quoted
+
+
+class SheetHistory:
+    """The SQLite store of the samples of the validated sheets.
+
+    Connections are opened per call: the store can be shared by threads and by the
+    processes of several deployments (the database is in WAL mode).
+
+    Parameters:
+    path (str): the database file, created with its tables if needed.
+    days (int): index pairs used before this number of days are not reported.
+    """
+
+    def __init__(self, path, days=HISTORY_DAYS):
+        self.path = str(path)
+        self.days = days
+        with self.connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        """Connection committed (or rolled back on error) and closed on exit."""
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA synchronous=NORMAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @property
+    def stats(self):
+        with self.connect() as db:
+            runs = db.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            samples = db.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+        return {"runs": runs, "samples": samples}
+
+    def record(self, result, today=None):
+        """Store the samples of *result*; a previous version of the same run is replaced.
+
+        Sheets with errors or without a parsed [Data] section are not stored (they are
+        not the sheets used for the runs), nor the sheets without run name (see
+        :func:`run_metadata`). Return True if the sheet was stored.
+        """
+        if result.has_errors or result.df is None:
+            return False
+        run_key, run_name, run_date, instrument = run_metadata(result, today)
+        if run_key is None:
+            return False
+        rows = sample_rows(result.df)
+        with self.connect() as db:
+            found = db.execute("SELECT id, digest FROM runs WHERE run_key = ?", (run_key,)).fetchone()
+            if found is not None and found[1] == result.digest:
+                return True
+            if found is not None:
+                db.execute("DELETE FROM samples WHERE run_id = ?", (found[0],))
+                db.execute("DELETE FROM runs WHERE id = ?", (found[0],))
+            run_id = db.execute(
+                "INSERT INTO runs (run_key, digest, run_name, run_date, instrument, recorded) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_key, result.digest, run_name, run_date, instrument, datetime.date.today().isoformat()),
+            ).lastrowid
+            db.executemany(
+                "INSERT INTO samples (run_id, lane, sample_id, index1, index2, run_date) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, *row, run_date) for row in rows],
+            )
+        return True
+
+    def check(self, result, today=None):
+        """Return the cross-run checks of *result*, a list of {"status", "msg"} dicts.
+
+        The run of *result* itself (any version) is left out of the comparison.
+        """
+        if result.df is None:
+            return []
+        run_key, _, run_date, instrument = run_metadata(result, today)
+        since = (datetime.date.fromisoformat(run_date) - datetime.timedelta(days=self.days)).isoformat()
+        rows = sample_rows(result.df)
+        # a sheet without run name is not stored: all the stored runs are compared
+        parameters = {"run_key": run_key or "", "instrument": instrument, "since": since}
+        with self.connect() as db:
+            db.execute("CREATE TEMP TABLE current (lane TEXT, sample_id TEXT, index1 TEXT, index2 TEXT)")
+            db.executemany("INSERT INTO current VALUES (?, ?, ?, ?)", rows)
+            reused = db.execute(_INDEX_QUERY, parameters).fetchall()
+            collisions = db.execute(_SAMPLE_ID_QUERY, parameters).fetchall()
+            db.execute("DROP TABLE current")
+        where = f" on {instrument}" if instrument else ""
+        return [self._index_check(reused, where), self._sample_id_check(collisions)]
+
+    def _index_check(self, reused, where):
+        if not reused:
+            return {"status": "Success", "msg": f"No index pair used{where} in the last {self.days} days."}
+        items = [
+            f"{index1}{'+' + index2 if index2 else ''} of sample {sample} (run {run_name or '?'} of {date}, sample {other}, lane {lane or '-'}"
+            + (f", and {runs - 1} other runs)" if runs > 1 else ")")
+            for sample, index1, index2, date, run_name, other, lane, runs in reused[:MAX_QUOTED]
+        ]
+        return {
+            "status": "Warning",
+            "msg": f"{len(reused)} index pairs were used by other runs{where} in the last {self.days} days, "
+            f"check for carry-over: {_quote(items, len(reused))}",
+        }
+
+    def _sample_id_check(self, collisions):
+        if not collisions:
+            return {"status": "Success", "msg": "No sample ID used by a previous run."}
+        items = [
+            f"{sample} (run {run_name or '?'} of {date}" + (f", and {runs - 1} other runs)" if runs > 1 else ")")
+            for sample, date, run_name, runs in collisions[:MAX_QUOTED]
+        ]
+        return {
+            "status": "Warning",
+            "msg": f"{len(collisions)} sample IDs were already used by previous runs: "
+            f"{_quote(items, len(collisions))}",
+        }
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    """The process-wide :class:`SheetHistory` of ``HISTORY_DB``; None when it is not set."""
+    global _history
+    if not HISTORY_DB:
+        return None
+    with _history_lock:
+        if _history is None or _history.path != HISTORY_DB:
+            _history = SheetHistory(HISTORY_DB)
+        return _history
+
+
+def cross_run_checks(result):
+    """Compare *result* with the stored runs, then store it; None if the history is disabled.
+
+    The cross-run checks are informative: a database error (e.g. locked for too long,
+    disk full) is reported as a warning instead of failing the validation.
+    """
+    try:
+        history = get_history()
+        if history is None:
+            return None
+        checks = history.check(result)
+        history.record(result)
+    except sqlite3.Error as err:
+        return [{"status": "Warning", "msg": f"The history of the runs could not be used: {err}"}]
+    return checks
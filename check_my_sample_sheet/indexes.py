@@ -0,0 +1,395 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Index collision and Hamming distance analysis of the [Data] section.
+
+Indexes are packed into ``uint8`` NumPy arrays (one row per sample, one column per
+base) and compared block by block: for a block of *b* samples, the matching bases with
+the *n* samples of the lane are counted by a single ``b x n`` matrix product of their
+one-hot encodings. The product runs in BLAS, without the GIL, so the lanes of a sheet
+can be analysed by concurrent threads (see :mod:`check_my_sample_sheet.lanes`). The
+block size is derived from a memory budget, so lanes of thousands of samples are
+analysed in bounded memory without any Python-level pairwise loop.
+
+Comparing all the pairs grows with the square of the lane size. In lanes of more than
+:data:`BUCKET_SAMPLES` samples, only the pairs of samples sharing a segment of their
+indexes are compared first (see :func:`near_pairs`); all the pairs are compared only
+when the near pairs do not settle the report.
+
+For each lane, the report gives the minimum combined (I7 + I5) distance, the pairs of
+samples that are too close to be demultiplexed with one mismatch, and the largest
+number of mismatches per index read that keeps all samples separable (what
+``--barcode-mismatches`` / ``BarcodeMismatchesIndex1/2`` may be set to).
+"""
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+#: code of the positions beyond the end of a shorter index: they mismatch any base
+PAD = 255
+
+#: largest number of index mismatches accepted by bcl2fastq and BCL Convert
+MAX_MISMATCHES = 2
+
+#: pairs whose combined distance is below this value are reported as close
+CLOSE_DISTANCE = 3
+
+#: memory allowed for one block of comparisons, in bytes
+BLOCK_BYTES = 32 * 1024 * 1024
+
+#: the distance matrix (for the heatmap) is only kept for lanes up to this size
+MAX_MATRIX_SAMPLES = 192
+
+#: lanes of more samples are first analysed from their near pairs (see near_pairs)
+BUCKET_SAMPLES = 1000
+
+_LUT = np.full(256, 5, dtype=np.uint8)
+for _code, _base in enumerate("ACGTN"):
+    _LUT[ord(_base)] = _code
+    _LUT[ord(_base.lower())] = _code
+_LUT[0] = PAD
+
+# distance of the pairs left out of a block (compared by another block)
+_MASKED = np.iinfo(np.uint16).max
+
+#: symbols of the one-hot encoding: the codes of encode_indexes (A, C, G, T, N, other) and PAD
+_SYMBOLS = 7
+
+# memory of one pair in a block of analyse_lane: the float32 product of the one-hot rows (4),
+# the uint16 I7, I5, combined and separation distances (8) and two boolean masks (2)
+_PAIR_BYTES = 14
+
+# combined distance up to which the near pairs of a large lane are searched: it covers the
+# close pairs and the pairs that leave no mismatch allowed (I7 and I5 distances of at most 2)
+_NEAR_DISTANCE = 4
+
+# the near pairs are searched only if at most 1 / _NEAR_FRACTION of all the pairs share a
+# segment (comparing such a pair costs several times more than a pair of a matrix product)
+_NEAR_FRACTION = 8
+
+
+def encode_indexes(sequences, length=None):
+    """Pack *sequences* into a ``(n, length)`` uint8 array (A=0, C=1, G=2, T=3, N=4, other=5).
+
+    Shorter sequences are padded with :data:`PAD`; missing values are treated as
+    empty sequences.
+    """
+    sequences = ["" if pd.isna(seq) else str(seq).strip() for seq in sequences]
+    if length is None:
+        length = max((len(seq) for seq in sequences), default=0)
+    if not sequences or length == 0:
+        return np.full((len(sequences), length), PAD, dtype=np.uint8)
+    # fixed-width bytes are zero-padded: a view gives the raw characters without a Python loop
+    raw = np.array([seq.encode("ascii", "replace")[:length] for seq in sequences], dtype=f"S{length}")
+    return _LUT[raw.view(np.uint8).reshape(len(sequences), length)]
+
+
+def _one_hot(codes):
+    # (n, length * _SYMBOLS) float32 matrix: the dot product of two rows is the number
+    # of positions where their codes are equal (PAD included, as with ==)
+    n, length = codes.shape
+    symbols = np.where(codes == PAD, _SYMBOLS - 1, codes)
+    onehot = np.zeros((n, length, _SYMBOLS), dtype=np.float32)
+    onehot[np.arange(n)[:, None], np.arange(length)[None, :], symbols] = 1
+    return onehot.reshape(n, length * _SYMBOLS)
+
+
+def _one_hot_bytes(*codes):
+    # memory of the one-hot encodings of the arrays *codes*
+    return sum(array.size * _SYMBOLS * 4 for array in codes if array is not None)
+
+
+def _block_rows(n, block_bytes, fixed=0):
+    # a block of b rows: b x n pairs, within what the *fixed* bytes (the one-hot operands) leave
+    return max(1, min(n, (block_bytes - fixed) // max(1, n * _PAIR_BYTES)))
+
+
+def iter_distance_blocks(codes, block_bytes=BLOCK_BYTES, step=None):
+    """Yield ``(start, distances)`` where *distances* holds the Hamming distances between
+    rows ``start:start + len(distances)`` of *codes* and all its rows.
+
+    Each block uses at most about *block_bytes* of memory, one-hot encoding included.
+
+    Parameters:
+    step (int): rows per block, derived from *block_bytes* by default.
+    """
+    n, length = codes.shape
+    onehot = _one_hot(codes)
+    if step is None:
+        step = _block_rows(n, block_bytes, onehot.nbytes)
+    for start in range(0, n, step):
+        # the products are small integers: exact in float32
+        matches = onehot[start : start + step] @ onehot.T
+        yield start, np.subtract(length, matches, out=matches).astype(np.uint16)
+
+
+def pairwise_distances(codes, block_bytes=BLOCK_BYTES):
+    """Full ``(n, n)`` Hamming distance matrix of *codes* (use on small sets only)."""
+    n = len(codes)
+    matrix = np.zeros((n, n), dtype=np.uint16)
+    for start, distances in iter_distance_blocks(codes, block_bytes):
+        matrix[start : start + len(distances)] = distances
+    return matrix
+
+
+def _pack_words(codes):
+    # the rows of *codes* as uint64 words of 8 codes (zero-padded): one 1-D array per word
+    n, length = codes.shape
+    padded = np.zeros((n, -(-length // 8) * 8), dtype=np.uint8)
+    padded[:, :length] = codes
+    packed = padded.view(np.uint64)
+    return [np.ascontiguousarray(packed[:, w]) for w in range(packed.shape[1])]
+
+
+_LOW_BITS = np.uint64(0x0101010101010101)
+
+
+def _different_bytes(xor):
+    # number of non-zero bytes of each uint64 of *xor*: each byte is folded into its lowest
+    # bit, and the bits are summed into the top byte by the multiplication
+    xor = xor | (xor >> np.uint64(4))
+    xor |= xor >> np.uint64(2)
+    xor |= xor >> np.uint64(1)
+    xor &= _LOW_BITS
+    return (xor * _LOW_BITS) >> np.uint64(56)
+
+
+def _segment_key(segment):
+    # a sortable value per row of the columns *segment*, equal for equal rows
+    if segment.shape[1] <= 8:
+        return _pack_words(segment)[0]
+    return np.unique(segment, axis=0, return_inverse=True)[1].reshape(-1)
+
+
+def near_pairs(codes, max_distance, max_pairs=None, block_bytes=BLOCK_BYTES):
+    """Return ``(rows, cols, distances)``: the pairs of rows ``rows[k] < cols[k]`` of *codes*
+    whose Hamming distance is at most *max_distance*, without comparing all the pairs.
+
+    Two rows at most *max_distance* apart are equal on one of ``max_distance + 1``
+    segments of their columns (pigeonhole principle): only the rows sharing the value of
+    a segment are compared. Returns None when more than *max_pairs* pairs would be
+    compared (rows too similar for the segments to tell them apart), or when the rows
+    have fewer than ``max_distance + 1`` columns.
+    """
+    n, length = codes.shape
+    segments = max_distance + 1
+    if length < segments:
+        return None
+    bounds = np.linspace(0, length, segments + 1).astype(int)
+    buckets = []
+    for j in range(segments):
+        key = _segment_key(codes[:, bounds[j] : bounds[j + 1]])
+        # the rows of a bucket are consecutive in order, by increasing row number
+        order = np.argsort(key, kind="stable")
+        ordered = key[order]
+        partners = np.searchsorted(ordered, ordered, side="right") - np.arange(n) - 1
+        buckets.append((order, partners))
+    if max_pairs is not None and sum(int(partners.sum()) for _, partners in buckets) > max_pairs:
+        return None
+
+    # memory of one candidate pair: its positions, rows and words
+    words = _pack_words(codes)
+    chunk = max(1, block_bytes // (48 + 16 * len(words)))
+    rows, cols, distances = [], [], []
+    for order, partners in buckets:
+        total = np.cumsum(partners)
+        start = 0
+        while start < n:
+            stop = max(start + 1, int(np.searchsorted(total, total[start] - partners[start] + chunk, side="right")))
+            counts = partners[start:stop]
+            first = np.repeat(np.arange(start, stop), counts)
+            # each position is paired with the following positions of its bucket
+            second = first + 1 + np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts)
+            r, c = order[first], order[second]
+            d = sum(_different_bytes(word[r] ^ word[c]) for word in words)
+            near = d <= max_distance
+            rows.append(r[near])
+            cols.append(c[near])
+            distances.append(d[near])
+            start = stop
+
+    # a pair sharing several segments was found by each of them
+    rows, cols, distances = np.concatenate(rows), np.concatenate(cols), np.concatenate(distances)
+    _, unique = np.unique(rows * n + cols, return_index=True)
+    return rows[unique], cols[unique], distances[unique].astype(np.uint16)
+
+
+@dataclass
+class LaneIndexReport:
+    """Distances between the indexes of the samples of one lane."""
+
+    lane: Any
+    samples: list
+    #: minimum combined (I7 + I5) distance between two samples, None for a single sample
+    min_distance: Optional[int]
+    #: mismatches allowed per index read keeping all samples separable, None if two samples collide
+    mismatch_tolerance: Optional[int]
+    #: pairs closer than CLOSE_DISTANCE: columns sample_1, sample_2, distance, i7_distance, i5_distance
+    close_pairs: Any
+    #: combined distance matrix, only kept for lanes of at most max_matrix samples
+    matrix: Any = None
+
+    def to_dict(self):
+        return {
+            "lane": self.lane.item() if isinstance(self.lane, np.generic) else self.lane,
+            "samples": len(self.samples),
+            "min_distance": self.min_distance,
+            "mismatch_tolerance": self.mismatch_tolerance,
+            "close_pairs": self.close_pairs.to_dict(orient="records"),
+        }
+
+
+def _near_lane_pairs(codes7, codes5, block_bytes):
+    # the close pairs and minimums of analyse_lane from the near pairs only, None when they
+    # do not settle them (no near pair, or a mismatch tolerance depending on farther pairs)
+    codes = codes7 if codes5 is None else np.hstack([codes7, codes5])
+    n = len(codes)
+    found = near_pairs(codes, _NEAR_DISTANCE, n * (n - 1) // 2 // _NEAR_FRACTION, block_bytes)
+    if found is None or not len(found[0]):
+        return None
+    rows, cols, distances = found
+    d7 = np.count_nonzero(codes7[rows] != codes7[cols], axis=1).astype(np.uint16)
+    d5 = (distances - d7).astype(np.uint16)
+    min_separation = int(np.maximum(d7, d5).min())
+    if min_separation > _NEAR_DISTANCE // 2:
+        return None
+    close = distances < CLOSE_DISTANCE
+    return rows[close], cols[close], d7[close], d5[close], int(distances.min()), min_separation
+
+
+def _all_lane_pairs(codes7, codes5, matrix, block_bytes):
+    # the close pairs and minimums of analyse_lane, comparing all the pairs block by block;
+    # the combined distances are written to *matrix* (if not None)
+    n = len(codes7)
+    rows, cols, d7s, d5s = [], [], [], []
+    min_distance = None
+    min_separation = None
+
+    # the I7 and I5 blocks are consumed together: same rows, within one budget
+    step = _block_rows(n, block_bytes, _one_hot_bytes(codes7, codes5))
+    blocks5 = iter_distance_blocks(codes5, step=step) if codes5 is not None else None
+    for start, d7 in iter_distance_blocks(codes7, step=step):
+        d5 = next(blocks5)[1] if blocks5 is not None else np.zeros_like(d7)
+        combined = d7 + d5
+        if matrix is not None:
+            matrix[start : start + len(combined)] = combined
+
+        # upper triangle only: each pair once, no self-comparison. The columns before the
+        # block were paired with its rows by the previous blocks; the pairs on or below the
+        # diagonal of the others are masked
+        if n - start < 2:
+            continue
+        upper = combined[:, start:]
+        separation = np.maximum(d7[:, start:], d5[:, start:])
+        lower = np.tri(*upper.shape, dtype=bool)
+        upper[lower] = _MASKED
+        separation[lower] = _MASKED
+        block_min = int(upper.min())
+        min_distance = block_min if min_distance is None else min(min_distance, block_min)
+        block_separation = int(separation.min())
+        min_separation = block_separation if min_separation is None else min(min_separation, block_separation)
+
+        r, c = np.nonzero(upper < CLOSE_DISTANCE)
+        c += start
+        rows.append(r + start)
+        cols.append(c)
+        d7s.append(d7[r, c])
+        d5s.append(d5[r, c])
+
+    if rows:
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        d7s, d5s = np.concatenate(d7s), np.concatenate(d5s)
+    else:
+        rows = cols = np.zeros(0, dtype=np.intp)
+        d7s = d5s = np.zeros(0, dtype=np.uint16)
+    return rows, cols, d7s, d5s, min_distance, min_separation
+
+
+def analyse_lane(samples, i7, i5=None, lane="all", block_bytes=BLOCK_BYTES, max_matrix=MAX_MATRIX_SAMPLES):
+    """Analyse the indexes of one lane and return a :class:`LaneIndexReport`.
+
+    *i7* and *i5* are sequences of index strings (I5 is optional). Two samples stay
+    separable with *m* mismatches per index read unless both their I7 and I5 distances
+    are at most ``2m``, hence the tolerance ``(min over pairs of max(d7, d5) - 1) // 2``.
+    """
+    samples = list(samples)
+    codes7 = encode_indexes(i7)
+    codes5 = encode_indexes(i5) if i5 is not None else None
+    n = len(samples)
+    matrix = np.zeros((n, n), dtype=np.uint16) if n <= max_matrix else None
+
+    pairs = None
+    if matrix is None and n > BUCKET_SAMPLES:
+        pairs = _near_lane_pairs(codes7, codes5, block_bytes)
+    if pairs is None:
+        pairs = _all_lane_pairs(codes7, codes5, matrix, block_bytes)
+    rows, cols, d7s, d5s, min_distance, min_separation = pairs
+
+    names = np.array([str(x) for x in samples], dtype=object)
+    close_pairs = pd.DataFrame(
+        {
+            "sample_1": names[rows],
+            "sample_2": names[cols],
+            "distance": d7s + d5s,
+            "i7_distance": d7s,
+            "i5_distance": d5s,
+        }
+    ).sort_values(["distance", "sample_1", "sample_2"], ignore_index=True)
+
+    if min_separation is None:
+        tolerance = MAX_MISMATCHES if n else None
+    elif min_separation == 0:
+        tolerance = None
+    else:
+        tolerance = min(MAX_MISMATCHES, (min_separation - 1) // 2)
+
+    return LaneIndexReport(
+        lane=lane,
+        samples=samples,
+        min_distance=min_distance,
+        mismatch_tolerance=tolerance,
+        close_pairs=close_pairs,
+        matrix=matrix,
+    )
+
+
+def iter_lanes(df):
+    """Yield ``(lane, group, samples)`` for each lane of a parsed [Data] section, in lane order.
+
+    *group* holds the rows of the lane (with their original row numbers) and *samples*
+    their names: the Sample_ID, or the row number when there is no such column. There
+    is a single "all" lane when there is no Lane column.
+    """
+    samples = df["sample_id"] if "sample_id" in df.columns else pd.Series(range(1, len(df) + 1), index=df.index)
+    groups = df.groupby("lane", sort=True, dropna=False) if "lane" in df.columns else [("all", df)]
+    for lane, group in groups:
+        yield lane, group, samples.loc[group.index]
+
+
+def analyse_group(lane, group, samples, block_bytes=BLOCK_BYTES, max_matrix=MAX_MATRIX_SAMPLES):
+    """Analyse the indexes of the rows *group* of one lane (see :func:`iter_lanes`)."""
+    i5 = group["index2"] if "index2" in group.columns else None
+    return analyse_lane(samples, group["index"], i5, lane=lane, block_bytes=block_bytes, max_matrix=max_matrix)
+
+
+def analyse_indexes(df, block_bytes=BLOCK_BYTES, max_matrix=MAX_MATRIX_SAMPLES):
+    """Analyse the indexes of a parsed [Data] section, lane by lane.
+
+    *df* is the frame of ``SampleSheet.df`` (lower-cased column names). Returns a list
+    of :class:`LaneIndexReport` (one per lane, a single "all" lane when there is no
+    Lane column), or an empty list when there is no index column.
+    """
+    if df is None or "index" not in df.columns or df.empty:
+        return []
+    return [analyse_group(*lane, block_bytes=block_bytes, max_matrix=max_matrix) for lane in iter_lanes(df)]
@@ -0,0 +1,170 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Lane by lane checks of multi-lane sheets, run in parallel.
+
+The uniqueness of the indexes and of the sample IDs, and the consistency of the index
+lengths, only matter within a lane (bcl2fastq and BCL Convert demultiplex each lane on
+its own). For sheets with a Lane column holding several lanes, the [Data] frame is
+partitioned by lane and these checks (:data:`LANE_CHECKS`), with the index distance
+analysis of the lane, run on each partition. The checks take little time: the index
+analysis is most of the work, and it is needed for each lane anyway (see the
+``lane_checks`` stages of ``check-my-sample-sheet benchmark``). For sheets of at least
+:data:`PARALLEL_MIN_ROWS` rows, the lanes are spread over a pool of
+``CHECK_MY_SAMPLE_SHEET_LANE_WORKERS`` threads: the distances are BLAS matrix products,
+which run without the GIL. The validation itself already runs in a worker process,
+which cannot start processes of its own.
+
+The results of a check on all lanes are merged into one result, in lane order, and
+take its place in sequana's ``checker()``: the sheet-level checks still run once.
+"""
+import copy
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from check_my_sample_sheet import config
+from check_my_sample_sheet.indexes import BLOCK_BYTES, analyse_group, iter_lanes
+
+LANE_WORKERS = config.get("LANE_WORKERS", min(8, os.cpu_count() or 1), int)
+
+#: sheets with fewer rows are checked lane after lane in the calling thread: their
+#: distance blocks are too small for the threads to pay off
+PARALLEL_MIN_ROWS = 10000
+
+#: checks run on each lane: the checks reading the [Data] frame whose outcome only
+#: depends on the rows of a lane
+LANE_CHECKS = (
+    "_check_unique_sample_ID",
+    "_check_unique_indices",
+    "_check_homogene_I7_length",
+    "_check_homogene_I5_length",
+    "_check_homogene_I5_and_I7_length",
+)
+
+_SEVERITY = {"Success": 0, "Warning": 1, "Error": 2}
+
+
+@dataclass
+class LaneResults:
+    """Outcome of the lane by lane checks of one sheet."""
+
+    #: lanes, in sorted order
+    lanes: list
+    #: name of each lane-scoped check: its results merged over the lanes
+    checks: dict = field(default_factory=dict)
+    #: index analysis, one LaneIndexReport per lane (empty without index column)
+    indexes: list = field(default_factory=list)
+
+    def apply(self, sheet):
+        """Make the ``checker()`` of *sheet* report the merged results instead of running the checks."""
+        for name, result in self.checks.items():
+            setattr(sheet, name, lambda result=result: result)
+
+
+def has_lanes(df):
+    """True if the frame *df* has a Lane column holding several lanes."""
+    return "lane" in df.columns and df["lane"].nunique(dropna=False) > 1
+
+
+def lane_checks(sheet, df):
+    """Names of the :data:`LANE_CHECKS` that the ``checker()`` of *sheet* runs on the frame *df*."""
+    skipped = {name for name in LANE_CHECKS if not hasattr(type(sheet), name)}
+    if "index" not in df.columns:
+        skipped.add("_check_homogene_I7_length")
+    if "index2" not in df.columns:
+        skipped.update(["_check_homogene_I5_length", "_check_homogene_I5_and_I7_length"])
+    return [name for name in LANE_CHECKS if name not in skipped]
+
+
+def merge_results(lanes, results):
+    """Merge the results of one check on each lane into one result.
+
+    Lanes giving the same message are reported once. Otherwise, the messages of the
+    lanes with the most severe status are prefixed by their lane, in lane order.
+    """
+    status = max((result["status"] for result in results), key=lambda status: _SEVERITY.get(status, 2))
+    messages = [str(result["msg"]) for result in results]
+    if len(set(messages)) == 1:
+        merged = dict(results[0])
+    else:
+        merged = {key: value for key, value in results[0].items() if key not in ("msg", "status")}
+        merged["msg"] = "; ".join(
+            f"Lane {lane}: {msg}" for lane, msg, result in zip(lanes, messages, results) if result["status"] == status
+        )
+    merged["status"] = status
+    return merged
+
+
+def _check_lane(sheet, names, lane, group, samples, block_bytes):
+    # a copy of the sheet whose [Data] frame is the rows of the lane: the checks are
+    # sequana's methods (not the memoized ones set on the sheet) called on that copy
+    view = copy.copy(sheet)
+    view._df = group
+    results = []
+    for name in names:
+        try:
+            results.append(getattr(type(sheet), name)(view))
+        except Exception as err:
+            # as sequana's Checker.tryme
+            results.append({"msg": err, "status": "Error", "caller": name})
+    report = None
+    if "index" in group.columns:
+        try:
+            report = analyse_group(lane, group, samples, block_bytes=block_bytes)
+        except Exception:  # pragma: no cover
+            # e.g. unexpected column types: the analysis is informative only
+            pass
+    return results, report
+
+
+def check_lanes(sheet, df, workers=None, min_rows=PARALLEL_MIN_ROWS, block_bytes=BLOCK_BYTES):
+    """Run the lane-scoped checks and index analysis of each lane of *df*.
+
+    Returns a :class:`LaneResults`, or None when *df* has no Lane column or a single
+    lane (the checks then run on the whole frame, as in sequana).
+
+    Parameters:
+    sheet: the parsed sheet (see :func:`~check_my_sample_sheet.samplesheet.load_sample_sheet`).
+    df: its [Data] frame.
+    workers (int): lanes checked at once; defaults to LANE_WORKERS.
+    min_rows (int): smaller frames are checked in the calling thread.
+    block_bytes (int): memory allowed to the distance blocks of all the lanes checked at once.
+    """
+    if not has_lanes(df):
+        return None
+    workers = LANE_WORKERS if workers is None else workers
+    names = lane_checks(sheet, df)
+    partitions = list(iter_lanes(df))
+    parallel = workers > 1 and len(df) >= min_rows
+    if parallel:
+        block_bytes = max(1, block_bytes // min(workers, len(partitions)))
+
+    def run(partition):
+        return _check_lane(sheet, names, *partition, block_bytes)
+
+    if parallel:
+        # map() returns the results in lane order whatever the order of completion
+        with ThreadPoolExecutor(max_workers=min(workers, len(partitions)), thread_name_prefix="lanes") as pool:
+            outcomes = list(pool.map(run, partitions))
+    else:
+        outcomes = [run(partition) for partition in partitions]
+
+    lanes = [lane for lane, _, _ in partitions]
+    return LaneResults(
+        lanes=lanes,
+        checks={
+            name: merge_results(lanes, [results[position] for results, _ in outcomes])
+            for position, name in enumerate(names)
+        },
+        indexes=[report for _, report in outcomes if report is not None],
+    )
@@ -0,0 +1,447 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Load test of the web app: ``check-my-sample-sheet loadtest``.
+
+The app is started with ``streamlit run`` (or ``--url`` points to a running instance)
+and ``--sessions`` concurrent sessions are opened on its websocket, with the protocol of
+the browser. Each session loads the page, then submits ``--submissions`` sheets the way
+a user does: the sheet is pasted in the text area and Process is clicked::
+
+    check-my-sample-sheet loadtest --sessions 20 --submissions 5 --large 20000 -o load.json
+
+The sheets are drawn (with ``--seed``) from the packaged examples and, with the
+probability ``--large-ratio``, from synthetic sheets of ``--large`` rows (see
+:mod:`check_my_sample_sheet.synthetic`). The report gives the throughput (submissions
+per second), the latency percentiles of the submissions (overall and per sheet), the
+bytes sent by the server and, when the app was started by the load test on Linux, the
+peak memory (RSS) of the server process and of its children (validation workers).
+
+Streamlit's ``AppTest`` is not used: its runs set process-wide state (the runtime
+instance, config options) and cannot run concurrently in one process. The optional
+``websockets`` package is required (``pip install "check-my-sample-sheet[loadtest]"``;
+recent Streamlit versions install it too). It is only imported by the load test.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+from check_my_sample_sheet.benchmark import environment
+from check_my_sample_sheet.synthetic import generate_sample_sheet
+
+HERE = Path(__file__).resolve().parent
+
+#: percentiles of the latencies reported
+PERCENTILES = (50, 90, 95, 99)
+
+#: synthetic sheets generated for the large submissions (drawn at random)
+LARGE_VARIANTS = 4
+
+#: seconds between two memory samples
+MEMORY_INTERVAL = 0.2
+
+
+def percentile(values, q):
+    """Nearest-rank *q*-th percentile of *values* (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(latencies):
+    """Count, mean, percentiles and max of a list of latencies, in seconds."""
+    summary = {"count": len(latencies)}
+    if latencies:
+        summary["mean"] = sum(latencies) / len(latencies)
+        summary.update({f"p{q}": percentile(latencies, q) for q in PERCENTILES})
+        summary["max"] = max(latencies)
+    return summary
+
+
+def sheet_pool(large=20000, large_ratio=0.2):
+    """Return the list of (name, text, weight) the submissions are drawn from.
+
+    The packaged examples share the weight ``1 - large_ratio``, the synthetic sheets of
+    *large* rows the weight *large_ratio*.
+    """
+    examples = sorted((HERE / "examples").glob("*.csv"))
+    pool = [(path.name, path.read_text(), (1 - large_ratio) / len(examples)) for path in examples]
+    if large and large_ratio > 0:
+        for seed in range(LARGE_VARIANTS):
+            text = generate_sample_sheet(samples=large, dual_index=True, seed=seed)
+            pool.append((f"synthetic-{large}", text, large_ratio / LARGE_VARIANTS))
+    return pool
+
+
+def _rss(pid):
+    """Resident memory of *pid* in bytes (Linux), None if it is not readable."""
+    try:
+        with open(f"/proc/{pid}/status") as fin:
+            for line in fin:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _children(pid):
+    """Descendants of *pid* (Linux)."""
+    found = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return found
+    for task in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as fin:
+                children = [int(child) for child in fin.read().split()]
+        except OSError:
+            continue
+        for child in children:
+            found.append(child)
+            found.extend(_children(child))
+    return found
+
+
+class MemorySampler(threading.Thread):
+    """Peak RSS of a process and of its descendants, sampled every *interval* seconds."""
+
+    def __init__(self, pid, interval=MEMORY_INTERVAL):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.server = 0
+        self.children = {}
+        self.total = 0
+        self._stopped = threading.Event()
+
+    def sample(self):
+        server = _rss(self.pid) or 0
+        total = server
+        for child in _children(self.pid):
+            rss = _rss(child)
+            if rss:
+                self.children[child] = max(self.children.get(child, 0), rss)
+                total += rss
+        self.server = max(self.server, server)
+        self.total = max(self.total, total)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def to_dict(self):
+        mb = 1024**2
+        return {
+            "server_peak_mb": round(self.server / mb, 1),
+            "children": len(self.children),
+            "child_peak_mb": round(max(self.children.values(), default=0) / mb, 1),
+            "total_peak_mb": round(self.total / mb, 1),
+        }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(port=None, env=None, timeout=60):
+    """Start the app with ``streamlit run`` on *port*; return (process, base URL) once it answers."""
+    port = port or _free_port()
+    command = [
+        sys.executable,
+        "-m",
+        "streamlit",
+        "run",
+        str(HERE / "app.py"),
+        "--server.headless=true",
+        f"--server.port={port}",
+        "--server.address=127.0.0.1",
+        "--server.fileWatcherType=none",
+        "--browser.gatherUsageStats=false",
+    ]
+    process = subprocess.Popen(
+        command, env={**os.environ, **(env or {})}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=1):
+                return process, url
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                stop_app(process)
+                raise RuntimeError(f"the app did not start on port {port}")
+            time.sleep(0.2)
+
+
+def stop_app(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _connect(url):
+    try:
+        from websockets.asyncio.client import connect
+    except ImportError:  # websockets < 13
+        from websockets import connect
+    stream = url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+    return connect(stream, subprotocols=["streamlit"], max_size=None)
+
+
+class Session:
+    """One browser session driven over the websocket of the app.
+
+    Parameters:
+    websocket: open connection to ``/_stcore/stream``.
+    timeout (float): seconds allowed to one script run.
+    """
+
+    def __init__(self, websocket, timeout=120):
+        self.websocket = websocket
+        self.timeout = timeout
+        self.text_area = None
+        self.process_button = None
+
+    async def run(self, widgets=()):
+        """Rerun the script with the *widgets* states; return {"seconds", "bytes", "status"}.
+
+        status is "ok" when the validation results were shown, "exception" when the script
+        raised, "no result" otherwise (e.g. page load, stopped validation).
+        """
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.widget_states.widgets.extend(widgets)
+        start = time.perf_counter()
+        await self.websocket.send(message.SerializeToString())
+
+        size, status = 0, "no result"
+        while True:
+            data = await asyncio.wait_for(self.websocket.recv(), self.timeout)
+            size += len(data)
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                status = self._element(forward.delta.new_element, status)
+            elif kind == "script_finished" and forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return {"seconds": time.perf_counter() - start, "bytes": size, "status": status}
+
+    def _element(self, element, status):
+        kind = element.WhichOneof("type")
+        if kind == "text_area" and element.text_area.id.endswith("code_input"):
+            self.text_area = element.text_area.id
+        elif kind == "button" and "Process" in element.button.label:
+            self.process_button = element.button.id
+        elif kind == "heading" and element.heading.body == "Validation Results" and status != "exception":
+            return "ok"
+        elif kind == "exception":
+            return "exception"
+        return status
+
+    async def submit(self, samplesheet):
+        """Paste *samplesheet* and click Process; see :meth:`run`."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        text, button = WidgetState(id=self.text_area), WidgetState(id=self.process_button)
+        text.string_value = samplesheet
+        button.trigger_value = True
+        return await self.run([text, button])
+
+
+async def _session(url, sheets, think, timeout, records):
+    async with _connect(url) as websocket:
+        session = Session(websocket, timeout)
+        await session.run()
+        if session.text_area is None or session.process_button is None:
+            raise RuntimeError("the text area or the Process button was not found in the page")
+        for name, text in sheets:
+            try:
+                record = await session.submit(text)
+            except asyncio.TimeoutError:
+                records.append({"sheet": name, "seconds": timeout, "bytes": 0, "status": "timeout"})
+                return
+            records.append({"sheet": name, **record})
+            if think:
+                await asyncio.sleep(think)
+
+
+async def _run_sessions(url, plans, think, timeout):
+    records = []
+    results = await asyncio.gather(
+        *(_session(url, sheets, think, timeout, records) for sheets in plans), return_exceptions=True
+    )
+    failures = [f"{type(err).__name__}: {err}" for err in results if isinstance(err, BaseException)]
+    return records, failures
+
+
+def run_load(url, sessions=10, submissions=5, pool=None, think=0.0, timeout=120, seed=0):
+    """Run the load test against the app at *url*; return the report (without memory).
+
+    Parameters:
+    url (str): base URL of the app (e.g. http://127.0.0.1:8501).
+    sessions (int): concurrent sessions.
+    submissions (int): sheets submitted by each session, one after the other.
+    pool (list): (name, text, weight) of the sheets, see :func:`sheet_pool`.
+    think (float): seconds a session waits between two submissions.
+    timeout (float): seconds allowed to one submission.
+    seed (int): seed of the choice of the sheets.
+    """
+    pool = pool or sheet_pool()
+    rng = random.Random(seed)
+    weights = [weight for _, _, weight in pool]
+    plans = [[(name, text) for name, text, _ in rng.choices(pool, weights, k=submissions)] for _ in range(sessions)]
+
+    start = time.perf_counter()
+    records, failures = asyncio.run(_run_sessions(url, plans, think, timeout))
+    wall = time.perf_counter() - start
+
+    latencies = [record["seconds"] for record in records]
+    statuses = {}
+    per_sheet = {}
+    for record in records:
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+        per_sheet.setdefault(record["sheet"], []).append(record)
+    return {
+        "sessions": sessions,
+        "submissions": len(records),
+        "seconds": wall,
+        "throughput": len(records) / wall if wall else 0.0,
+        "latency": summarize(latencies),
+        "statuses": statuses,
+        "sheets": {
+            name: {
+                **summarize([record["seconds"] for record in sheet_records]),
+                "bytes": sum(record["bytes"] for record in sheet_records) // len(sheet_records),
+            }
+            for name, sheet_records in sorted(per_sheet.items())
+        },
+        "failures": failures,
+    }
+
+
+def format_report(report):
+    """Human-readable summary of a load test report."""
+    latency = report["latency"]
+    lines = [
+        f"{report['sessions']} sessions, {report['submissions']} submissions in {report['seconds']:.1f}s: "
+        f"{report['throughput']:.2f} submissions/s",
+        "statuses: " + ", ".join(f"{status} {count}" for status, count in sorted(report["statuses"].items())),
+    ]
+    if latency["count"]:
+        lines.append(
+            "latency: "
+            + "  ".join(f"p{q} {latency[f'p{q}'] * 1000:.0f}ms" for q in PERCENTILES)
+            + f"  max {latency['max'] * 1000:.0f}ms"
+        )
+    for name, sheet in report["sheets"].items():
+        lines.append(
+            f"  {name:<45} {sheet['count']:>4} x  p50 {sheet['p50'] * 1000:8.0f}ms  "
+            f"p95 {sheet['p95'] * 1000:8.0f}ms  {sheet['bytes'] / 1024:8.0f} KiB"
+        )
+    memory = report.get("memory")
+    if memory:
+        lines.append(
+            f"memory: server {memory['server_peak_mb']} MB, {memory['children']} child processes "
+            f"(largest {memory['child_peak_mb']} MB), total {memory['total_peak_mb']} MB (peaks)"
+        )
+    lines.extend(f"session failed: {failure}" for failure in report["failures"])
+    return "\n".join(lines)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="check-my-sample-sheet loadtest",
+        description="Measure the throughput, latency and memory of the web app under concurrent sessions.",
+    )
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent sessions (default: 10)")
+    parser.add_argument("--submissions", type=int, default=5, help="sheets submitted per session (default: 5)")
+    parser.add_argument("--large", type=int, default=20000, help="rows of the synthetic sheets (default: 20000)")
+    parser.add_argument(
+        "--large-ratio", type=float, default=0.2, help="share of synthetic sheets in the submissions (default: 0.2)"
+    )
+    parser.add_argument("--think", type=float, default=0.0, help="seconds between two submissions (default: 0)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed per submission (default: 120)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the choice of the sheets (default: 0)")
+    parser.add_argument("--url", help="URL of a running app (default: start one)")
+    parser.add_argument("--no-cache", action="store_true", help="disable the result cache of the app started")
+    parser.add_argument("-o", "--output", help="JSON report")
+    return parser
+
+
+def main(args=None, stdout=None):
+    """Run the ``loadtest`` subcommand and return the exit status (1 if a submission failed)."""
+    options = get_parser().parse_args(args)
+    stdout = stdout or sys.stdout
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        get_parser().error('the load test needs the websockets package: pip install "check-my-sample-sheet[loadtest]"')
+
+    pool = sheet_pool(options.large, options.large_ratio)
+    process = sampler = None
+    url = options.url
+    if url is None:
+        env = {"CHECK_MY_SAMPLE_SHEET_CACHE_SIZE": "0"} if options.no_cache else {}
+        process, url = start_app(env=env)
+        sampler = MemorySampler(process.pid)
+        sampler.start()
+    try:
+        report = run_load(
+            url,
+            options.sessions,
+            options.submissions,
+            pool,
+            think=options.think,
+            timeout=options.timeout,
+            seed=options.seed,
+        )
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if process is not None:
+            stop_app(process)
+    if sampler is not None and sampler.server:
+        report["memory"] = sampler.to_dict()
+
+    print(format_report(report), file=stdout)
+    if options.output:
+        with open(options.output, "w") as fout:
+            json.dump({"environment": environment(), "options": vars(options), "report": report}, fout, indent=2)
+            fout.write("\n")
+    failed = report["failures"] or set(report["statuses"]) - {"ok"}
+    return 1 if failed else 0
@@ -0,0 +1,213 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Timing instrumentation of the validation stages and metrics export.
+
+Code sections are timed with :func:`timed`::
+
+    with timed("checker"):
+        checks = iem.checker()
+
+Each measure feeds a process-wide summary (count, sum, p50/p95/p99 over the most
+recent observations) and, inside :func:`request_timings`, the list of timings of the
+current request, shown in the sidebar of the app.
+
+Metrics are exported in the Prometheus text format by :func:`prometheus_text` (served
+on ``/metrics`` by the HTTP API). For the Streamlit app, where no route can be added,
+set ``CHECK_MY_SAMPLE_SHEET_METRICS_FILE`` to a path that is rewritten after each
+request (e.g. for the node_exporter textfile collector) and/or
+``CHECK_MY_SAMPLE_SHEET_METRICS_LOG`` to a file receiving one JSON line per request.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from check_my_sample_sheet import config
+
+PREFIX = "check_my_sample_sheet"
+QUANTILES = (0.5, 0.95, 0.99)
+
+#: number of recent observations used to compute the quantiles of each summary
+WINDOW = 2048
+
+METRICS_FILE = config.get("METRICS_FILE", None)
+METRICS_LOG = config.get("METRICS_LOG", None)
+
+
+class Summary:
+    """Count, sum and quantiles (over the last *window* observations) of a measure."""
+
+    def __init__(self, window=WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self._recent.append(value)
+
+    def quantile(self, q):
+        if not self._recent:
+            return float("nan")
+        values = sorted(self._recent)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class MetricsRegistry:
+    """Thread-safe collection of :class:`Summary` objects indexed by (metric, stage)."""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def observe(self, metric, value, stage=None):
+        with self._lock:
+            key = (metric, stage)
+            if key not in self._summaries:
+                self._summaries[key] = Summary(self.window)
+            self._summaries[key].observe(value)
+
+    def snapshot(self):
+        """Dict {(metric, stage): {"count", "sum", "p50", "p95", "p99"}}."""
+        with self._lock:
+            return {
+                key: {
+                    "count": summary.count,
+                    "sum": summary.total,
+                    **{f"p{int(q * 100)}": summary.quantile(q) for q in QUANTILES},
+                }
+                for key, summary in self._summaries.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._summaries.clear()
+
+
+registry = MetricsRegistry()
+
+_current_timings = contextvars.ContextVar("check_my_sample_sheet_timings", default=None)
+
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block as *stage* (``stage_seconds`` metric and current request)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("stage_seconds", elapsed, stage=stage)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+@contextmanager
+def request_timings():
+    """Collect the timings of the stages run in the block; yields the list of (stage, seconds).
+
+    Blocks can be nested: the timings of an inner block are also added to the outer one.
+    """
+    timings = []
+    outer = _current_timings.get()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+        if outer is not None:
+            outer.extend(timings)
+
+
+def record(timings):
+    """Add (stage, seconds) pairs measured elsewhere (e.g. in a worker process) to the registry.
+
+    Inside :func:`request_timings`, they are also added to the timings of the current request.
+    """
+    for stage, seconds in timings:
+        registry.observe("stage_seconds", seconds, stage=stage)
+    current = _current_timings.get()
+    if current is not None:
+        current.extend(timings)
+
+
+def observe_sheet(samplesheet, rows):
+    """Record the size of a submitted sheet (bytes and [Data] rows)."""
+    registry.observe("sheet_bytes", len(samplesheet.encode("utf-8")))
+    registry.observe("sheet_rows", rows)
+
+
+def _format_value(value):
+    return "NaN" if value != value else repr(float(value))
+
+
+def prometheus_text(registry=registry):
+    """Render the metrics (and the validation cache counters) in the Prometheus text format."""
+    from check_my_sample_sheet.validation import get_validation_cache
+
+    help_texts = {
+        "stage_seconds": "Time spent in each stage of a validation request, in seconds.",
+        "sheet_bytes": "Size of the submitted sample sheets, in bytes.",
+        "sheet_rows": "Number of rows in the [Data] section of the submitted sample sheets.",
+        "upload_bytes": "Size of the uploaded files as received (compressed or not), in bytes.",
+    }
+    snapshot = registry.snapshot()
+    lines = []
+    for metric in sorted({metric for metric, _ in snapshot}):
+        name = f"{PREFIX}_{metric}"
+        lines.append(f"# HELP {name} {help_texts.get(metric, metric)}")
+        lines.append(f"# TYPE {name} summary")
+        for (other, stage), values in sorted(snapshot.items(), key=lambda item: str(item[0])):
+            if other != metric:
+                continue
+            labels = f'stage="{stage}",' if stage else ""
+            for q in QUANTILES:
+                lines.append(f'{name}{{{labels}quantile="{q}"}} {_format_value(values[f"p{int(q * 100)}"])}')
+            suffix = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {_format_value(values['sum'])}")
+            lines.append(f"{name}_count{suffix} {values['count']}")
+
+    for counter, value in get_validation_cache().stats.items():
+        if counter in ("size", "maxsize", "bytes", "maxbytes"):
+            name, kind = f"{PREFIX}_cache_{counter}", "gauge"
+        else:
+            name, kind = f"{PREFIX}_cache_{counter}_total", "counter"
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def export(timings=None, **fields):
+    """Write the configured exports after a request.
+
+    The Prometheus text is written atomically to METRICS_FILE and a JSON line with the
+    request *timings* and extra *fields* (e.g. rows, bytes) is appended to METRICS_LOG.
+    Nothing is done when neither is configured.
+    """
+    if METRICS_FILE:
+        tmp = f"{METRICS_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as fout:
+            fout.write(prometheus_text())
+        os.replace(tmp, METRICS_FILE)
+    if METRICS_LOG:
+        stages = {}
+        for stage, seconds in timings or []:
+            stages[stage] = stages.get(stage, 0.0) + seconds
+        with open(METRICS_LOG, "a") as fout:
+            fout.write(json.dumps({"time": time.time(), **fields, "timings": stages}) + "\n")
@@ -0,0 +1,367 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Pre-flight lint: structural problems found in one linear scan, before the Sequana checks.
+
+:func:`lint_stream` reads a binary file chunk by chunk, decoding it incrementally, and
+:func:`lint_text` scans a sheet already in memory (e.g. pasted). Both report:
+
+- fatal problems, for which the sheet is not validated: a size above
+  ``CHECK_MY_SAMPLE_SHEET_MAX_SHEET_SIZE`` bytes (default 32 MB, the rest of the file
+  is not read), an unknown encoding, a binary file, an empty file, no [Data] (or
+  [BCLConvert_Data]) section;
+- other problems, with their line numbers: byte order mark (removed), encoding other
+  than UTF-8, mixed line endings. The Sequana checks still run on these sheets.
+  Trailing semicolons are only reported with a fatal problem: otherwise sequana's
+  ``check_semi_column_presence`` reports them (and the quick fix removes them).
+
+The encoding is detected while decoding: UTF-16/32 files are recognised by their byte
+order mark. A UTF-8 file is read as such until an invalid byte: if the text before it
+is ASCII, the rest of the file is read as Windows-1252 (:data:`FALLBACK_ENCODING`, the
+encoding of Excel on Windows), otherwise the encodings are mixed and the file rejected.
+
+Problems are dicts like the results of sequana's ``checker()`` (name, status, msg)
+with the number of the first line concerned (None for the whole file).
+"""
+import codecs
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+from check_my_sample_sheet import config
+
+MAX_SHEET_SIZE = config.get("MAX_SHEET_SIZE", 32 * 1024 * 1024, int)
+
+CHUNK_SIZE = 64 * 1024
+
+#: lower-case names of the sections holding the samples (v1, v2)
+DATA_SECTIONS = ("data", "bclconvert_data")
+
+#: line numbers quoted in a message before "..."
+MAX_QUOTED_LINES = 5
+
+_LINE = re.compile(r"([^\r\n]*)(\r\n|\r|\n)")
+
+#: encoding of the sheets that are not UTF-8
+FALLBACK_ENCODING = "cp1252"
+
+#: UTF-16/32 byte order marks and their codec (UTF-32 first: its little-endian BOM
+#: starts with the UTF-16 one)
+_WIDE_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+#: names of the encodings in the messages (the fallback is only tried after UTF-8)
+_ENCODING_NAMES = {"utf-8": "UTF-8", "utf-16": "UTF-16", "utf-32": "UTF-32", FALLBACK_ENCODING: "UTF-8 or Windows-1252"}
+
+
+@dataclass
+class PreflightReport:
+    """Outcome of the pre-flight lint of one sheet."""
+
+    #: list of {"name", "status", "msg", "line"} dicts
+    issues: list = field(default_factory=list)
+    #: content of the sheet (byte order mark removed), None if it must not be validated
+    text: Optional[str] = None
+    #: message of the first problem preventing the validation, None if there is none
+    error: Optional[str] = None
+    #: bytes read (decompressed), before decoding
+    bytes: int = 0
+    lines: int = 0
+    #: codec the sheet was decoded with (see FALLBACK_ENCODING)
+    encoding: str = "utf-8"
+
+    @property
+    def fatal(self):
+        return self.error is not None
+
+    def add(self, name, status, msg, line=None, fatal=False):
+        self.issues.append({"name": name, "status": status, "msg": msg, "line": line})
+        if fatal and self.error is None:
+            self.error = msg
+
+
+def _quote_lines(numbers, count):
+    quoted = ", ".join(str(number) for number in numbers)
+    if count > len(numbers):
+        quoted += ", ..."
+    return f"line {quoted}" if count == 1 else f"lines {quoted} ({count} lines)"
+
+
+class _Linter:
+    """Line by line checks fed with decoded pieces of the sheet."""
+
+    def __init__(self, report):
+        self.report = report
+        self.lines = 0
+        # text after the last line ending, in pieces: a long line is joined once
+        self._pending = []
+        self._endings = {"\n": [], "\r\n": [], "\r": []}
+        self._counts = {"\n": 0, "\r\n": 0, "\r": 0}
+        self._semicolons = []
+        self._semicolon_count = 0
+        self._sections = set()
+        self._content = False
+
+    def feed(self, text):
+        if "\n" not in text and "\r" not in text:
+            self._pending.append(text)
+            return
+        data = "".join(self._pending) + text
+        # lines are matched up to the last line ending only (the regex would scan the rest
+        # from each of its positions); a final \r may be the first half of a \r\n
+        last = len(data) - 1 if data.endswith("\r") else len(data)
+        end = max(data.rfind("\n", 0, last), data.rfind("\r", 0, last)) + 1
+        position = 0
+        for match in _LINE.finditer(data, 0, end):
+            self._line(match.group(1), match.group(2))
+            position = match.end()
+        self._pending = [data[position:]]
+
+    def close(self):
+        pending = "".join(self._pending)
+        if pending:
+            self._line(pending, "")
+            self._pending = []
+        self._report()
+
+    def _line(self, line, ending):
+        self.lines += 1
+        if ending:
+            self._counts[ending] += 1
+            if len(self._endings[ending]) < MAX_QUOTED_LINES:
+                self._endings[ending].append(self.lines)
+
+        line = line.strip()
+        if not line:
+            return
+        self._content = True
+        if line.endswith(";"):
+            self._semicolon_count += 1
+            if len(self._semicolons) < MAX_QUOTED_LINES:
+                self._semicolons.append(self.lines)
+        if line.startswith("["):
+            # same cleaning as sequana: "[Data],,," is the [Data] section
+            line = line.strip(", ;")
+            if line.endswith("]"):
+                self._sections.add(line[1:-1].strip().lower())
+
+    def _report(self):
+        report = self.report
+        report.lines = self.lines
+        if not self._content:
+            report.add("preflight_empty", "Error", "The sample sheet is empty.", fatal=True)
+            return
+
+        used = [ending for ending, count in self._counts.items() if count]
+        if len(used) > 1:
+            names = {"\n": "LF (Unix)", "\r\n": "CRLF (Windows)", "\r": "CR (old Mac)"}
+            # quote the lines of the least used endings
+            used.sort(key=lambda ending: -self._counts[ending])
+            details = "; ".join(
+                f"{names[ending]} at {_quote_lines(self._endings[ending], self._counts[ending])}" for ending in used[1:]
+            )
+            report.add(
+                "preflight_line_endings",
+                "Warning",
+                f"Mixed line endings: mostly {names[used[0]]}, but {details}. The file was probably "
+                "edited with different tools.",
+                line=min(self._endings[used[1]]),
+            )
+
+        if not self._sections.intersection(DATA_SECTIONS):
+            report.add(
+                "preflight_data_section",
+                "Error",
+                "No [Data] section (or [BCLConvert_Data] for v2 sheets): there are no samples to check.",
+                fatal=True,
+            )
+
+        # the sheets validated get sequana's check_semi_column_presence instead
+        if self._semicolon_count and report.fatal:
+            report.add(
+                "preflight_semicolons",
+                "Error",
+                f"Trailing ';' at {_quote_lines(self._semicolons, self._semicolon_count)}: the file was "
+                "probably saved by a spreadsheet software with ';' as separator.",
+                line=self._semicolons[0],
+            )
+
+
+def _too_large(report, max_size):
+    size = f"{max_size / 1024**2:g} MB" if max_size >= 1024**2 else f"{max_size} bytes"
+    report.add(
+        "preflight_size",
+        "Error",
+        f"The sheet is larger than {size}: it is probably not a sample sheet.",
+        fatal=True,
+    )
+
+
+def _byte_order_mark(report):
+    report.add("preflight_bom", "Warning", "The sheet starts with a byte order mark (BOM); it was removed.", line=1)
+
+
+def _binary(report, text, line):
+    line += text[: text.index("\x00")].count("\n")
+    report.add("preflight_binary", "Error", f"Binary content (NUL byte) at line {line}.", line=line, fatal=True)
+
+
+def _decode_error(report, data, position, line, encoding):
+    if encoding in ("utf-8", FALLBACK_ENCODING):
+        line += data[:position].count(b"\n")
+    hint = ""
+    if encoding == "utf-8":
+        try:
+            data[position : position + 32].decode(FALLBACK_ENCODING)
+            hint = " It mixes UTF-8 and Latin-1/Windows-1252 (e.g. saved by Excel) text: save it as UTF-8."
+        except UnicodeDecodeError:
+            pass
+    byte = data[position : position + 1].hex()
+    report.add(
+        "preflight_encoding",
+        "Error",
+        f"The file is not {_ENCODING_NAMES[encoding]} text: invalid byte 0x{byte} at line {line}.{hint}",
+        line=line,
+        fatal=True,
+    )
+
+
+def _fallback_encoding(report, data, position, line):
+    line += data[:position].count(b"\n")
+    report.add(
+        "preflight_encoding",
+        "Warning",
+        f"The file is not UTF-8 text (byte 0x{data[position : position + 1].hex()} at line {line}): it was read as "
+        "Latin-1/Windows-1252, as saved by Excel. Save it as UTF-8 (or ASCII) for bcl2fastq and BCL Convert.",
+        line=line,
+    )
+
+
+def lint_stream(stream, max_size=None, chunk_size=CHUNK_SIZE):
+    """Lint the binary file object *stream*, read *chunk_size* bytes at a time.
+
+    The encoding is detected on the fly (see the module documentation). Reading stops
+    at the first fatal problem (encoding, size): with a decompressing *stream* (e.g. a
+    gzip file), *max_size* bounds the decompressed bytes. The text of the sheet is kept
+    in :attr:`PreflightReport.text` unless a fatal problem was found.
+
+    Parameters:
+    stream: binary file object (e.g. a Streamlit UploadedFile or a zip member).
+    max_size (int): largest size accepted, in bytes; defaults to MAX_SHEET_SIZE.
+    chunk_size (int): bytes read at a time.
+    """
+    max_size = MAX_SHEET_SIZE if max_size is None else max_size
+    report = PreflightReport()
+    linter = _Linter(report)
+    pieces = []
+
+    # at least 4 bytes first: enough to recognise a UTF-16/32 byte order mark
+    chunk = stream.read(max(chunk_size, 4))
+    for bom, codec in _WIDE_BOMS:
+        if chunk.startswith(bom):
+            report.encoding = codec
+            report.add(
+                "preflight_encoding",
+                "Warning",
+                f"The file is {_ENCODING_NAMES[codec]} encoded: it was read as such. Save it as UTF-8 (or ASCII) "
+                "for bcl2fastq and BCL Convert.",
+                line=1,
+            )
+            break
+    decoder = codecs.getincrementaldecoder(report.encoding)()
+    # True while the text decoded so far is ASCII, i.e. the same in UTF-8 and Windows-1252
+    ascii_only = True
+
+    def decode(chunk, final=False):
+        # the decoded text of chunk, None after a fatal decoding error
+        nonlocal decoder, ascii_only
+        pending = decoder.getstate()[0] if report.encoding == "utf-8" else b""
+        try:
+            text = decoder.decode(chunk, final)
+        except UnicodeDecodeError as err:
+            data, line = pending + chunk, linter.lines + 1
+            valid = data[: err.start].decode("utf-8") if report.encoding == "utf-8" else None
+            if valid is None or not (ascii_only and valid.isascii()):
+                _decode_error(report, data, err.start, line, report.encoding)
+                return None
+            # an ASCII text so far: the rest of the file is read with the fallback encoding
+            decoder = codecs.getincrementaldecoder(FALLBACK_ENCODING)()
+            try:
+                text = valid + decoder.decode(data[err.start :], final)
+            except UnicodeDecodeError as other:
+                _decode_error(report, data, err.start + other.start, line, FALLBACK_ENCODING)
+                return None
+            _fallback_encoding(report, data, err.start, line)
+            report.encoding = FALLBACK_ENCODING
+        if ascii_only:
+            ascii_only = text.isascii()
+        return text
+
+    while chunk:
+        report.bytes += len(chunk)
+        if report.bytes > max_size:
+            _too_large(report, max_size)
+            return report
+
+        text = decode(chunk)
+        if text is None:
+            return report
+        if not pieces and text.startswith("\ufeff"):
+            text = text[1:]
+            if report.encoding == "utf-8":
+                _byte_order_mark(report)
+        if "\x00" in text:
+            _binary(report, text, linter.lines + 1)
+            return report
+        if text:
+            linter.feed(text)
+            pieces.append(text)
+        chunk = stream.read(chunk_size)
+
+    text = decode(b"", final=True)
+    if text is None:
+        return report
+    if text:
+        linter.feed(text)
+        pieces.append(text)
+
+    linter.close()
+    if not report.fatal:
+        report.text = "".join(pieces)
+    return report
+
+
+def lint_text(text, max_size=None):
+    """Lint the sheet *text* (already decoded, e.g. pasted in the app); see :func:`lint_stream`."""
+    max_size = MAX_SHEET_SIZE if max_size is None else max_size
+    report = PreflightReport(bytes=len(text.encode("utf-8")))
+    if report.bytes > max_size:
+        _too_large(report, max_size)
+        return report
+    if text.startswith("\ufeff"):
+        text = text[1:]
+        _byte_order_mark(report)
+    if "\x00" in text:
+        _binary(report, text, 1)
+        return report
+
+    linter = _Linter(report)
+    for start in range(0, len(text), CHUNK_SIZE):
+        linter.feed(text[start : start + CHUNK_SIZE])
+    linter.close()
+    if not report.fatal:
+        report.text = text
+    return report
@@ -0,0 +1,299 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Typed check results and their machine-readable exports.
+
+Sequana's ``checker()`` returns plain ``{"status", "msg"}`` dicts. :class:`CheckReport`
+turns the checks of a :class:`~check_my_sample_sheet.validation.ValidationResult` into
+compact :class:`CheckResult` records: a :class:`Status`, a stable check ID (the name of
+sequana's check, e.g. ``check_unique_sample_ID``), the section read by the check, the
+[Data] rows, file lines, samples and lanes quoted by its message, and the time it took.
+The counts per status are computed once, when the report is built.
+
+Reports are exported in the :data:`EXPORT_FORMATS`:
+
+- ``json``: one object with the summary and the list of checks;
+- ``ndjson``: one object per check, each with the digest of the sheet, so that the
+  reports of many sheets can be concatenated;
+- ``html``: a self-contained page (inline style, no script).
+
+Reports and exports are cached under the digest of the sheet (see
+:func:`check_report` and :func:`export_report`): a sheet is neither validated nor
+rendered again to be exported.
+"""
+import html
+import json
+import re
+from enum import Enum
+from typing import NamedTuple, Optional
+
+from check_my_sample_sheet.cache import LRUCache
+from check_my_sample_sheet.samplesheet import CHECK_SECTIONS
+from check_my_sample_sheet.validation import CACHE_BYTES, CACHE_SIZE, CACHE_TTL
+
+#: export format: MIME type and file extension
+EXPORT_FORMATS = {
+    "json": ("application/json", "json"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "html": ("text/html", "html"),
+}
+
+#: sections of the checks that read the data or settings section, per sheet version
+_SECTION_NAMES = {
+    "v1": {"data": "Data", "settings": "Settings"},
+    "v2": {"data": "BCLConvert_Data", "settings": "BCLConvert_Settings"},
+}
+
+#: checks quoting the line numbers of the file (the others quote rows of the [Data] section)
+FILE_LINE_CHECKS = ("check_semi_column_presence",)
+
+_MISSING_SECTION = re.compile(r"The (?:optional |required )?\[(\w+)\] section is missing")
+#: checks quoting row or line numbers, and how (the numbers are in the first group); the
+#: messages of the other checks may hold numbers that are not rows, e.g. comma counts
+_ROW_REFERENCES = {
+    "check_unique_sample_name": re.compile(r"Duplicated entries on lines: (\d+(?:,\d+)*)"),
+    "check_unique_sample_ID": re.compile(r"Duplicated entries on lines: (\d+(?:,\d+)*)"),
+    "check_sample_lane_number": re.compile(r"in these rows: \[(\d+(?:, \d+)*)\]"),
+    "check_nucleotide_indices": re.compile(r"invalid nucleotides \[(\d+(?:, \d+)*)\]"),
+    "check_alpha_numerical": re.compile(r"\(line (\d+)\)"),
+    "check_semi_column_presence": re.compile(r"end of line \((\d+)\)"),
+}
+_LANES = re.compile(r"(?:^|; )Lane (\S+?): ")
+_SAMPLE_IDS = re.compile(r"related to sample IDs: (.*)$")
+
+
+def _nbytes(value):
+    # estimated size of a cached report (a few hundred bytes per check) or export
+    return len(value) if isinstance(value, str) else sum(256 + len(check.message) for check in value.checks)
+
+
+# the report of a sheet and its exports: one entry each
+_cache = LRUCache(maxsize=CACHE_SIZE * (1 + len(EXPORT_FORMATS)), ttl=CACHE_TTL, maxbytes=CACHE_BYTES, sizeof=_nbytes)
+
+
+class Status(str, Enum):
+    """Outcome of a check; equal to sequana's status strings (``Status.ERROR == "Error"``)."""
+
+    SUCCESS = "Success"
+    WARNING = "Warning"
+    ERROR = "Error"
+
+    @property
+    def severity(self):
+        return _SEVERITY[self]
+
+
+_SEVERITY = {Status.SUCCESS: 0, Status.WARNING: 1, Status.ERROR: 2}
+
+
+class CheckResult(NamedTuple):
+    """One check of a sheet."""
+
+    #: name of the check, e.g. check_unique_sample_ID
+    id: str
+    status: Status
+    message: str
+    #: section read by the check, None for the whole file
+    section: Optional[str] = None
+    #: rows of the data section (1-based) quoted by the message
+    rows: tuple = ()
+    #: lines of the file (1-based) quoted by the message
+    lines: tuple = ()
+    #: samples (Sample_ID) concerned
+    samples: tuple = ()
+    #: lanes quoted by the message (lane by lane checks of multi-lane sheets)
+    lanes: tuple = ()
+    #: time spent in the check, None if it was not timed (e.g. a missing section)
+    seconds: Optional[float] = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status.value,
+            "message": self.message,
+            "section": self.section,
+            "rows": list(self.rows),
+            "lines": list(self.lines),
+            "samples": list(self.samples),
+            "lanes": list(self.lanes),
+            "seconds": self.seconds,
+        }
+
+
+def check_id(check, position):
+    """Stable ID of the *check* dict found at *position* in the results of ``checker()``."""
+    name = check.get("name") or check.get("caller")
+    if name:
+        return str(name).lstrip("_")
+    found = _MISSING_SECTION.search(str(check.get("msg", "")))
+    if found:
+        return f"check_{found.group(1).lower()}_section"
+    return f"check_{position}"
+
+
+def _references(check_id, message, df):
+    # (rows, lines, samples, lanes) quoted by the message of a check
+    pattern = _ROW_REFERENCES.get(check_id)
+    numbers = ()
+    if pattern:
+        numbers = tuple(int(number) for found in pattern.finditer(message) for number in found.group(1).split(","))
+    rows, lines = ((), numbers) if check_id in FILE_LINE_CHECKS else (numbers, ())
+    samples = []
+    found = _SAMPLE_IDS.search(message)
+    if found:
+        samples = [sample.strip() for sample in found.group(1).split(",")]
+    elif rows and df is not None and "sample_id" in df.columns:
+        # the rows are positions in the [Data] frame (in the whole frame for lane checks too)
+        samples = [str(df["sample_id"].iat[row - 1]) for row in rows if 0 < row <= len(df)]
+    return rows, lines, tuple(dict.fromkeys(samples)), tuple(_LANES.findall(message))
+
+
+def _section(check_id, version, message):
+    found = _MISSING_SECTION.search(message)
+    if found:
+        return found.group(1)
+    section = CHECK_SECTIONS.get(f"_{check_id}", "data")
+    return _SECTION_NAMES.get(version, _SECTION_NAMES["v1"]).get(section, section) if section else None
+
+
+class CheckReport:
+    """Typed checks of one sheet, with their counts per status.
+
+    Build it with :meth:`from_result`, or get the cached one with :func:`check_report`.
+    """
+
+    __slots__ = ("digest", "version", "error", "seconds", "checks", "counts")
+
+    def __init__(self, digest, version, error, checks, seconds=0.0):
+        self.digest = digest
+        self.version = version
+        #: message of the first error, None if the sheet is valid
+        self.error = error
+        self.seconds = seconds
+        #: tuple of CheckResult, in the order of sequana's checker()
+        self.checks = tuple(checks)
+        #: number of checks per status (Error, Warning, Success)
+        self.counts = {status.value: 0 for status in reversed(Status)}
+        for check in self.checks:
+            self.counts[check.status.value] += 1
+
+    @classmethod
+    def from_result(cls, result):
+        """Build the report of a :class:`~check_my_sample_sheet.validation.ValidationResult`."""
+        timings = getattr(result, "check_seconds", {})
+        checks = []
+        for position, check in enumerate(result.checks):
+            ident = check_id(check, position)
+            message = str(check["msg"])
+            rows, lines, samples, lanes = _references(ident, message, result.df)
+            checks.append(
+                CheckResult(
+                    id=ident,
+                    status=Status(check["status"]),
+                    message=message,
+                    section=_section(ident, result.version, message),
+                    rows=rows,
+                    lines=lines,
+                    samples=samples,
+                    lanes=lanes,
+                    seconds=timings.get(f"_{ident}"),
+                )
+            )
+        return cls(result.digest, result.version, result.error, checks, seconds=result.seconds)
+
+    @property
+    def is_valid(self):
+        return self.error is None
+
+    def to_dict(self):
+        return {
+            "digest": self.digest,
+            "version": self.version,
+            "valid": self.is_valid,
+            "error": self.error,
+            "seconds": self.seconds,
+            "counts": dict(self.counts),
+            "checks": [check.to_dict() for check in self.checks],
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    def to_ndjson(self):
+        """One JSON line per check, with the digest and version of the sheet."""
+        return "".join(
+            json.dumps({"digest": self.digest, "version": self.version, **check.to_dict()}) + "\n"
+            for check in self.checks
+        )
+
+    def to_html(self, title="Sample sheet report"):
+        """A self-contained HTML page: summary and table of the checks."""
+        colors = {Status.SUCCESS: "#d4edda", Status.WARNING: "#fff3cd", Status.ERROR: "#f8d7da"}
+        rows = []
+        for check in self.checks:
+            references = []
+            if check.lanes:
+                references.append(f"lanes {', '.join(check.lanes)}")
+            if check.rows:
+                references.append(f"rows {', '.join(map(str, check.rows))}")
+            if check.lines:
+                references.append(f"lines {', '.join(map(str, check.lines))}")
+            if check.samples:
+                references.append(f"samples {', '.join(check.samples)}")
+            seconds = "" if check.seconds is None else f"{check.seconds * 1000:.1f}"
+            rows.append(
+                f'<tr style="background: {colors[check.status]}">'
+                f"<td>{check.status.value}</td><td>{html.escape(check.id)}</td>"
+                f"<td>{html.escape(check.section or '')}</td><td>{html.escape(check.message)}</td>"
+                f"<td>{html.escape('; '.join(references))}</td><td>{seconds}</td></tr>"
+            )
+        verdict = "valid" if self.is_valid else f"invalid: {html.escape(self.error)}"
+        counts = ", ".join(f"{count} {status.lower()}" for status, count in self.counts.items())
+        return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; width: 100%; }}
+th, td {{ border: 1px solid #999; padding: 4px 8px; text-align: left; vertical-align: top; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(title)}</h1>
+<p>Illumina {self.version} sample sheet, {verdict}.</p>
+<p>{counts}. Checked in {self.seconds * 1000:.0f} ms. SHA-256: <code>{self.digest}</code></p>
+<table>
+<tr><th>Status</th><th>Check</th><th>Section</th><th>Message</th><th>References</th><th>ms</th></tr>
+{chr(10).join(rows)}
+</table>
+</body>
+</html>
+"""
+
+
+def check_report(result):
+    """The :class:`CheckReport` of *result*, cached under the digest of its sheet."""
+    return _cache.get_or_set((result.digest, "report"), lambda: CheckReport.from_result(result))
+
+
+def export_report(result, fmt):
+    """The report of *result* in the format *fmt* (see :data:`EXPORT_FORMATS`), cached under the digest of its sheet."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown report format {fmt!r}; expected one of {', '.join(EXPORT_FORMATS)}")
+    return _cache.get_or_set((result.digest, fmt), lambda: getattr(check_report(result), f"to_{fmt}")())
+
+
+def get_report_cache():
+    """The :class:`~check_my_sample_sheet.cache.LRUCache` of the reports and their exports."""
+    return _cache
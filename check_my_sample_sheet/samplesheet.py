@@ -0,0 +1,327 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Sample sheets built from text instead of files.
+
+The :mod:`sequana.iem` classes read their input from a path. The classes below keep
+the sheet in memory: sections are scanned from the string and the checks that re-read
+the file use the same lines, so validating a pasted or uploaded sheet touches no disk.
+
+Only :meth:`~sequana.iem.SampleSheet.quick_fix` insists on real paths. It runs in a
+:class:`ScratchArea`: a private directory (on ``/dev/shm`` when available) whose files
+are deleted as soon as they are released.
+
+With a section memo (see :meth:`_TextSourceMixin.use_memo`), the parsed [Data] frame
+and the result of each check are stored under the digest of the section they read, so
+re-checking an edited sheet only re-runs the checks of the sections that changed.
+"""
+import atexit
+import functools
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from sequana.iem import BCLConvert, SampleSheet
+
+from check_my_sample_sheet import config
+from check_my_sample_sheet.cache import LRUCache
+
+
+def _default_scratch_root():
+    # prefer a RAM-backed filesystem so that scratch files never hit the disk
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        return shm
+    return None
+
+
+class ScratchArea:
+    """Pool of scratch file paths inside a private temporary directory.
+
+    Paths are leased with :meth:`path`. When the lease ends the file is removed and its
+    name returns to the pool, so the directory holds at most one file per concurrent
+    lease. The directory is created on first use and removed at interpreter exit.
+
+    Parameters:
+    root (str): parent of the scratch directory (default: /dev/shm if writable, else the system temp dir).
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+        self._directory = None
+        self._free = []
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        with self._lock:
+            if self._directory is None or not os.path.isdir(self._directory):
+                self._directory = tempfile.mkdtemp(prefix="check-my-sample-sheet-", dir=self.root)
+                atexit.register(self.cleanup)
+            return self._directory
+
+    @contextmanager
+    def path(self):
+        """Lease a scratch file path; the file is deleted when the context exits."""
+        directory = self.directory
+        with self._lock:
+            if self._free:
+                name = self._free.pop()
+            else:
+                name = f"scratch-{self._created}.csv"
+                self._created += 1
+        filename = os.path.join(directory, name)
+        try:
+            yield filename
+        finally:
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            with self._lock:
+                self._free.append(name)
+
+    def cleanup(self):
+        """Remove the scratch directory and everything left in it."""
+        with self._lock:
+            if self._directory is not None:
+                shutil.rmtree(self._directory, ignore_errors=True)
+                self._directory = None
+            self._free.clear()
+
+
+scratch = ScratchArea(root=config.get("SCRATCH_DIR", None) or _default_scratch_root())
+
+#: section read by each check: "data" and "settings" stand for the data_section and
+#: settings_section of the class, None for the whole text. Unlisted checks read "data".
+CHECK_SECTIONS = {
+    "_check_settings": "settings",
+    "_check_file_format_version": "Header",
+    "_check_cloud_data_section_csv_format": "Cloud_Data",
+    "_check_semi_column_presence": None,
+}
+
+#: entries of a section memo: about 20 checks, the [Data] frame and the index analysis per sheet
+SECTION_MEMO_SIZE = 128
+
+
+def section_memo(maxsize=SECTION_MEMO_SIZE):
+    """Return an empty memo for :meth:`_TextSourceMixin.use_memo` (one per editing session)."""
+    return LRUCache(maxsize=maxsize)
+
+
+class _TextSourceMixin:
+    """Replace the file reads of :class:`sequana.iem.SampleSheet` by reads of :attr:`text`.
+
+    The sheet cannot change once built, so the [Data] frame is parsed once and reused
+    by all checks (sequana re-reads it with pandas on every ``df`` access).
+    """
+
+    def __init__(self, text, sections=None):
+        self.filename = "<memory>"
+        self.text = text
+        self.memo = None
+        self._digests = {}
+        if sections is not None:
+            # already scanned (e.g. during version detection)
+            self.sections = sections
+            return
+        # like sequana, tolerate scanning failures so that quick_fix remains usable
+        try:
+            self._scan_sections()
+        except Exception:  # pragma: no cover
+            self.sections = {}
+
+    @property
+    def df(self):
+        try:
+            return self._df
+        except AttributeError:
+            if self.memo is None:
+                self._df = self._get_df()
+            else:
+                self._df = self.memo.get_or_set(self.memo_key("df", self.data_section), self._get_df)
+            return self._df
+
+    def section_digest(self, section):
+        """SHA-256 digest of the lines of *section*, None if the sheet has no such section."""
+        if section not in self._digests:
+            lines = self.sections.get(section)
+            self._digests[section] = (
+                None if lines is None else hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+            )
+        return self._digests[section]
+
+    def memo_key(self, name, section):
+        """Key of the result *name* computed from *section* in the section memo."""
+        return (type(self).__name__, name, section, self.section_digest(section))
+
+    def use_memo(self, memo):
+        """Reuse (and store) the [Data] frame and check results in *memo*, an LRUCache.
+
+        Each ``_check_*`` method is wrapped so that its result is looked up under the
+        digest of the section it reads (see :data:`CHECK_SECTIONS`). Checks raising an
+        exception are not memoized.
+        """
+        self.memo = memo
+        sections = {"data": self.data_section, "settings": self.settings_section}
+        for name in dir(type(self)):
+            if not name.startswith("_check_") or name in ("_check_csv_format",):
+                continue
+            section = CHECK_SECTIONS.get(name, "data")
+            if section is None:
+                continue
+            setattr(self, name, self._memoized(getattr(self, name), sections.get(section, section)))
+
+    def _memoized(self, method, section):
+        @functools.wraps(method)
+        def wrapper():
+            return self.memo.get_or_set(self.memo_key(method.__name__, section), method)
+
+        return wrapper
+
+    def trace_checks(self):
+        """Time each ``_check_*`` method and name its result.
+
+        The duration of each check is stored in :attr:`check_seconds`, by method name,
+        and results without ``name`` get the name of the method (without the leading
+        underscore, as sequana names them). Call it last (e.g. after :meth:`use_memo`):
+        the methods set on the sheet are wrapped as they are.
+        """
+        self.check_seconds = {}
+        for name in dir(type(self)):
+            # _check_csv_format is a helper of the other checks
+            if name.startswith("_check_") and name != "_check_csv_format":
+                setattr(self, name, self._traced(getattr(self, name), name))
+
+    def _traced(self, method, name):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                self.check_seconds[name] = time.perf_counter() - start
+            if isinstance(result, dict) and "name" not in result:
+                # a copy: the result may be shared (e.g. by the section memo)
+                result = {"name": name[1:], **result}
+            return result
+
+        # reported by sequana's Checker.tryme when the check raises
+        wrapper.__name__ = name
+        return wrapper
+
+    def _readlines(self):
+        # newline=None: universal newlines, as when sequana opens the file in text mode
+        return io.StringIO(self.text, newline=None).readlines()
+
+    def _scan_sections(self):
+        # same parsing as SampleSheet._scan_sections, reading from memory
+        current_section = None
+        data = {}
+        for line_count, line in enumerate(self._readlines()):
+            line = self._line_cleaner(line, line_count + 1)
+            if len(line) == 0:
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                current_section = line.lstrip("[").rstrip("]")
+                data[current_section] = []
+            else:
+                data.setdefault(current_section, []).append(line)
+
+        # lines before the first section are stored under None (see sequana)
+        if None in data:
+            data["None"] = data.pop(None)
+
+        self.sections = {k.title(): v for k, v in data.items()}
+
+    def _check_semi_column_presence(self):
+        for line_count, line in enumerate(self._readlines(), 1):
+            if line.rstrip().endswith(";"):
+                return {
+                    "name": "check_semi_column_presence",
+                    "msg": f"suspicous ; at the end of line ({line_count})",
+                    "status": "Error",
+                }
+        return {"name": "check_semi_column_presence", "msg": "No extra semi column found.", "status": "Success"}
+
+    def quick_fix_text(self):
+        """Return the content of the sheet fixed by sequana's ``quick_fix``."""
+        with scratch.path() as source, scratch.path() as target:
+            with open(source, "w") as fout:
+                fout.write(self.text)
+            filename, self.filename = self.filename, source
+            try:
+                self.quick_fix(target)
+            finally:
+                self.filename = filename
+            with open(target, "r") as fin:
+                return fin.read()
+
+
+class TextSampleSheet(_TextSourceMixin, SampleSheet):
+    """In-memory :class:`sequana.iem.SampleSheet` (v1, bcl2fastq)."""
+
+
+class TextBCLConvert(_TextSourceMixin, BCLConvert):
+    """In-memory :class:`sequana.iem.BCLConvert` (v2, BCL Convert)."""
+
+
+def _detect_version(sheet):
+    # same detection rules as sequana.iem.get_sample_sheet_version
+    if BCLConvert.data_section in sheet.sections or BCLConvert.settings_section in sheet.sections:
+        return "v2"
+    try:
+        if str(sheet.header.get("FileFormatVersion", "")).strip() == "2":
+            return "v2"
+    except Exception:
+        pass
+    return "v1"
+
+
+def load_sample_sheet(text, memo=None):
+    """Parse *text* once and return a tuple (version, sheet).
+
+    version is ``"v2"`` (BCL Convert) or ``"v1"`` (bcl2fastq) and sheet the matching
+    :class:`TextBCLConvert` or :class:`TextSampleSheet`. Sequana's own factory scans the
+    file twice (once to detect the version, once to build the object); here the
+    sections scanned for the detection are handed over to the final object.
+
+    Parameters:
+    memo (LRUCache): section memo (see :func:`section_memo`) shared by successive versions of a sheet.
+    """
+    sheet = TextSampleSheet(text)
+    version = _detect_version(sheet)
+    if version == "v2":
+        sheet = TextBCLConvert(text, sections=sheet.sections)
+    if memo is not None:
+        sheet.use_memo(memo)
+    return version, sheet
+
+
+def get_sample_sheet_version(text):
+    """Return ``"v2"`` for BCL Convert sample sheets, ``"v1"`` otherwise.
+
+    In-memory counterpart of :func:`sequana.iem.get_sample_sheet_version`, with the
+    same detection rules.
+    """
+    return _detect_version(TextSampleSheet(text))
+
+
+def SampleSheetFactory(text):
+    """Return a :class:`TextBCLConvert` or :class:`TextSampleSheet` built from *text*."""
+    return load_sample_sheet(text)[1]
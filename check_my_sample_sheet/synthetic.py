@@ -0,0 +1,190 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Synthetic sample sheets for benchmarks and tests.
+
+:func:`generate_sample_sheet` writes v1 (bcl2fastq) or v2 (BCL Convert) sheets of any
+size, spread over lanes, with single or dual indexes. Without injected errors the
+sheet has no error (v1 sheets get a warning about optional columns); each entry of
+:data:`ERRORS` reproduces one of the mistakes of the bundled examples::
+
+    text = generate_sample_sheet(samples=10000, lanes=4, errors=["semicolons"])
+
+Generation is deterministic for a given *seed*.
+"""
+import random
+
+#: injectable errors and the example each one reproduces
+ERRORS = {
+    "semicolons": "trailing ';' added by spreadsheet software (Bad_SampleSheet_extra_semicolons.csv)",
+    "alphanum": "Sample_ID with a character other than letters, digits, - and _ (Bad_SampleSheet_alphanum.csv)",
+    "duplicate_sample_id": "two rows with the same Sample_ID (case2.csv)",
+    "lowercase_index": "index written in lower case (case2.csv)",
+    "duplicate_index": "two samples of a lane with the same indexes",
+    "bad_adapter": "adapter with a space and an N (case2.csv)",
+    "index_length": "one I7 index shorter than the others",
+}
+
+_BASES = "ACGT"
+
+# odd multipliers: k -> k * m mod 4**length is a bijection, so indexes stay unique
+# while consecutive samples get unrelated sequences
+_I7_MULTIPLIER = 2654435761
+_I5_MULTIPLIER = 40503
+
+
+def _index(number, length):
+    bases = []
+    for _ in range(length):
+        number, base = divmod(number, 4)
+        bases.append(_BASES[base])
+    return "".join(bases)
+
+
+def _indexes(count, length, multiplier, offset):
+    space = 4**length
+    return [_index(((k + offset) * multiplier) % space, length) for k in range(count)]
+
+
+def _header_v1():
+    return [
+        "[Header]",
+        "IEMFileVersion,5",
+        "Investigator Name,benchmark",
+        "Experiment Name,synthetic",
+        "Date,2024-01-01",
+        "Workflow,GenerateFASTQ",
+        "Application,FASTQ Only",
+        "Chemistry,Default",
+        "",
+        "[Reads]",
+        "151",
+        "151",
+        "",
+        "[Settings]",
+        "Adapter,{adapter}",
+        "AdapterRead2,AGATCGGAAGAGCGTCGTGTAGGGAAAGAGTGT",
+        "",
+        "[Data]",
+    ]
+
+
+def _header_v2(index_length, dual_index):
+    index2 = [f"Index2Cycles,{index_length}"] if dual_index else []
+    return [
+        "[Header]",
+        "FileFormatVersion,2",
+        "RunName,synthetic",
+        "InstrumentPlatform,NovaSeqXSeries",
+        "",
+        "[Reads]",
+        "Read1Cycles,151",
+        "Read2Cycles,151",
+        f"Index1Cycles,{index_length}",
+        *index2,
+        "",
+        "[BCLConvert_Settings]",
+        "SoftwareVersion,4.2.7",
+        "AdapterRead1,{adapter}",
+        "AdapterRead2,CTGTCTCTTATACACATCT",
+        "",
+        "[BCLConvert_Data]",
+    ]
+
+
+def generate_sample_sheet(
+    samples=96, version="v1", lanes=1, dual_index=True, index_length=8, errors=(), seed=0, projects=4
+):
+    """Return the text of a synthetic sample sheet.
+
+    Parameters:
+    samples (int): number of rows of the data section.
+    version (str): "v1" (bcl2fastq) or "v2" (BCL Convert).
+    lanes (int): rows are spread over lanes 1 to *lanes*; no Lane column if 1.
+    dual_index (bool): add the I5 (index2) column.
+    index_length (int): length of the indexes.
+    errors (list): names of :data:`ERRORS` to inject.
+    seed (int): seed of the random choices (indexes, rows receiving the errors).
+    projects (int): number of distinct Sample_Project values.
+    """
+    if version not in ("v1", "v2"):
+        raise ValueError(f"Unknown sample sheet version {version!r} (expected 'v1' or 'v2')")
+    unknown = set(errors) - set(ERRORS)
+    if unknown:
+        raise ValueError(f"Unknown errors {sorted(unknown)}; choose among {sorted(ERRORS)}")
+    if not 1 <= lanes <= 8:
+        raise ValueError("lanes must be between 1 and 8")
+    # indexes distinct over the whole sheet, not only per lane: the sheets stay valid
+    # whatever the scope of the uniqueness check
+    if samples > 4**index_length:
+        raise ValueError(f"{samples} samples cannot have distinct indexes of length {index_length}")
+
+    rng = random.Random(seed)
+    i7 = _indexes(samples, index_length, _I7_MULTIPLIER, rng.randrange(4**index_length))
+    i5 = _indexes(samples, index_length, _I5_MULTIPLIER, rng.randrange(4**index_length))
+
+    columns = ["Sample_ID"]
+    if version == "v1":
+        columns.append("Sample_Name")
+    if lanes > 1:
+        columns.insert(0, "Lane")
+    columns += ["I7_Index_ID", "index"] if version == "v1" else ["Index"]
+    if dual_index:
+        columns += ["I5_Index_ID", "index2"] if version == "v1" else ["Index2"]
+    columns.append("Sample_Project")
+
+    rows = []
+    for number in range(samples):
+        name = f"S{number + 1:06d}"
+        row = {
+            "Lane": str(number % lanes + 1),
+            "Sample_ID": name,
+            "Sample_Name": name,
+            "I7_Index_ID": f"I7_{number + 1:06d}",
+            "index": i7[number],
+            "Index": i7[number],
+            "I5_Index_ID": f"I5_{number + 1:06d}",
+            "index2": i5[number],
+            "Index2": i5[number],
+            "Sample_Project": f"P{number % projects + 1:02d}",
+        }
+        rows.append(row)
+
+    i7_column = "index" if version == "v1" else "Index"
+    adapter = "AGATCGGAAGAGCACACGTCTGAACTCCAGTCA" if version == "v1" else "CTGTCTCTTATACACATCT"
+    picked = rng.sample(range(samples), min(samples, 2)) if samples else []
+    if rows:
+        target = rows[picked[0]]
+        if "alphanum" in errors:
+            target["Sample_ID"] = f"{target['Sample_ID']}+A"
+        if "lowercase_index" in errors:
+            target[i7_column] = target[i7_column].lower()
+        if "index_length" in errors:
+            target[i7_column] = target[i7_column][:-1]
+        if "duplicate_sample_id" in errors and len(picked) == 2:
+            rows[picked[1]]["Sample_ID"] = target["Sample_ID"]
+        if "duplicate_index" in errors and samples > lanes:
+            # the next sample of the same lane gets the same indexes
+            other = rows[picked[0] + lanes] if picked[0] + lanes < samples else rows[picked[0] - lanes]
+            for column in columns:
+                if column.lower().startswith("index"):
+                    other[column] = target[column]
+    if "bad_adapter" in errors:
+        adapter = f" {adapter[:-1]}N"
+
+    header = _header_v1() if version == "v1" else _header_v2(index_length, dual_index)
+    lines = [line.replace("{adapter}", adapter) for line in header]
+    lines.append(",".join(columns))
+    lines += [",".join(row[column] for column in columns) for row in rows]
+    if "semicolons" in errors:
+        lines = [f"{line};;;" for line in lines]
+    return "\n".join(lines) + "\n"
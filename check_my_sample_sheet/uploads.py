@@ -0,0 +1,136 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Sample sheets from uploaded files: plain, gzip or bzip2 compressed files and zip archives of sheets.
+
+Files and archive members are read as streams by the pre-flight lint (see
+:mod:`check_my_sample_sheet.preflight`): oversized files are rejected without being
+read or decoded entirely. Compressed files and archive members are decompressed chunk
+by chunk, and the size limits apply to the decompressed bytes, so a small upload
+expanding to gigabytes (a "zip bomb") is stopped after ``MAX_SHEET_SIZE`` bytes per
+sheet and ``CHECK_MY_SAMPLE_SHEET_MAX_ARCHIVE_SIZE`` bytes per archive. The memory
+used by a submission is thus bounded by the text of its sheets (and the uploaded
+bytes, held by Streamlit).
+"""
+import bz2
+import gzip
+import io
+import zipfile
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+from check_my_sample_sheet import config, metrics, preflight
+from check_my_sample_sheet.preflight import PreflightReport, lint_stream
+
+#: extensions of the files read as sample sheets (inside archives too)
+SHEET_EXTENSIONS = (".csv", ".txt")
+
+#: extensions of the compressed sheets: name of the format and function opening a decompressing stream
+COMPRESSED = {".gz": ("gzip", gzip.open), ".bz2": ("bzip2", bz2.open)}
+
+#: decompressed bytes read from the members of a zip archive, in total
+MAX_ARCHIVE_SIZE = config.get("MAX_ARCHIVE_SIZE", 128 * 1024 * 1024, int)
+
+
+@dataclass
+class UploadedSheet:
+    """One sample sheet extracted from the uploads."""
+
+    #: file name; members of an archive are named ``archive.zip/member.csv``
+    name: str
+    #: content of the sheet, None if it could not be read (see error)
+    text: Optional[str]
+    error: Optional[str] = None
+    #: problems found by the pre-flight lint, None if the file was not linted (e.g. bad archive)
+    preflight: Optional[PreflightReport] = None
+
+
+def _read(name, stream, max_size=None):
+    with metrics.timed("preflight"):
+        report = lint_stream(stream, max_size=max_size)
+    return UploadedSheet(name, report.text, report.error, report)
+
+
+def read_compressed(name, stream):
+    """Return the :class:`UploadedSheet` of the gzip or bzip2 compressed sheet *stream*.
+
+    The sheet is decompressed while it is linted: at most MAX_SHEET_SIZE decompressed
+    bytes are read.
+    """
+    kind, opener = COMPRESSED[name[name.rfind(".") :].lower()]
+    try:
+        with opener(stream) as decompressed:
+            return _read(name, decompressed)
+    except (OSError, EOFError, zlib.error) as err:
+        return UploadedSheet(name, None, f"Not a valid {kind} file ({err})")
+
+
+def read_zip(name, data, max_size=None):
+    """Return the :class:`UploadedSheet` of the .csv/.txt members of the zip archive *data*.
+
+    *data* is the content of the archive or a binary file object. Directories and hidden
+    files (e.g. the ``__MACOSX`` folder added by macOS) are skipped. The members are
+    decompressed while they are linted; once *max_size* (default MAX_ARCHIVE_SIZE)
+    decompressed bytes have been read, the next members are not read.
+    """
+    budget = MAX_ARCHIVE_SIZE if max_size is None else max_size
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data) if isinstance(data, bytes) else data)
+    except zipfile.BadZipFile:
+        return [UploadedSheet(name, None, "Not a valid zip archive")]
+
+    sheets = []
+    with archive:
+        for info in archive.infolist():
+            basename = info.filename.rsplit("/", 1)[-1]
+            if info.is_dir() or basename.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            if not basename.lower().endswith(SHEET_EXTENSIONS):
+                continue
+            member_name = f"{name}/{info.filename}"
+            if budget <= 0:
+                sheets.append(UploadedSheet(member_name, None, "Not read: the archive expands to too many bytes"))
+                continue
+            try:
+                with archive.open(info) as member:
+                    sheet = _read(member_name, member, max_size=min(preflight.MAX_SHEET_SIZE, budget))
+            except (zipfile.BadZipFile, NotImplementedError, RuntimeError, OSError, EOFError, zlib.error) as err:
+                # corrupted member, unsupported compression or encryption
+                sheets.append(UploadedSheet(member_name, None, f"Could not be extracted ({err})"))
+                continue
+            budget -= sheet.preflight.bytes
+            sheets.append(sheet)
+    if not sheets:
+        return [UploadedSheet(name, None, "No .csv or .txt file in the archive")]
+    return sheets
+
+
+def read_uploads(files):
+    """Return the list of :class:`UploadedSheet` found in *files* (Streamlit UploadedFile objects).
+
+    Zip archives are expanded and .gz/.bz2 files decompressed; each sheet is read and
+    decoded by :func:`~check_my_sample_sheet.preflight.lint_stream`.
+    """
+    sheets = []
+    for uploaded in files or []:
+        uploaded.seek(0)
+        if getattr(uploaded, "size", None) is not None:
+            metrics.registry.observe("upload_bytes", uploaded.size)
+        lower = uploaded.name.lower()
+        if lower.endswith(".zip"):
+            sheets.extend(read_zip(uploaded.name, uploaded))
+        elif lower.endswith(tuple(COMPRESSED)):
+            sheets.append(read_compressed(uploaded.name, uploaded))
+        else:
+            sheets.append(_read(uploaded.name, uploaded))
+    return sheets
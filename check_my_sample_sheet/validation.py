@@ -0,0 +1,404 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Validation core: runs the Sequana IEM checks on the content of a sample sheet.
+
+Results are memoised in a process-wide LRU cache shared by all sessions. The key is
+the SHA-256 digest of the normalised sheet, so re-submitting the same sheet skips the
+Sequana work entirely. Cache size and lifetime are set with the
+``CHECK_MY_SAMPLE_SHEET_CACHE_SIZE`` and ``CHECK_MY_SAMPLE_SHEET_CACHE_TTL``
+environment variables.
+
+The quick fix of a sheet with errors is not part of the result: it is computed when
+requested (see :func:`quick_fix`) and cached on its own.
+"""
+import difflib
+import hashlib
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Optional
+
+from check_my_sample_sheet import config
+from check_my_sample_sheet.cache import LRUCache
+from check_my_sample_sheet.indexes import analyse_indexes
+from check_my_sample_sheet.lanes import check_lanes, has_lanes
+from check_my_sample_sheet.metrics import record, request_timings, timed
+from check_my_sample_sheet.samplesheet import load_sample_sheet
+
+CACHE_SIZE = config.get("CACHE_SIZE", 256, int)
+CACHE_TTL = config.get("CACHE_TTL", 3600.0, float)
+#: estimated memory allowed to the cached results, in bytes (0 for no limit)
+CACHE_BYTES = config.get("CACHE_BYTES", 512 * 2**20, int)
+
+#: worker processes used to validate several sheets at once
+WORKERS = config.get("WORKERS", min(4, os.cpu_count() or 1), int)
+
+#: diff lines shown by :func:`quick_fix_diff`
+MAX_DIFF_LINES = 500
+
+
+def result_nbytes(result):
+    """Estimated memory held by a :class:`ValidationResult` (frame, messages, index analysis), in bytes."""
+    size = sum(len(str(check["msg"])) for check in result.checks)
+    if result.df is not None:
+        size += int(result.df.memory_usage(index=True, deep=True).sum())
+    for report in result.indexes:
+        size += len(report.samples) * 64 + int(report.close_pairs.memory_usage(deep=True).sum())
+        if report.matrix is not None:
+            size += report.matrix.nbytes
+    return size
+
+
+_cache = LRUCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL, maxbytes=CACHE_BYTES, sizeof=result_nbytes)
+_quick_fixes = LRUCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL, maxbytes=CACHE_BYTES, sizeof=len)
+
+
+@dataclass
+class ValidationResult:
+    """Outcome of the Sequana checks on one sample sheet.
+
+    Instances are shared between sessions through the cache and must be treated
+    as read-only.
+    """
+
+    #: SHA-256 digest of the normalised sheet (the cache key)
+    digest: str
+    #: "v1" (bcl2fastq) or "v2" (BCL Convert)
+    version: str
+    #: message of the first error reported by ``validate()``, None if the sheet is valid
+    error: Optional[str]
+    #: list of {"status": ..., "msg": ...} dicts as returned by ``checker()``
+    checks: list
+    #: parsed [Data] section, None if it could not be parsed (see df_error)
+    df: Any
+    df_error: Optional[str] = None
+    #: index distance analysis, one LaneIndexReport per lane (see check_my_sample_sheet.indexes)
+    indexes: list = field(default_factory=list)
+    #: time spent parsing and checking the sheet, in seconds
+    seconds: float = 0.0
+    #: (stage, seconds) pairs of the validation stages (see check_my_sample_sheet.metrics)
+    timings: list = field(default_factory=list)
+    #: fields of the [Header] section (run name, date, instrument...), empty if it could not be read
+    header: dict = field(default_factory=dict)
+    #: time spent in each check of checker(), by method name (e.g. "_check_settings"), in seconds
+    check_seconds: dict = field(default_factory=dict)
+
+    @property
+    def is_valid(self):
+        return self.error is None
+
+    @property
+    def has_errors(self):
+        return any(check["status"] == "Error" for check in self.checks)
+
+    @property
+    def counts(self):
+        """Number of checks per status (Error, Warning, Success)."""
+        from check_my_sample_sheet.results import check_report
+
+        return dict(check_report(self).counts)
+
+    def to_dict(self):
+        """JSON-serialisable summary (the [Data] frame is left out)."""
+        counts = self.counts
+        return {
+            "digest": self.digest,
+            "version": self.version,
+            "valid": self.is_valid,
+            "error": self.error,
+            "errors": counts["Error"],
+            "warnings": counts["Warning"],
+            "successes": counts["Success"],
+            "checks": [{"status": check["status"], "msg": str(check["msg"])} for check in self.checks],
+            "indexes": [report.to_dict() for report in self.indexes],
+        }
+
+
+def normalize_sample_sheet(samplesheet):
+    """Return *samplesheet* with Windows/old Mac line endings converted to ``\\n``.
+
+    Sequana reads sheets in text mode (universal newlines), so this does not change
+    any check outcome; it only lets identical sheets share a cache entry.
+    """
+    return samplesheet.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def sample_sheet_digest(samplesheet):
+    """SHA-256 hex digest of the normalised sample sheet."""
+    return hashlib.sha256(normalize_sample_sheet(samplesheet).encode("utf-8")).hexdigest()
+
+
+def first_error(checks):
+    """Message of the first failed check, formatted like sequana's ``validate()``; None if all passed."""
+    for check in checks:
+        if check["status"] == "Error":
+            return "\u274C " + str(check["msg"])
+    return None
+
+
+def run_validation(samplesheet, digest=None, memo=None):
+    """Run the Sequana checks on *samplesheet* (text), bypassing the cache.
+
+    The sheet is parsed once, in memory (see :mod:`check_my_sample_sheet.samplesheet`),
+    and the check suite runs once. Returns a :class:`ValidationResult`.
+
+    With a section *memo* (see :func:`~check_my_sample_sheet.samplesheet.section_memo`),
+    the checks, [Data] frame and index analysis of the sections unchanged since a
+    previous validation with the same memo are reused instead of recomputed.
+    """
+    samplesheet = normalize_sample_sheet(samplesheet)
+    if digest is None:
+        digest = sample_sheet_digest(samplesheet)
+
+    with request_timings() as timings:
+        # single pass: parse once, run the check suite once and derive the validate()
+        # outcome (first error, same message as sequana) from that result set.
+        start = time.perf_counter()
+        with timed("parse"):
+            version, iem = load_sample_sheet(samplesheet, memo=memo)
+        try:
+            df, df_error = iem.df, None
+        except Exception as err:
+            df, df_error = None, str(err)
+
+        # multi-lane sheets: the lane-scoped checks and index analysis run per lane, in
+        # parallel; checker() reports their merged results
+        lanes = None
+        if df is not None and has_lanes(df):
+            try:
+                with timed("lanes"):
+                    if memo is None:
+                        lanes = check_lanes(iem, df)
+                    else:
+                        key = iem.memo_key("lanes", iem.data_section)
+                        lanes = memo.get_or_set(key, lambda: check_lanes(iem, df))
+            except Exception:  # pragma: no cover
+                # e.g. unexpected column types: sequana's checks run on the whole frame
+                pass
+            if lanes is not None:
+                lanes.apply(iem)
+
+        iem.trace_checks()
+        with timed("checker"):
+            checks = iem.checker()
+        elapsed = time.perf_counter() - start
+
+        error = first_error(checks)
+
+        try:
+            header = dict(iem.header)
+        except Exception:
+            header = {}
+
+        result = ValidationResult(
+            digest=digest,
+            version=version,
+            error=error,
+            checks=checks,
+            df=df,
+            df_error=df_error,
+            seconds=elapsed,
+            timings=timings,
+            header=header,
+            check_seconds=iem.check_seconds,
+        )
+
+        if lanes is not None:
+            result.indexes = lanes.indexes
+        elif df is not None:
+            try:
+                with timed("index_analysis"):
+                    if memo is None:
+                        result.indexes = analyse_indexes(df)
+                    else:
+                        key = iem.memo_key("indexes", iem.data_section)
+                        result.indexes = memo.get_or_set(key, lambda: analyse_indexes(df))
+            except Exception:  # pragma: no cover
+                # e.g. unexpected column types: the analysis is informative only
+                pass
+
+    return result
+
+
+def validate_sample_sheet(samplesheet, use_cache=True, memo=None):
+    """Return the :class:`ValidationResult` of *samplesheet*, served from the cache when possible.
+
+    *memo* is passed to :func:`run_validation` when the sheet is not in the cache.
+    """
+    if not use_cache:
+        return run_validation(samplesheet, memo=memo)
+    samplesheet = normalize_sample_sheet(samplesheet)
+    digest = sample_sheet_digest(samplesheet)
+    return _cache.get_or_set(digest, lambda: run_validation(samplesheet, digest=digest, memo=memo))
+
+
+def quick_fix(samplesheet, digest=None):
+    """Return *samplesheet* fixed by sequana's ``quick_fix`` (extra semicolons removed).
+
+    The fix is computed on demand, e.g. when the corrected file is requested in the app,
+    and cached under the digest of the sheet.
+    """
+    samplesheet = normalize_sample_sheet(samplesheet)
+    if digest is None:
+        digest = sample_sheet_digest(samplesheet)
+
+    def fix():
+        with timed("quick_fix"):
+            return load_sample_sheet(samplesheet)[1].quick_fix_text()
+
+    return _quick_fixes.get_or_set(digest, fix)
+
+
+def quick_fix_diff(samplesheet, fixed, context=1, max_lines=MAX_DIFF_LINES):
+    """The changed hunks between *samplesheet* and its quick fix *fixed*, as a unified diff.
+
+    Returns a tuple (diff, omitted): the first *max_lines* lines of the diff (an empty
+    string if nothing changed) and the number of diff lines left out.
+
+    Parameters:
+    context (int): unchanged lines shown around each change.
+    max_lines (int): maximum number of diff lines returned.
+    """
+    before = normalize_sample_sheet(samplesheet).splitlines()
+    after = fixed.splitlines()
+    if len(before) == len(after):
+        lines = _aligned_diff(before, after, context)
+    else:
+        lines = difflib.unified_diff(before, after, "original", "corrected", n=context, lineterm="")
+    shown = list(islice(lines, max_lines))
+    return "\n".join(shown), sum(1 for _ in lines)
+
+
+def _aligned_diff(before, after, context):
+    # quick_fix rewrites the sheet line by line: line i of the fix is line i of the sheet,
+    # so the hunks are found in one pass (difflib would search for matching blocks)
+    changed = [i for i, (old, new) in enumerate(zip(before, after)) if old != new]
+    if not changed:
+        return
+    yield "--- original"
+    yield "+++ corrected"
+    start = 0
+    while start < len(changed):
+        # changes separated by at most 2 * context unchanged lines share a hunk
+        end = start
+        while end + 1 < len(changed) and changed[end + 1] - changed[end] <= 2 * context + 1:
+            end += 1
+        first, last = max(0, changed[start] - context), min(len(before), changed[end] + context + 1)
+        yield f"@@ -{first + 1},{last - first} +{first + 1},{last - first} @@"
+        removed, added = [], []
+        for i in range(first, last):
+            if before[i] != after[i]:
+                removed.append("-" + before[i])
+                added.append("+" + after[i])
+                continue
+            yield from removed
+            yield from added
+            removed, added = [], []
+            yield " " + before[i]
+        yield from removed
+        yield from added
+        start = end + 1
+
+
+def get_validation_cache():
+    """The process-wide :class:`~check_my_sample_sheet.cache.LRUCache` of validation results."""
+    return _cache
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_worker_context():
+    """Multiprocessing context of the worker processes.
+
+    Workers are forked from a server process that has already imported this module, so
+    they start without importing sequana again and without inheriting the threads of
+    the web server. As with any start method but fork, each worker imports the main
+    module of this process as ``__mp_main__``: under ``streamlit run``, the page script,
+    whose ``if __name__ == "__main__"`` guard keeps the page from running there. The
+    server then preloads Streamlit too, which the page imports. Where there is no fork
+    server (Windows), workers are spawned.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    preload = ["check_my_sample_sheet.validation"]
+    if "streamlit" in sys.modules:
+        preload.append("streamlit")
+    context.set_forkserver_preload(preload)
+    return context
+
+
+def get_executor():
+    """The process-wide pool of :data:`WORKERS` processes used by :func:`validate_many`."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=get_worker_context())
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def validate_many(samplesheets, jobs=None):
+    """Validate several sheets concurrently; return their :class:`ValidationResult` in input order.
+
+    Sheets found in the cache are not validated again. When more than one sheet
+    remains (and *jobs*, default :data:`WORKERS`, is above 1) they are validated on the
+    pool of :func:`get_executor`; the results are added to the cache. The pool applies
+    no time or memory limit: the web app validates untrusted uploads with
+    :class:`~check_my_sample_sheet.worker.ValidationJob` instead.
+    """
+    jobs = WORKERS if jobs is None else jobs
+    samplesheets = [normalize_sample_sheet(samplesheet) for samplesheet in samplesheets]
+    digests = [sample_sheet_digest(samplesheet) for samplesheet in samplesheets]
+    results = [_cache.get(digest) for digest in digests]
+
+    # one job per distinct sheet: duplicates share the result
+    missing = {}
+    for i, digest in enumerate(digests):
+        if results[i] is None:
+            missing.setdefault(digest, samplesheets[i])
+
+    done = {}
+    if len(missing) > 1 and jobs > 1:
+        try:
+            executor = get_executor()
+            futures = {digest: executor.submit(run_validation, text, digest) for digest, text in missing.items()}
+            for digest, future in futures.items():
+                done[digest] = future.result()
+                # the stages ran in a worker: report them to this process' registry
+                record(done[digest].timings)
+        except BrokenProcessPool:  # pragma: no cover
+            # a worker died (e.g. killed by the OS): start a new pool next time, finish here
+            _reset_executor()
+    for digest, text in missing.items():
+        if digest not in done:
+            done[digest] = run_validation(text, digest=digest)
+
+    for digest, result in done.items():
+        _cache.set(digest, result)
+    return [result if result is not None else done[digest] for result, digest in zip(results, digests)]
@@ -0,0 +1,336 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Watch run folders and validate sample sheets as they appear: ``check-my-sample-sheet watch``.
+
+The directory trees are monitored for new or modified files matching ``--pattern``
+(``SampleSheet*.csv`` by default)::
+
+    check-my-sample-sheet watch /data/runs /data/miseq --log checks.ndjson
+
+A sheet is validated once no write happened to it for ``--debounce`` seconds, with
+the checks of the web app (pre-flight lint, then the Sequana checks in a background
+process with the time and memory limits of :mod:`check_my_sample_sheet.worker`). The
+JSON record of each validation is written next to the sheet
+(``SampleSheet.csv.check.json``), printed on stdout and appended to ``--log``.
+
+On start, the sheets without an up-to-date report are validated. Events come from
+inotify (or the native API of the platform) when the optional ``watchdog`` package
+is installed (``pip install "check-my-sample-sheet[watch]"``); otherwise, or with
+``--polling``, the trees are scanned every ``--interval`` seconds. ``--events`` makes
+the events mandatory. Nothing runs between two events but the event source.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+#: how to install the optional dependency of the file system events
+WATCHDOG_HINT = 'install the watchdog package: pip install "check-my-sample-sheet[watch]"'
+
+PATTERN = "SampleSheet*.csv"
+
+#: suffix of the reports written next to the sheets
+REPORT_SUFFIX = ".check.json"
+
+
+def report_path(path):
+    """Path of the JSON report of the sheet *path*."""
+    path = Path(path)
+    return path.with_name(path.name + REPORT_SUFFIX)
+
+
+def check_sheet(path):
+    """Validate the sheet stored in *path*; return its JSON-serialisable record.
+
+    The record is :meth:`ValidationResult.to_dict` plus the file name, the pre-flight
+    problems, the runtime and the ``cross_run`` checks when the history is enabled. If
+    the sheet cannot be read or validated, ``valid`` is False and ``exception`` holds
+    the reason.
+    """
+    from check_my_sample_sheet.history import cross_run_checks
+    from check_my_sample_sheet.preflight import lint_stream
+    from check_my_sample_sheet.validation import (
+        get_validation_cache,
+        sample_sheet_digest,
+    )
+    from check_my_sample_sheet.worker import (
+        ValidationFailed,
+        ValidationJob,
+        ValidationLimitExceeded,
+    )
+
+    start = time.perf_counter()
+    record = {"file": str(path), "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+    try:
+        with open(path, "rb") as fin:
+            preflight = lint_stream(fin)
+        record["preflight"] = preflight.issues
+        if preflight.fatal:
+            record.update(valid=False, exception=preflight.error)
+        else:
+            digest = sample_sheet_digest(preflight.text)
+            result = get_validation_cache().get(digest)
+            if result is None:
+                result = ValidationJob(preflight.text).result()
+                get_validation_cache().set(digest, result)
+            record.update(result.to_dict())
+            cross_run = cross_run_checks(result)
+            if cross_run is not None:
+                record["cross_run"] = cross_run
+    except (OSError, ValidationLimitExceeded, ValidationFailed) as err:
+        record.update(valid=False, exception=f"{type(err).__name__}: {err}")
+    record["seconds"] = round(time.perf_counter() - start, 6)
+    return record
+
+
+def write_report(path, record):
+    """Write *record* as the JSON report of the sheet *path* (atomically)."""
+    target = report_path(path)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as fout:
+        json.dump(record, fout, indent=2)
+        fout.write("\n")
+    os.replace(tmp, target)
+    return target
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SheetWatcher:
+    """Debounced validation of the sheets of directory trees.
+
+    Event sources call :meth:`notify` with the paths that changed; :meth:`run` validates
+    each of them once it was left untouched for *debounce* seconds and its content
+    (modification time and size) differs from the one last validated.
+
+    Parameters:
+    roots (list): directories watched (recursively).
+    pattern (str): glob matched (case-insensitively) against the file names.
+    debounce (float): seconds without write before a sheet is validated.
+    on_record (callable): called with (path, record) after each validation.
+    timer (callable): monotonic clock, overridable in tests.
+    """
+
+    def __init__(self, roots, pattern=PATTERN, debounce=2.0, on_record=None, timer=time.monotonic):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.pattern = pattern.lower()
+        self.debounce = debounce
+        self.on_record = on_record
+        self._timer = timer
+        self._pending = {}
+        # signatures (mtime, size) of the sheets when last validated / last scanned
+        self._validated = {}
+        self._seen = {}
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self.validations = 0
+
+    def matches(self, path):
+        name = os.path.basename(path)
+        return not name.startswith(".") and fnmatch.fnmatchcase(name.lower(), self.pattern)
+
+    def scan(self):
+        """Yield the paths of the sheets currently found under the roots."""
+        for root in self.roots:
+            for directory, subdirectories, files in os.walk(root):
+                subdirectories[:] = [name for name in subdirectories if not name.startswith(".")]
+                for name in files:
+                    if self.matches(name):
+                        yield os.path.join(directory, name)
+
+    def notify(self, path):
+        """Record a change of *path* (ignored if it is not a sheet); thread-safe."""
+        if not self.matches(path):
+            return
+        with self._condition:
+            self._pending[os.path.abspath(path)] = self._timer()
+            self._condition.notify()
+
+    def notify_stale(self):
+        """Notify the sheets whose report is missing or older than the sheet."""
+        for path in self.scan():
+            report = _signature(report_path(path))
+            sheet = _signature(path)
+            if report is None or (sheet is not None and report[0] < sheet[0]):
+                self.notify(path)
+            elif sheet is not None:
+                self._validated[path] = sheet
+
+    def poll(self):
+        """Notify the sheets added or modified since the last call (polling event source)."""
+        for path in self.scan():
+            signature = _signature(path)
+            # a sheet still being written is notified again at each scan: the debounce
+            # period starts from its last change
+            if signature is not None and signature != self._seen.get(path):
+                self._seen[path] = signature
+                if signature != self._validated.get(path):
+                    self.notify(path)
+
+    def due(self):
+        """Remove and return the pending paths quiet for *debounce* seconds, and the wait for the next one."""
+        now = self._timer()
+        ready = [path for path, stamp in self._pending.items() if now - stamp >= self.debounce]
+        for path in ready:
+            del self._pending[path]
+        remaining = [stamp + self.debounce - now for stamp in self._pending.values()]
+        return ready, (min(remaining) if remaining else None)
+
+    def process(self, path):
+        """Validate *path* if its content changed since its last validation; return the record or None."""
+        signature = _signature(path)
+        if signature is None or self._validated.get(path) == signature:
+            return None
+        record = check_sheet(path)
+        # the signature read before the validation: a write during it triggers a new one
+        self._validated[path] = signature
+        self.validations += 1
+        try:
+            write_report(path, record)
+        except OSError as err:
+            record["report_error"] = str(err)
+        if self.on_record is not None:
+            self.on_record(path, record)
+        return record
+
+    def run(self, timeout=None):
+        """Validate the notified sheets until :meth:`stop` is called (or *timeout* seconds elapsed).
+
+        The thread sleeps until the next notification or the end of a debounce period.
+        """
+        deadline = None if timeout is None else self._timer() + timeout
+        while not self._stopped.is_set():
+            with self._condition:
+                ready, wait = self.due()
+                if not ready:
+                    if deadline is not None:
+                        left = deadline - self._timer()
+                        if left <= 0:
+                            return
+                        wait = left if wait is None else min(wait, left)
+                    self._condition.wait(wait)
+                    continue
+            for path in ready:
+                self.process(path)
+
+    def stop(self):
+        """Make :meth:`run` return; thread-safe."""
+        with self._condition:
+            self._stopped.set()
+            self._condition.notify()
+
+
+def _watchdog_observer(watcher):
+    """Start a watchdog observer notifying *watcher*; None if watchdog is not installed."""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.is_directory or event.event_type not in ("created", "modified", "moved", "closed"):
+                return
+            watcher.notify(getattr(event, "dest_path", "") or event.src_path)
+
+    observer = Observer()
+    for root in watcher.roots:
+        observer.schedule(Handler(), str(root), recursive=True)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+
+def _polling_loop(watcher, interval):
+    while not watcher._stopped.wait(interval):
+        watcher.poll()
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="check-my-sample-sheet watch",
+        description="Validate the sample sheets of run folders as soon as they are written.",
+    )
+    parser.add_argument("directories", nargs="+", help="directory trees to watch")
+    parser.add_argument("--pattern", default=PATTERN, help=f"file names to validate (default: {PATTERN})")
+    parser.add_argument(
+        "--debounce", type=float, default=2.0, help="seconds without write before validating a sheet (default: 2)"
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--polling", action="store_true", help="scan the directories instead of using inotify")
+    mode.add_argument(
+        "--events", action="store_true", help="use inotify (requires the watchdog package), never scan the directories"
+    )
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between two scans (default: 5)")
+    parser.add_argument("--log", help="file receiving one JSON line per validation")
+    parser.add_argument("--once", action="store_true", help="validate the sheets without report and exit")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print the records on stdout")
+    return parser
+
+
+def main(args=None, stdout=None):
+    """Run the ``watch`` subcommand until interrupted and return the exit status."""
+    options = get_parser().parse_args(args)
+    stdout = stdout or sys.stdout
+    for directory in options.directories:
+        if not os.path.isdir(directory):
+            get_parser().error(f"not a directory: {directory}")
+
+    def on_record(path, record):
+        line = json.dumps(record)
+        if not options.quiet:
+            stdout.write(line + "\n")
+            stdout.flush()
+        if options.log:
+            with open(options.log, "a") as fout:
+                fout.write(line + "\n")
+
+    debounce = 0 if options.once else options.debounce
+    watcher = SheetWatcher(options.directories, options.pattern, debounce, on_record)
+    if options.once:
+        watcher.notify_stale()
+        watcher.run(timeout=0)
+        return 0
+
+    # started before the first scan: no write is missed between the two
+    observer = None if options.polling else _watchdog_observer(watcher)
+    if observer is None and options.events:
+        get_parser().error(f"--events: file system events are not available; {WATCHDOG_HINT}")
+    watcher.notify_stale()
+    if observer is None:
+        threading.Thread(target=_polling_loop, args=(watcher, options.interval), daemon=True).start()
+    mode = "inotify" if observer is not None else f"polling every {options.interval:g}s"
+    if observer is None and not options.polling:
+        print(f"File system events are not available: {WATCHDOG_HINT}", file=sys.stderr)
+    print(f"Watching {', '.join(options.directories)} for {options.pattern} ({mode})", file=sys.stderr)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        if observer is not None:
+            observer.stop()
+            observer.join()
+    return 0
@@ -0,0 +1,236 @@
+#
+#  This file is part of Sequana software
+#
+#  Copyright (c) 2023-2024 - Sequana Development Team
+#
+#  Distributed under the terms of the 3-clause BSD license.
+#  The full license is in the LICENSE file, distributed with this software.
+#
+#  website: https://github.com/sequana/webapp_samplesheet
+#  documentation: http://github.com/sequana/webapp_samplesheet/
+#
+##############################################################################
+"""Validation of one sheet in a background process, with a time and a memory limit.
+
+A :class:`ValidationJob` runs :func:`~check_my_sample_sheet.validation.run_validation`
+in a child process started with
+:func:`~check_my_sample_sheet.validation.get_worker_context` (forked with sequana
+already imported where possible), so that a pathological sheet cannot hold the CPU or the memory of the web
+server::
+
+    job = ValidationJob(samplesheet)
+    while not job.wait(0.2):
+        print(job.state, job.elapsed)
+    result = job.result()
+
+The child is killed after ``CHECK_MY_SAMPLE_SHEET_TIME_LIMIT`` seconds (default 60)
+and its address space is capped at ``CHECK_MY_SAMPLE_SHEET_MEMORY_LIMIT`` MB (default
+2048, 0 for no limit). At most ``CHECK_MY_SAMPLE_SHEET_MAX_JOBS`` jobs run at once in
+the process; the others wait for a slot. :meth:`ValidationJob.cancel` stops a job at
+any time.
+"""
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # Windows: no memory limit
+    resource = None
+
+from check_my_sample_sheet import config
+from check_my_sample_sheet.validation import (
+    WORKERS,
+    get_worker_context,
+    normalize_sample_sheet,
+    run_validation,
+    sample_sheet_digest,
+)
+
+TIME_LIMIT = config.get("TIME_LIMIT", 60.0, float)
+MEMORY_LIMIT = config.get("MEMORY_LIMIT", 2048, int)
+
+#: jobs running at once in this process (the others are queued)
+MAX_JOBS = config.get("MAX_JOBS", WORKERS, int)
+
+_slots = threading.BoundedSemaphore(MAX_JOBS)
+
+
+class ValidationLimitExceeded(Exception):
+    """Raised by :meth:`ValidationJob.result` when the job was stopped by one of its limits."""
+
+
+class ValidationTimeout(ValidationLimitExceeded):
+    """The validation took longer than the time limit."""
+
+
+class ValidationMemoryError(ValidationLimitExceeded):
+    """The validation needed more memory than the memory limit."""
+
+
+class ValidationCancelled(Exception):
+    """The job was cancelled before its end."""
+
+
+class ValidationFailed(RuntimeError):
+    """The validation raised an error in the worker process (the message gives its type)."""
+
+
+def _limit_memory(megabytes):
+    if resource is None or not megabytes:
+        return
+    limit = megabytes * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _child(conn, function, samplesheet, digest, memo, memory_limit):
+    _limit_memory(memory_limit)
+    try:
+        reply = ("ok", function(samplesheet, digest, memo=memo), memo)
+        conn.send(reply)
+    except MemoryError:
+        # the result is pickled before being written: nothing was sent yet
+        conn.send(("memory", None, None))
+    except Exception as err:
+        conn.send(("error", f"{type(err).__name__}: {err}", None))
+    finally:
+        conn.close()
+
+
+class ValidationJob:
+    """Validation of *samplesheet* in a child process, started at once (or when a slot is free).
+
+    Parameters:
+    samplesheet (str): content of the sample sheet.
+    memo (LRUCache): section memo (see :func:`~check_my_sample_sheet.samplesheet.section_memo`);
+        a copy is used by the child and returned, updated, as :attr:`memo`.
+    time_limit (float): seconds allowed once running; defaults to TIME_LIMIT.
+    memory_limit (int): address space of the child in MB (0 for no limit); defaults to MEMORY_LIMIT.
+    function (callable): ``function(samplesheet, digest, memo=memo)`` run in the child,
+        :func:`~check_my_sample_sheet.validation.run_validation` by default.
+    slots (threading.Semaphore): held while the child runs; defaults to the MAX_JOBS slots
+        of the process.
+    """
+
+    def __init__(self, samplesheet, memo=None, time_limit=None, memory_limit=None, function=run_validation, slots=None):
+        self.samplesheet = normalize_sample_sheet(samplesheet)
+        self.digest = sample_sheet_digest(self.samplesheet)
+        self.memo = memo
+        self.time_limit = TIME_LIMIT if time_limit is None else time_limit
+        self.memory_limit = MEMORY_LIMIT if memory_limit is None else memory_limit
+        self.function = function
+        self._slots = _slots if slots is None else slots
+        self.started = None
+        self.finished = None
+        self._process = None
+        self._result = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        threading.Thread(target=self._run, name=f"validation-{self.digest[:8]}", daemon=True).start()
+
+    @property
+    def state(self):
+        """State of the job: "queued", "running" or "done"."""
+        if self._done.is_set():
+            return "done"
+        return "queued" if self.started is None else "running"
+
+    @property
+    def elapsed(self):
+        """Seconds spent running (0 while queued)."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def wait(self, timeout=None):
+        """Wait up to *timeout* seconds for the end of the job; return True if it is done."""
+        return self._done.wait(timeout)
+
+    def result(self):
+        """Return the ValidationResult, waiting for it if needed.
+
+        Raises ValidationTimeout, ValidationMemoryError, ValidationCancelled or
+        ValidationFailed when the job did not produce a result.
+        """
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def cancel(self):
+        """Stop the job (kill its process); no-op if it is already done."""
+        self._finish(error=ValidationCancelled("The validation was cancelled"))
+        with self._lock:
+            process = self._process
+        if process is not None and process.is_alive():
+            process.kill()
+
+    def _finish(self, result=None, error=None, memo=None):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._result, self._error = result, error
+            if memo is not None:
+                self.memo = memo
+            if self.started is not None:
+                self.finished = time.monotonic()
+            self._done.set()
+
+    def _run(self):
+        try:
+            with self._slots:
+                self._execute()
+        except Exception as err:  # pragma: no cover
+            # e.g. the process could not be started
+            self._finish(error=ValidationFailed(f"{type(err).__name__}: {err}"))
+
+    def _execute(self):
+        context = get_worker_context()
+        conn, child_conn = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_child,
+            args=(child_conn, self.function, self.samplesheet, self.digest, self.memo, self.memory_limit),
+            daemon=True,
+        )
+        with self._lock:
+            if self._done.is_set():
+                # cancelled while queued
+                conn.close()
+                child_conn.close()
+                return
+            self.started = time.monotonic()
+            self._process = process
+            process.start()
+        child_conn.close()
+        try:
+            self._collect(conn, process)
+        finally:
+            if process.is_alive():
+                process.kill()
+            process.join()
+            conn.close()
+
+    def _collect(self, conn, process):
+        # poll() returns on data but also on EOF (the child died or was killed)
+        if not conn.poll(self.time_limit):
+            self._finish(error=ValidationTimeout(f"The validation took longer than {self.time_limit:g} seconds"))
+            return
+        try:
+            status, payload, memo = conn.recv()
+        except (EOFError, OSError):
+            # killed, e.g. by the kernel when out of memory
+            process.join()
+            message = f"The validation process stopped unexpectedly (exit code {process.exitcode})"
+            if self.memory_limit:
+                error = ValidationMemoryError(f"{message}; it probably needed more than {self.memory_limit} MB")
+            else:
+                error = ValidationFailed(message)
+            self._finish(error=error)
+            return
+        if status == "ok":
+            self._finish(result=payload, memo=memo)
+        elif status == "memory":
+            self._finish(error=ValidationMemoryError(f"The validation needed more than {self.memory_limit} MB"))
+        else:
+            self._finish(error=ValidationFailed(payload))
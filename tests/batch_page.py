@@ -0,0 +1,20 @@
+"""Streamlit page validating the sheets of ``st.session_state.uploads``, as a multi-file upload.
+
+Used by the multi-file tests of test_app.py. As the app, the page runs behind its main
+guard: the validation workers import this script without running it.
+"""
+import streamlit as st
+
+from check_my_sample_sheet.app import print_last_report, process_sample_sheets
+from check_my_sample_sheet.uploads import UploadedSheet
+
+
+def main():
+    if "report" in st.session_state:
+        print_last_report(st.session_state.report)
+    else:
+        process_sample_sheets([UploadedSheet(*upload) for upload in st.session_state.uploads])
+
+
+if __name__ == "__main__":
+    main()
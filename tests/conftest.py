@@ -9,12 +9,28 @@ PACKAGE_DIR = PROJECT_ROOT / "check_my_sample_sheet"
 sys.path.insert(0, str(PROJECT_ROOT))
 
 
+@pytest.fixture(autouse=True)
+def main_module(monkeypatch):
+    """Restore the main module after each test: AppTest installs the script it runs as __main__.
+
+    The validation workers import the main module of the process (see
+    ``validation.get_worker_context``), which must not be the script of a previous test.
+    """
+    monkeypatch.setitem(sys.modules, "__main__", sys.modules["__main__"])
+
+
 @pytest.fixture
 def app_path():
     """Path to the Streamlit app entrypoint."""
     return str(PACKAGE_DIR / "app.py")
 
 
+@pytest.fixture
+def batch_page():
+    """Path to a Streamlit page validating the sheets of ``st.session_state.uploads`` (see batch_page.py)."""
+    return str(Path(__file__).parent / "batch_page.py")
+
+
 @pytest.fixture
 def examples_dir():
     """Path to the examples directory."""
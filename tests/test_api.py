@@ -0,0 +1,148 @@
+"""Tests for the JSON HTTP API."""
+import http.client
+import json
+import socket
+import threading
+
+import pytest
+
+from check_my_sample_sheet.api import ServiceBusy, ValidationServer, ValidationService
+from check_my_sample_sheet.validation import get_validation_cache
+from check_my_sample_sheet.worker import ValidationTimeout
+
+
+@pytest.fixture(scope="module")
+def server():
+    service = ValidationService(workers=1, queue_size=2, timeout=30)
+    server = ValidationServer(("127.0.0.1", 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    service.shutdown()
+
+
+def request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=30)
+    connection.request(method, path, body=body, headers=headers or {})
+    response = connection.getresponse()
+    payload = json.loads(response.read())
+    connection.close()
+    return response.status, payload
+
+
+def test_validate_plain_text(server, invalid_sample_sheet):
+    get_validation_cache().clear()
+    status, payload = request(server, "POST", "/validate", invalid_sample_sheet.encode())
+    assert status == 200
+    assert payload["valid"] is False
+    assert payload["errors"] == 1
+    assert payload["cached"] is False
+
+    # second submission is answered from the cache
+    status, payload = request(server, "POST", "/validate", invalid_sample_sheet.encode())
+    assert payload["cached"] is True
+
+
+def test_validate_json(server, valid_sample_sheet):
+    body = json.dumps({"samplesheet": valid_sample_sheet}).encode()
+    status, payload = request(server, "POST", "/validate", body, {"Content-Type": "application/json"})
+    assert status == 200
+    assert payload["valid"] is True
+    assert payload["version"] == "v1"
+
+
+def test_validate_formats(server, invalid_sample_sheet):
+    status, payload = request(server, "POST", "/validate?format=json", invalid_sample_sheet.encode())
+    assert status == 200
+    assert payload["counts"]["Error"] == 1
+    assert all("id" in check and "seconds" in check for check in payload["checks"])
+
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=30)
+    connection.request("POST", "/validate?format=ndjson", body=invalid_sample_sheet.encode())
+    response = connection.getresponse()
+    lines = response.read().decode().splitlines()
+    connection.close()
+    assert response.getheader("Content-Type").startswith("application/x-ndjson")
+    assert len(lines) == len(payload["checks"])
+    assert json.loads(lines[0])["digest"] == payload["digest"]
+
+    status, payload = request(server, "POST", "/validate?format=xml", invalid_sample_sheet.encode())
+    assert status == 400
+
+
+def test_bad_requests(server):
+    assert request(server, "POST", "/validate", b"")[0] == 400
+    status, payload = request(server, "POST", "/validate", b"{}", {"Content-Type": "application/json"})
+    assert status == 400
+    assert request(server, "POST", "/other", b"x")[0] == 404
+
+
+@pytest.mark.parametrize("header, status", [("", 411), ("Content-Length: -5\r\n", 400), ("Content-Length: x\r\n", 400)])
+def test_invalid_content_length(server, header, status):
+    with socket.create_connection(("127.0.0.1", server.server_port), timeout=30) as connection:
+        connection.sendall(f"POST /validate HTTP/1.1\r\nHost: localhost\r\n{header}\r\n".encode())
+        assert connection.recv(1024).split()[1] == str(status).encode()
+
+
+def test_health(server):
+    status, payload = request(server, "GET", "/health")
+    assert status == 200
+    assert payload["status"] == "ok"
+    assert payload["workers"] == 1
+
+
+def test_metrics(server, valid_sample_sheet):
+    request(server, "POST", "/validate", valid_sample_sheet.encode())
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=30)
+    connection.request("GET", "/metrics")
+    response = connection.getresponse()
+    text = response.read().decode()
+    connection.close()
+    assert response.status == 200
+    assert "check_my_sample_sheet_cache_hits_total" in text
+
+
+def test_full_queue_raises_busy(valid_sample_sheet):
+    service = ValidationService(workers=1, queue_size=0)
+    get_validation_cache().clear()
+    service._slots.acquire()
+    try:
+        with pytest.raises(ServiceBusy):
+            service.validate(valid_sample_sheet)
+    finally:
+        service._slots.release()
+        service.shutdown()
+
+
+def test_timed_out_validation_is_stopped(valid_sample_sheet, invalid_sample_sheet):
+    service = ValidationService(workers=1, queue_size=0, timeout=0.001)
+    get_validation_cache().clear()
+    try:
+        with pytest.raises(ValidationTimeout):
+            service.validate(valid_sample_sheet)
+        # the worker was killed: its slot is free for the next validation
+        assert service.pending == 0
+        assert service._slots.acquire(blocking=False)
+        service._slots.release()
+        with pytest.raises(ValidationTimeout):
+            service.validate(invalid_sample_sheet)
+    finally:
+        service.shutdown()
+
+
+def test_timeout_answer():
+    service = ValidationService(workers=1, queue_size=0, timeout=0.001)
+    server = ValidationServer(("127.0.0.1", 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    get_validation_cache().clear()
+    try:
+        status, payload = request(server, "POST", "/validate", b"[Header]\n[Data]\nSample_ID,index\nA,ACGT\n")
+        assert status == 504
+        assert "longer than 0.001 seconds" in payload["error"]
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
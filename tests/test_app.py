@@ -3,8 +3,9 @@ import pytest
 from streamlit.testing.v1 import AppTest
 
 
-# Generous default timeout - print_checks sleeps 0.15s per check
-APP_TIMEOUT = 60
+# Covers the cold import of sequana on the first run; results are rendered at once
+# (the per-check animation is opt-in and disabled here).
+APP_TIMEOUT = 10
 
 
 def test_app_renders_without_error(app_path):
@@ -69,6 +70,26 @@ def test_process_valid_sample_sheet_succeeds(app_path, valid_sample_sheet):
     process_buttons[0].click().run()
     success_messages = [s.value for s in at.success]
     assert any("looks correct" in s for s in success_messages)
+    # the report of the checks can be downloaded in each export format
+    labels = [b.label for b in at.get("download_button")]
+    assert {"Report as JSON", "Report as NDJSON", "Report as HTML"} <= set(labels)
+
+
+def test_exports_are_built_on_demand(app_path, valid_sample_sheet):
+    """The runs of the page do not serialize the exports of the report."""
+    from check_my_sample_sheet.results import EXPORT_FORMATS, get_report_cache
+
+    get_report_cache().clear()
+    at = AppTest.from_file(app_path, default_timeout=APP_TIMEOUT)
+    at.run()
+    at.session_state.code_input = valid_sample_sheet
+    at.run()
+    [b for b in at.button if "Process" in b.label][0].click().run()
+    at.toggle[0].set_value(True).run()
+    assert not at.exception
+    digest = at.session_state.report.result.digest
+    assert (digest, "report") in get_report_cache()
+    assert not any((digest, fmt) in get_report_cache() for fmt in EXPORT_FORMATS)
 
 
 def test_process_invalid_sample_sheet_shows_error(app_path, invalid_sample_sheet):
@@ -98,3 +119,255 @@ def test_no_python_exceptions_on_full_render(app_path):
     at = AppTest.from_file(app_path, default_timeout=APP_TIMEOUT)
     at.run()
     assert len(at.exception) == 0
+
+
+def test_examples_page_uses_packaged_files(monkeypatch):
+    """The Examples page is built from the packaged sheets, without network access."""
+    import socket
+
+    def no_network(*args, **kwargs):
+        raise AssertionError("network access attempted")
+
+    monkeypatch.setattr(socket, "create_connection", no_network)
+
+    def script():
+        from check_my_sample_sheet.app import examples_page
+
+        examples_page()
+
+    at = AppTest.from_function(script, default_timeout=APP_TIMEOUT)
+    at.run()
+    assert not at.exception
+    assert len(at.code) == 5
+    assert "[Header]" in at.code[1].value
+
+
+def test_process_shows_index_distances(app_path, valid_sample_sheet):
+    """The index distance analysis is rendered below the [Data] section."""
+    at = AppTest.from_file(app_path, default_timeout=APP_TIMEOUT)
+    at.run()
+    at.session_state.code_input = valid_sample_sheet
+    at.run()
+    [b for b in at.button if "Process" in b.label][0].click().run()
+    assert not at.exception
+    assert "Index distances" in [s.value for s in at.subheader]
+
+
+def test_large_data_section_is_paginated():
+    """Only one page of a large [Data] section is sent to the browser; filters work."""
+
+    def script():
+        import pandas as pd
+
+        from check_my_sample_sheet.app import data_table
+
+        n = 500
+        df = pd.DataFrame(
+            {"sample_id": [f"S{i}" for i in range(n)], "lane": [1 + i % 4 for i in range(n)], "index": ["ACGT"] * n}
+        )
+        data_table(df)
+
+    at = AppTest.from_function(script, default_timeout=APP_TIMEOUT)
+    at.run()
+    assert not at.exception
+    assert len(at.dataframe[0].value) == 50
+    at.multiselect[0].set_value([2]).run()
+    assert set(at.dataframe[0].value["lane"]) == {2}
+    at.number_input[0].set_value(3).run()
+    assert not at.exception
+    assert len(at.dataframe[0].value) == 25
+
+
+def test_timings_panel(app_path, valid_sample_sheet):
+    """With the sidebar toggle on, the stage timings of the request are listed."""
+    at = AppTest.from_file(app_path, default_timeout=APP_TIMEOUT)
+    at.run()
+    at.session_state.code_input = valid_sample_sheet
+    at.toggle[0].set_value(True)
+    at.run()
+    [b for b in at.button if "Process" in b.label][0].click().run()
+    assert not at.exception
+    stages = at.sidebar.dataframe[0].value["stage"].tolist()
+    assert "process_sample_sheet" in stages
+    assert "print_checks" in stages
+
+
+def test_multiple_sheets_summary(batch_page, examples_dir):
+    """Several sheets are summarised in a table; selecting a row shows the report of that sheet."""
+    names = ["sample_sheet.csv", "Bad_SampleSheet_alphanum.csv", "sample_sheet_v2_bclconvert.csv"]
+    at = AppTest.from_file(batch_page, default_timeout=APP_TIMEOUT)
+    uploads = [(name, (examples_dir / name).read_text()) for name in names]
+    at.session_state.uploads = uploads + [("binary.csv", None, "The file is not UTF-8 text")]
+    at.run()
+    assert not at.exception
+    summary = at.dataframe[0].value
+    assert summary["file"].tolist() == names + ["binary.csv"]
+    assert summary["version"].tolist()[:3] == ["v1", "v1", "v2"]
+    assert "2 of 4" in at.error[0].value
+    # details are only rendered for the selected sheet
+    assert "Details about the checks" not in [s.value for s in at.subheader]
+
+    at.session_state["batch_summary"] = {"selection": {"rows": [1], "columns": []}}
+    at.run()
+    assert not at.exception
+    subheaders = [s.value for s in at.subheader]
+    assert subheaders[0] == "Bad_SampleSheet_alphanum.csv"
+    assert "Details about the checks" in subheaders
+
+
+def test_multiple_sheets_time_limit(monkeypatch, batch_page, examples_dir):
+    """Each sheet of an upload is validated under the time limit; the sheets stopped are reported."""
+    from check_my_sample_sheet import worker
+    from check_my_sample_sheet.validation import get_validation_cache
+
+    get_validation_cache().clear()
+    monkeypatch.setattr(worker, "TIME_LIMIT", 0.001)
+    names = ["sample_sheet.csv", "sample_sheet_v2_bclconvert.csv"]
+    at = AppTest.from_file(batch_page, default_timeout=APP_TIMEOUT)
+    at.session_state.uploads = [(name, (examples_dir / name).read_text()) for name in names]
+    at.run()
+    assert not at.exception
+    statuses = at.dataframe[0].value["status"].tolist()
+    assert all(status.startswith("stopped: The validation took longer than") for status in statuses)
+    assert "2 of 2" in at.error[0].value
+    assert len(get_validation_cache()) == 0
+
+
+def test_edited_sheet_reuses_unchanged_sections(app_path, valid_sample_sheet):
+    """After an edit of the [Header], the results of the other sections are reused."""
+    from check_my_sample_sheet.validation import get_validation_cache
+
+    # a sheet served from the process-wide cache is not validated, so it leaves no memo
+    get_validation_cache().clear()
+    at = AppTest.from_file(app_path, default_timeout=APP_TIMEOUT)
+    at.run()
+    at.session_state.code_input = valid_sample_sheet
+    at.run()
+    [b for b in at.button if "Process" in b.label][0].click().run()
+    assert not any("reused" in c.value for c in at.caption)
+
+    at.session_state.code_input = valid_sample_sheet.replace("MyProject", "MyOtherProject")
+    at.run()
+    [b for b in at.button if "Process" in b.label][0].click().run()
+    assert not at.exception
+    assert any("results reused from the unchanged sections" in c.value for c in at.caption)
+
+
+def test_validation_time_limit(monkeypatch, app_path, valid_sample_sheet):
+    """A validation stopped by its time limit is reported as an error, not as a crash."""
+    from check_my_sample_sheet import worker
+    from check_my_sample_sheet.validation import get_validation_cache
+
+    get_validation_cache().clear()
+    monkeypatch.setattr(worker, "TIME_LIMIT", 0.001)
+    at = AppTest.from_file(app_path, default_timeout=APP_TIMEOUT)
+    at.run()
+    at.session_state.code_input = valid_sample_sheet
+    at.run()
+    [b for b in at.button if "Process" in b.label][0].click().run()
+    assert not at.exception
+    assert any("longer than 0.001 seconds" in e.value for e in at.error)
+    assert "Validation Results" not in [h.value for h in at.header]
+    assert "validation_job" not in at.session_state
+
+
+def test_preflight_stops_broken_sheet(app_path):
+    """A sheet without [Data] section is reported by the pre-flight lint and not validated."""
+    at = AppTest.from_file(app_path, default_timeout=APP_TIMEOUT)
+    at.run()
+    at.session_state.code_input = "[Header]\nIEMFileVersion,4;\n"
+    at.run()
+    [b for b in at.button if "Process" in b.label][0].click().run()
+    assert not at.exception
+    assert "Pre-flight checks" in [s.value for s in at.subheader]
+    errors = [e.value for e in at.error]
+    assert any("line 2" in error and "Trailing ';'" in error for error in errors)
+    assert any("No [Data] section" in error for error in errors)
+    assert "Validation Results" not in [h.value for h in at.header]
+
+
+def test_cross_run_checks(monkeypatch, tmp_path, app_path, valid_sample_sheet):
+    """With a history database, the report has a cross-run section."""
+    from check_my_sample_sheet import history
+
+    monkeypatch.setattr(history, "HISTORY_DB", str(tmp_path / "history.sqlite"))
+    monkeypatch.setattr(history, "_history", None)
+    at = AppTest.from_file(app_path, default_timeout=APP_TIMEOUT)
+    at.run()
+    at.session_state.code_input = valid_sample_sheet
+    at.run()
+    [b for b in at.button if "Process" in b.label][0].click().run()
+    assert not at.exception
+    assert "Cross-run checks" in [h.value for h in at.subheader]
+    assert history.get_history().stats["runs"] == 1
+
+    # the reruns showing the report again neither record nor query the sheet again
+    calls = []
+    monkeypatch.setattr(history, "cross_run_checks", lambda result: calls.append(result))
+    at.toggle[0].set_value(True).run()
+    assert not at.exception
+    assert "Cross-run checks" in [h.value for h in at.subheader]
+    assert calls == []
+
+
+def test_multiple_sheets_are_recorded_once(monkeypatch, tmp_path, batch_page, examples_dir):
+    """The sheets of an upload are compared with the history when validated, not when selected."""
+    from check_my_sample_sheet import history
+
+    monkeypatch.setattr(history, "HISTORY_DB", str(tmp_path / "history.sqlite"))
+    monkeypatch.setattr(history, "_history", None)
+    names = ["sample_sheet.csv", "Bad_SampleSheet_alphanum.csv", "sample_sheet_v2_bclconvert.csv"]
+    at = AppTest.from_file(batch_page, default_timeout=APP_TIMEOUT)
+    at.session_state.uploads = [(name, (examples_dir / name).read_text()) for name in names]
+    at.run()
+    assert not at.exception
+    # the two valid sheets with a run name, before any selection
+    assert history.get_history().stats["runs"] == 2
+
+    calls = []
+    monkeypatch.setattr(history, "cross_run_checks", lambda result: calls.append(result))
+    at.session_state["batch_summary"] = {"selection": {"rows": [0], "columns": []}}
+    at.run()
+    assert not at.exception
+    assert "Cross-run checks" in [s.value for s in at.subheader]
+    assert calls == []
+
+
+def test_report_survives_other_widgets(app_path, valid_sample_sheet):
+    """The report of the last Process is shown again by the next runs, without a new validation."""
+    at = AppTest.from_file(app_path, default_timeout=APP_TIMEOUT)
+    at.run()
+    at.session_state.code_input = valid_sample_sheet
+    at.run()
+    [b for b in at.button if "Process" in b.label][0].click().run()
+    report = at.session_state.report
+    assert report.result.checks
+
+    at.toggle[0].set_value(True).run()
+    assert not at.exception
+    assert "Validation Results" in [h.value for h in at.header]
+    assert at.session_state.report is report
+    # nothing was validated by this run
+    assert not at.sidebar.dataframe
+
+    [b for b in at.button if "Example 3" in b.label][0].click().run()
+    assert not at.exception
+    assert at.session_state.report is report
+    assert "Details about the checks" in [s.value for s in at.subheader]
+    assert any("processed last" in i.value for i in at.info)
+
+
+def test_quick_fix_on_demand(app_path, examples_dir):
+    """The corrected file is only computed when asked for, and shown as a diff."""
+    at = AppTest.from_file(app_path, default_timeout=APP_TIMEOUT)
+    at.run()
+    at.session_state.code_input = (examples_dir / "Bad_SampleSheet_extra_semicolons.csv").read_text()
+    at.run()
+    [b for b in at.button if "Process" in b.label][0].click().run()
+    assert "Corrected file" in [s.value for s in at.subheader]
+    assert not any(c.language == "diff" for c in at.code)
+
+    at.toggle(key="data_quick_fix").set_value(True).run()
+    assert not at.exception
+    diff = [c.value for c in at.code if c.language == "diff"]
+    assert diff and diff[0].startswith("--- original")
@@ -0,0 +1,67 @@
+"""Tests for the headless ``validate`` subcommand."""
+import io
+import json
+import sys
+
+import pytest
+
+from check_my_sample_sheet import __main__ as entry_point
+from check_my_sample_sheet.batch import expand_paths, iter_results, main, validate_file
+
+
+def test_expand_paths(examples_dir):
+    paths = expand_paths([str(examples_dir / "sample_sheet*.csv"), str(examples_dir / "sample_sheet.csv")])
+    assert len(paths) == 3
+    assert paths[0].endswith("sample_sheet.csv")
+
+
+def test_expand_paths_keeps_unmatched_files():
+    assert expand_paths(["missing.csv"]) == ["missing.csv"]
+
+
+def test_validate_file(examples_dir):
+    record = validate_file(str(examples_dir / "Bad_SampleSheet_alphanum.csv"))
+    assert record["valid"] is False
+    assert record["errors"] == 1
+    assert record["version"] == "v1"
+    json.dumps(record)
+
+
+def test_validate_missing_file():
+    record = validate_file("missing.csv")
+    assert record["valid"] is False
+    assert "FileNotFoundError" in record["exception"]
+
+
+def test_process_pool_returns_all_files(examples_dir):
+    paths = expand_paths([str(examples_dir / "*.csv")])
+    records = list(iter_results(paths, jobs=2))
+    assert sorted(record["file"] for record in records) == sorted(paths)
+
+
+def test_ndjson_output_and_exit_status(examples_dir):
+    out = io.StringIO()
+    status = main(["-q", "-j", "1", str(examples_dir / "sample_sheet.csv")], stdout=out)
+    assert status == 0
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["valid"] is True
+
+    status = main(
+        ["-q", "-j", "1", str(examples_dir / "sample_sheet.csv"), str(examples_dir / "case3.csv")], stdout=out
+    )
+    assert status == 1
+
+
+def test_json_output_in_input_order(examples_dir):
+    out = io.StringIO()
+    paths = [str(examples_dir / "case2.csv"), str(examples_dir / "case1.csv")]
+    main(["-q", "-j", "2", "--format", "json", *paths], stdout=out)
+    assert [record["file"] for record in json.loads(out.getvalue())] == paths
+
+
+def test_entry_point_dispatches_validate(monkeypatch, examples_dir):
+    monkeypatch.setattr(sys, "argv", ["check-my-sample-sheet", "validate", "-q", str(examples_dir / "case1.csv")])
+    with pytest.raises(SystemExit) as err:
+        entry_point.main()
+    assert err.value.code == 0
@@ -0,0 +1,46 @@
+"""Tests for the ``benchmark`` subcommand."""
+import io
+import json
+
+from check_my_sample_sheet.benchmark import STAGES, compare, main, measure, run_case
+
+
+def test_measure_stops_after_budget():
+    assert len(measure(lambda: None, repeat=3, budget=10)) == 3
+    assert len(measure(lambda: None, repeat=3, budget=0)) == 1
+
+
+def test_run_case_times_every_stage():
+    case = {"samples": 10, "version": "v2", "lanes": 2, "dual_index": True, "errors": ["alphanum"]}
+    records = run_case(case, repeat=1)
+    assert [record["stage"] for record in records] == STAGES
+    assert all(record["runs"] == 1 and record["median"] > 0 for record in records)
+    json.dumps(records)
+
+
+def test_compare_flags_regressions():
+    reference = [{"version": "v1", "samples": 10, "lanes": 1, "dual_index": True, "errors": [], "stage": "parse"}]
+    reference[0]["median"] = 1.0
+    results = [{**reference[0], "median": 1.5}]
+    comparisons, regressions = compare(results, reference, tolerance=1.2)
+    assert comparisons[0][2] == 1.5
+    assert len(regressions) == 1
+    assert compare(results, reference, tolerance=2)[1] == []
+
+
+def test_main_writes_results_and_compares(tmp_path):
+    output = tmp_path / "results.json"
+    args = ["--sizes", "10", "--versions", "v1", "--errors", "--stages", "parse", "checks", "--repeat", "1"]
+    assert main([*args, "-o", str(output)], stderr=io.StringIO()) == 0
+    data = json.loads(output.read_text())
+    assert data["environment"]["format"] == 1
+    assert [record["stage"] for record in data["results"]] == ["parse", "checks"]
+
+    # a reference far faster than anything possible: every stage is a regression
+    for record in data["results"]:
+        record["median"] /= 1e6
+    reference = tmp_path / "reference.json"
+    reference.write_text(json.dumps(data))
+    stderr = io.StringIO()
+    assert main([*args, "-o", str(output), "--compare", str(reference)], stderr=stderr) == 1
+    assert "2 slower" in stderr.getvalue()
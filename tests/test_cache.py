@@ -0,0 +1,107 @@
+"""Unit tests for the LRU/TTL cache."""
+import pickle
+
+from check_my_sample_sheet.cache import LRUCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_set_and_counters():
+    cache = LRUCache(maxsize=2)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.stats == {"hits": 1, "misses": 1, "evictions": 0, "size": 1, "maxsize": 2, "bytes": 0, "maxbytes": 0}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" becomes the least recently used
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_ttl():
+    timer = FakeTimer()
+    cache = LRUCache(maxsize=10, ttl=5, timer=timer)
+    cache.set("a", 1)
+    timer.now = 4
+    assert cache.get("a") == 1
+    timer.now = 6
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_get_or_set_calls_factory_once():
+    cache = LRUCache(maxsize=10)
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return "value"
+
+    assert cache.get_or_set("k", factory) == "value"
+    assert cache.get_or_set("k", factory) == "value"
+    assert len(calls) == 1
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_byte_budget():
+    cache = LRUCache(maxsize=10, maxbytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.get("a")  # "b" becomes the least recently used
+    cache.set("c", "xxxx")
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.bytes == 8
+    # replacing an entry does not count it twice
+    cache.set("a", "xx")
+    assert cache.bytes == 6
+    # an entry larger than the budget is not stored
+    cache.set("d", "x" * 11)
+    assert "d" not in cache and cache.bytes == 6
+    assert cache.stats["maxbytes"] == 10
+
+
+def test_validation_results_are_sized(valid_sample_sheet):
+    from check_my_sample_sheet.validation import result_nbytes, run_validation
+
+    result = run_validation(valid_sample_sheet)
+    assert result_nbytes(result) >= result.df.memory_usage(deep=True).sum()
+
+
+def test_zero_maxsize_disables_caching():
+    cache = LRUCache(maxsize=0)
+    cache.set("a", 1)
+    assert len(cache) == 0
+
+
+def test_clear_resets_counters():
+    cache = LRUCache(maxsize=10)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.clear()
+    assert cache.stats["hits"] == 0
+    assert len(cache) == 0
+
+
+def test_pickled_copy():
+    cache = LRUCache(maxsize=10)
+    cache.set("a", 1)
+    cache.get("a")
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.get("a") == 1
+    assert copy.hits == 2
+    copy.set("b", 2)
+    assert "b" not in cache
@@ -1,7 +1,7 @@
 """Unit tests for helper functions in app.py."""
 import pytest
 
-from check_my_sample_sheet.app import load_example
+from check_my_sample_sheet.app import load_example, summarize_checks, summarize_report
 
 
 def test_load_example_valid_returns_content():
@@ -25,3 +25,104 @@ def test_load_example_invalid():
 def test_load_example_missing_file_raises():
     with pytest.raises(FileNotFoundError):
         load_example("does_not_exist.csv")
+
+
+def test_summarize_checks_counts_and_groups_messages():
+    checks = [
+        {"status": "Success", "msg": "ok"},
+        {"status": "Error", "msg": "bad"},
+        {"status": "Warning", "msg": "hmm"},
+        {"status": "Success", "msg": "fine"},
+    ]
+    counter, msgs = summarize_checks(checks)
+    assert counter == {"Error": 1, "Warning": 1, "Success": 2}
+    assert msgs["Error"] == ["Error :x:. bad\n\n"]
+    assert len(msgs["Success"]) == 2
+
+
+def test_summarize_checks_empty():
+    counter, msgs = summarize_checks([])
+    assert counter == {"Error": 0, "Warning": 0, "Success": 0}
+    assert not msgs
+
+
+def test_summarize_report_counts_as_the_exports(invalid_sample_sheet):
+    import json
+
+    from check_my_sample_sheet.results import check_report, export_report
+    from check_my_sample_sheet.validation import run_validation
+
+    result = run_validation(invalid_sample_sheet)
+    counter, msgs = summarize_report(check_report(result))
+    assert counter == json.loads(export_report(result, "json"))["counts"] == {"Error": 1, "Warning": 2, "Success": 14}
+    assert sum(len(messages) for messages in msgs.values()) == len(result.checks)
+    assert msgs["Error"][0].startswith("Error :x:.") and "(line 5)" in msgs["Error"][0]
+
+
+def test_load_example_is_memoized():
+    load_example.cache_clear()
+    first = load_example("case1.csv")
+    assert load_example("case1.csv") is first
+    assert load_example.cache_info().hits == 1
+
+
+def make_data_frame(n=120):
+    import pandas as pd
+
+    return pd.DataFrame(
+        {
+            "sample_id": [f"S{i}" for i in range(n)],
+            "sample_name": [f"name{i}" for i in range(n)],
+            "sample_project": ["P1" if i % 2 else "P2" for i in range(n)],
+            "lane": [1 + i % 4 for i in range(n)],
+            "index": ["ACGT"] * n,
+        }
+    )
+
+
+def test_filter_data():
+    from check_my_sample_sheet.app import filter_data
+
+    df = make_data_frame()
+    assert filter_data(df) is df
+    assert set(filter_data(df, lanes=[1, 2])["lane"]) == {1, 2}
+    assert set(filter_data(df, projects=["P1"], lanes=[2])["sample_project"]) == {"P1"}
+    assert filter_data(df, sample="s11")["sample_id"].tolist() == ["S11"] + [f"S11{i}" for i in range(10)]
+    assert filter_data(df, sample="NAME3")["sample_id"].tolist()[0] == "S3"
+
+
+def test_paginate():
+    from check_my_sample_sheet.app import count_pages, paginate
+
+    df = make_data_frame()
+    assert count_pages(len(df), 50) == 3
+    assert count_pages(0, 50) == 1
+    assert len(paginate(df, 1, 50)) == 50
+    assert paginate(df, 3, 50)["sample_id"].tolist()[-1] == "S119"
+    assert len(paginate(df, 3, 50)) == 20
+    assert len(paginate(df, 10, 50)) == 20
+
+
+def test_summary_table(valid_sample_sheet, invalid_sample_sheet):
+    from check_my_sample_sheet.app import summary_table
+    from check_my_sample_sheet.uploads import UploadedSheet
+    from check_my_sample_sheet.validation import run_validation
+
+    sheets = [
+        UploadedSheet("good.csv", valid_sample_sheet),
+        UploadedSheet("bad.csv", invalid_sample_sheet),
+        UploadedSheet("binary.csv", None, "The file is not UTF-8 text"),
+    ]
+    rows = summary_table(sheets, [run_validation(valid_sample_sheet), run_validation(invalid_sample_sheet), None])
+    assert [row["status"] for row in rows] == ["valid", "errors", "unreadable: The file is not UTF-8 text"]
+    assert rows[1]["errors"] == 1
+    assert rows[0]["version"] == "v1"
+
+
+def test_head_lines():
+    from check_my_sample_sheet.app import head_lines
+
+    text = "".join(f"line{i}\n" for i in range(10))
+    assert head_lines(text, 3) == ("line0\nline1\nline2", 10)
+    assert head_lines(text.rstrip("\n"), 20) == (text.rstrip("\n"), 10)
+    assert head_lines("", 5) == ("", 1)
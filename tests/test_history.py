@@ -0,0 +1,148 @@
+"""Tests of the cross-run checks (SQLite history of the validated sheets)."""
+import datetime
+import random
+import time
+
+import pytest
+
+from check_my_sample_sheet import history
+from check_my_sample_sheet.batch import validate_file
+from check_my_sample_sheet.history import (
+    SheetHistory,
+    cross_run_checks,
+    parse_date,
+    run_metadata,
+)
+from check_my_sample_sheet.synthetic import generate_sample_sheet
+from check_my_sample_sheet.validation import run_validation
+
+
+def other_run(samplesheet, name="OtherProject", date="2020-02-01"):
+    return samplesheet.replace("Experiment Name,MyProject", f"Experiment Name,{name}").replace(
+        "Date,2020-01-24", f"Date,{date}"
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SheetHistory(tmp_path / "history.sqlite")
+
+
+def statuses(checks):
+    return [check["status"] for check in checks]
+
+
+def test_run_metadata(valid_sample_sheet):
+    result = run_validation(valid_sample_sheet)
+    assert run_metadata(result) == ("MyProject\t2020-01-24", "MyProject", "2020-01-24", "")
+    assert parse_date("10/22/2021") == "2021-10-22"
+    assert parse_date("not a date") is None
+
+    result.header = {}
+    today = datetime.date(2024, 5, 1)
+    assert run_metadata(result, today) == (None, "", "2024-05-01", "")
+
+
+def test_first_run_has_no_warning(store, valid_sample_sheet):
+    result = run_validation(valid_sample_sheet)
+    assert statuses(store.check(result)) == ["Success", "Success"]
+    assert store.record(result)
+    assert store.stats == {"runs": 1, "samples": len(result.df)}
+
+
+def test_reused_indexes_and_sample_ids(store, valid_sample_sheet):
+    first = run_validation(valid_sample_sheet)
+    store.record(first)
+
+    checks = store.check(run_validation(other_run(valid_sample_sheet)))
+    assert statuses(checks) == ["Warning", "Warning"]
+    n = len(first.df)
+    assert checks[0]["msg"].startswith(f"{n} index pairs were used by other runs in the last 30 days")
+    assert "TGACCA of sample 412 (run MyProject of 2020-01-24, sample 412, lane -);" in checks[0]["msg"]
+    assert checks[1]["msg"].startswith(f"{n} sample IDs were already used by previous runs: 412 (run MyProject")
+
+    # older than the window: only the sample IDs collide
+    checks = store.check(run_validation(other_run(valid_sample_sheet, date="2020-06-01")))
+    assert statuses(checks) == ["Success", "Warning"]
+
+
+def test_new_version_of_a_run_replaces_the_previous_one(store, valid_sample_sheet):
+    store.record(run_validation(valid_sample_sheet))
+    edited = run_validation(valid_sample_sheet.replace("Investigator Name,", "Investigator Name,someone", 1))
+    # the previous version of the same run is not a collision
+    assert statuses(store.check(edited)) == ["Success", "Success"]
+    store.record(edited)
+    store.record(edited)
+    assert store.stats["runs"] == 1
+
+
+def test_resubmitted_sheet_without_run_name(store, examples_dir):
+    # no Experiment Name: an edited version is not a collision with the previous one
+    samplesheet = (examples_dir / "sample_sheet_settings_index.csv").read_text()
+    first = run_validation(samplesheet)
+    assert statuses(store.check(first)) == ["Success", "Success"]
+    assert not store.record(first)
+    edited = run_validation(samplesheet.replace("Investigator Name,", "Investigator Name,someone", 1))
+    assert statuses(store.check(edited)) == ["Success", "Success"]
+    assert not store.record(edited)
+    assert store.stats["runs"] == 0
+
+    # still compared with the named runs
+    named = run_validation(samplesheet.replace("Experiment Name,", "Experiment Name,Named", 1))
+    assert store.record(named)
+    assert statuses(store.check(edited)) == ["Warning", "Warning"]
+
+
+def test_sheets_with_errors_are_not_stored(store, invalid_sample_sheet):
+    assert not store.record(run_validation(invalid_sample_sheet))
+    assert store.stats == {"runs": 0, "samples": 0}
+
+
+def test_instrument_scope(store, valid_sample_sheet):
+    on_miseq = valid_sample_sheet.replace("[Header]\n", "[Header]\nInstrument Type,MiSeq\n", 1)
+    store.record(run_validation(on_miseq))
+    on_novaseq = other_run(valid_sample_sheet).replace("[Header]\n", "[Header]\nInstrument Type,NovaSeq\n", 1)
+    checks = store.check(run_validation(on_novaseq))
+    assert statuses(checks) == ["Success", "Warning"]
+    assert checks[0]["msg"] == "No index pair used on NovaSeq in the last 30 days."
+
+
+def test_lookups_with_a_large_history(store):
+    # 300,000 stored samples over 1,000 runs of 300 samples
+    rng = random.Random(0)
+    with store.connect() as db:
+        for run in range(1000):
+            date = (datetime.date(2020, 1, 1) + datetime.timedelta(days=run % 365)).isoformat()
+            run_id = db.execute(
+                "INSERT INTO runs (run_key, digest, run_name, run_date, instrument, recorded) VALUES (?, ?, ?, ?, '', ?)",
+                (f"run{run}", f"digest{run}", f"run{run}", date, date),
+            ).lastrowid
+            db.executemany(
+                "INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, "1", f"S{run}_{i}", "".join(rng.choices("ACGT", k=8)), "", date) for i in range(300)],
+            )
+    result = run_validation(generate_sample_sheet(samples=384, dual_index=True, seed=1))
+    start = time.perf_counter()
+    checks = store.check(result)
+    elapsed = time.perf_counter() - start
+    assert len(checks) == 2
+    assert elapsed < 0.5
+
+
+def test_enabled_by_configuration(monkeypatch, tmp_path, examples_dir):
+    path = str(examples_dir / "sample_sheet.csv")
+    assert cross_run_checks(run_validation((examples_dir / "sample_sheet.csv").read_text())) is None
+    assert "cross_run" not in validate_file(path)
+
+    monkeypatch.setattr(history, "HISTORY_DB", str(tmp_path / "history.sqlite"))
+    monkeypatch.setattr(history, "_history", None)
+    assert statuses(validate_file(path)["cross_run"]) == ["Success", "Success"]
+    assert history.get_history().stats["runs"] == 1
+
+
+def test_database_errors_are_warnings(monkeypatch, tmp_path, valid_sample_sheet):
+    monkeypatch.setattr(history, "HISTORY_DB", str(tmp_path / "missing" / "history.sqlite"))
+    monkeypatch.setattr(history, "_history", None)
+    checks = cross_run_checks(run_validation(valid_sample_sheet))
+    assert statuses(checks) == ["Warning"]
+    assert "could not be used" in checks[0]["msg"]
@@ -0,0 +1,55 @@
+"""Import-time budget: the app and the CLI entry points must start fast."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from .conftest import PROJECT_ROOT
+
+#: seconds allowed to import the app in a fresh interpreter (raise it on slow machines)
+IMPORT_BUDGET = float(os.environ.get("IMPORT_BUDGET", 1.5))
+
+HEAVY_MODULES = {"sequana", "pandas", "numpy", "pyarrow", "altair", "streamlit_option_menu"}
+
+
+def import_in_subprocess(module):
+    """Import *module* in a fresh interpreter; return (seconds, names of the loaded top-level modules)."""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "seconds = time.perf_counter() - start\n"
+        "print(json.dumps([seconds, sorted({name.split('.')[0] for name in sys.modules})]))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    seconds, modules = json.loads(output.splitlines()[-1])
+    return seconds, set(modules)
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "check_my_sample_sheet.app",
+        "check_my_sample_sheet.__main__",
+        "check_my_sample_sheet.batch",
+        "check_my_sample_sheet.benchmark",
+    ],
+)
+def test_no_heavy_import(module):
+    _, modules = import_in_subprocess(module)
+    assert not modules & HEAVY_MODULES
+
+
+def test_cli_does_not_import_streamlit():
+    _, modules = import_in_subprocess("check_my_sample_sheet.__main__")
+    assert "streamlit" not in modules
+
+
+def test_app_import_budget():
+    # best of three: the first import may pay for a cold disk cache
+    seconds = min(import_in_subprocess("check_my_sample_sheet.app")[0] for _ in range(3))
+    assert seconds < IMPORT_BUDGET, f"importing the app took {seconds:.2f}s (budget {IMPORT_BUDGET}s)"
@@ -0,0 +1,120 @@
+"""Tests for the index distance analysis."""
+import numpy as np
+import pandas as pd
+
+from check_my_sample_sheet import indexes
+from check_my_sample_sheet.indexes import (
+    PAD,
+    analyse_indexes,
+    analyse_lane,
+    encode_indexes,
+    iter_distance_blocks,
+    near_pairs,
+    pairwise_distances,
+)
+
+
+def naive_distance(a, b):
+    length = max(len(a), len(b))
+    return sum(1 for x, y in zip(a.ljust(length, "-"), b.ljust(length, "+")) if x != y)
+
+
+def test_encode_indexes():
+    codes = encode_indexes(["ACGTN", "acg", None])
+    assert codes.shape == (3, 5)
+    assert codes[0].tolist() == [0, 1, 2, 3, 4]
+    assert codes[1].tolist() == [0, 1, 2, PAD, PAD]
+    assert (codes[2] == PAD).all()
+
+
+def test_blocks_match_naive_distances():
+    rng = np.random.default_rng(1)
+    seqs = ["".join(rng.choice(list("ACGT"), rng.integers(6, 9))) for _ in range(50)]
+    codes = encode_indexes(seqs)
+    # tiny budget: many blocks of a few rows
+    matrix = pairwise_distances(codes, block_bytes=1000)
+    for i in range(50):
+        for j in range(50):
+            assert matrix[i, j] == naive_distance(seqs[i], seqs[j])
+    assert len(list(iter_distance_blocks(codes, block_bytes=1000))) > 1
+
+
+def test_i7_and_i5_of_different_lengths_in_small_blocks():
+    rng = np.random.default_rng(2)
+    i7 = ["".join(rng.choice(list("ACGT"), 10)) for _ in range(40)]
+    i5 = ["".join(rng.choice(list("ACGT"), 6)) for _ in range(40)]
+    samples = [f"s{i}" for i in range(40)]
+    small = analyse_lane(samples, i7, i5, block_bytes=2000)
+    whole = analyse_lane(samples, i7, i5)
+    assert small.min_distance == whole.min_distance
+    assert small.close_pairs.equals(whole.close_pairs)
+
+
+def test_blocks_stay_within_the_budget():
+    codes = encode_indexes(["ACGTACGT"] * 500)
+    onehot_bytes = codes.size * indexes._SYMBOLS * 4
+    block_bytes = onehot_bytes + 100 * 500 * indexes._PAIR_BYTES
+    assert {len(block) for _, block in iter_distance_blocks(codes, block_bytes)} == {100}
+
+
+def test_near_pairs_match_all_pairs():
+    rng = np.random.default_rng(3)
+    seqs = ["".join(rng.choice(list("ACGN"), rng.integers(7, 10))) for _ in range(300)]
+    codes = encode_indexes(seqs)
+    matrix = pairwise_distances(codes)
+    expected = {(i, j) for i, j in zip(*np.nonzero(np.triu(matrix <= 4, 1)))}
+    # tiny budget: many chunks of candidate pairs
+    rows, cols, distances = near_pairs(codes, 4, block_bytes=2000)
+    assert set(zip(rows.tolist(), cols.tolist())) == expected
+    assert distances.tolist() == matrix[rows, cols].tolist()
+    assert near_pairs(codes, 4, max_pairs=10) is None
+
+
+def test_large_lanes_from_their_near_pairs(monkeypatch):
+    rng = np.random.default_rng(4)
+    i7 = ["".join(rng.choice(list("ACGT"), 8)) for _ in range(1500)]
+    i5 = ["".join(rng.choice(list("ACGT"), 8)) for _ in range(1500)]
+    samples = [f"s{i}" for i in range(1500)]
+    # s0 and s1 differ by one base
+    i7[1], i5[1] = i7[0][:-1] + ("A" if i7[0][-1] != "A" else "C"), i5[0]
+    # with the matrix kept, all the pairs are compared
+    whole = analyse_lane(samples, i7, i5, max_matrix=1500)
+    monkeypatch.setattr(indexes, "_all_lane_pairs", None)
+    near = analyse_lane(samples, i7, i5)
+    assert (near.min_distance, near.mismatch_tolerance) == (whole.min_distance, whole.mismatch_tolerance)
+    assert near.close_pairs.equals(whole.close_pairs)
+    assert len(near.close_pairs) > 0
+
+
+def test_collision_and_tolerance():
+    report = analyse_lane(["a", "b", "c"], ["AAAAAA", "AAAAAA", "CCCCCC"], ["GGGGGG", "GGGGGG", "TTTTTT"])
+    assert report.min_distance == 0
+    assert report.mismatch_tolerance is None
+    assert report.close_pairs[["sample_1", "sample_2", "distance"]].values.tolist() == [["a", "b", 0]]
+
+
+def test_tolerance_uses_both_index_reads():
+    # I7 differ by 2 and I5 by 3: separable with 1 mismatch per read (max(2, 3) = 3 > 2)
+    report = analyse_lane(["a", "b"], ["AAAAAAAA", "AAAAAACC"], ["GGGGGGGG", "GGGGGTTT"])
+    assert report.min_distance == 5
+    assert report.mismatch_tolerance == 1
+    assert report.close_pairs.empty
+
+
+def test_analyse_indexes_per_lane():
+    df = pd.DataFrame(
+        {
+            "sample_id": ["s1", "s2", "s3", "s4"],
+            "lane": [1, 1, 2, 2],
+            "index": ["ACGTAC", "ACGTAC", "ACGTAC", "TTTTTT"],
+        }
+    )
+    reports = analyse_indexes(df)
+    assert [report.lane for report in reports] == [1, 2]
+    assert reports[0].mismatch_tolerance is None
+    assert reports[1].mismatch_tolerance == 2
+    assert reports[1].to_dict()["lane"] == 2
+
+
+def test_analyse_indexes_without_index_column():
+    assert analyse_indexes(pd.DataFrame({"sample_id": ["a"]})) == []
@@ -0,0 +1,81 @@
+"""Tests of the lane by lane checks of multi-lane sheets."""
+from check_my_sample_sheet.lanes import check_lanes, merge_results
+from check_my_sample_sheet.samplesheet import load_sample_sheet, section_memo
+from check_my_sample_sheet.synthetic import generate_sample_sheet
+from check_my_sample_sheet.validation import run_validation
+
+TWO_LANES = """[Header]
+IEMFileVersion,4
+Experiment Name,two-lanes
+Date,2024-01-01
+
+[Reads]
+151
+151
+
+[Data]
+Lane,Sample_ID,Sample_Name,I7_Index_ID,index,Sample_Project
+1,S1,S1,A01,ACGTACGT,P1
+1,S2,S2,A02,TTGGCCAA,P1
+2,S1,S1,A01,ACGTACGT,P1
+2,S3,S3,A03,GGCCTTAA,P1
+"""
+
+
+def messages(checks):
+    return [(check["status"], str(check["msg"])) for check in checks]
+
+
+def test_uniqueness_is_checked_per_lane():
+    # the same sample and index in two lanes is a valid sheet
+    result = run_validation(TWO_LANES)
+    assert not result.has_errors
+    assert ("Success", "Indices are unique.") in messages(result.checks)
+    assert ("Success", "Sample ID uniqueness") in messages(result.checks)
+    assert [report.lane for report in result.indexes] == [1, 2]
+    assert "lanes" in [stage for stage, _ in result.timings]
+
+    duplicated = TWO_LANES.replace("2,S3,S3,A03,GGCCTTAA", "2,S1,S1,A03,GGCCTTAA")
+    errors = [msg for status, msg in messages(run_validation(duplicated).checks) if status == "Error"]
+    assert errors == ["Lane 2: Sample ID not unique. Duplicated entries on lines: 4"]
+
+
+def test_parallel_and_sequential_results_match():
+    text = generate_sample_sheet(samples=400, lanes=8, errors=["duplicate_index", "index_length"], seed=3)
+    _, sheet = load_sample_sheet(text)
+    parallel = check_lanes(sheet, sheet.df, workers=4, min_rows=0)
+    sequential = check_lanes(sheet, sheet.df, workers=1)
+    assert parallel.lanes == sequential.lanes == list(range(1, 9))
+    assert parallel.checks == sequential.checks
+    assert [report.to_dict() for report in parallel.indexes] == [report.to_dict() for report in sequential.indexes]
+
+    # same failures as sequana's checks on the whole frame, prefixed by their lane
+    reference = {str(check["msg"]) for check in load_sample_sheet(text)[1].checker() if check["status"] == "Error"}
+    sheet_errors = [check for check in parallel.checks.values() if check["status"] == "Error"]
+    assert sheet_errors
+    for check in sheet_errors:
+        assert check["msg"].startswith("Lane ")
+        assert check["msg"].split(": ", 1)[1] in reference
+
+
+def test_single_lane_sheets_are_checked_as_a_whole(valid_sample_sheet):
+    _, sheet = load_sample_sheet(valid_sample_sheet)
+    assert check_lanes(sheet, sheet.df) is None
+
+
+def test_merge_results():
+    ok = {"name": "check", "msg": "fine", "status": "Success"}
+    assert merge_results([1, 2], [ok, ok]) == ok
+    bad = {"name": "check", "msg": "bad", "status": "Error"}
+    warning = {"name": "check", "msg": "odd", "status": "Warning"}
+    merged = merge_results([1, 2, 3], [bad, warning, bad])
+    assert merged == {"name": "check", "msg": "Lane 1: bad; Lane 3: bad", "status": "Error"}
+
+
+def test_lanes_are_memoized():
+    memo = section_memo()
+    text = generate_sample_sheet(samples=64, lanes=4)
+    first = run_validation(text, memo=memo)
+    again = run_validation(text.replace("synthetic", "edited", 1), memo=memo)
+    assert again.checks == first.checks
+    assert again.indexes is first.indexes
@@ -0,0 +1,53 @@
+"""Tests for the ``loadtest`` subcommand."""
+import io
+import json
+import sys
+
+import pytest
+
+from check_my_sample_sheet.loadtest import main, percentile, sheet_pool, summarize
+
+
+def test_percentile():
+    values = [0.5, 0.1, 0.4, 0.2, 0.3]
+    assert percentile(values, 50) == 0.3
+    assert percentile(values, 99) == 0.5
+    assert percentile(values, 1) == 0.1
+    assert percentile([], 50) is None
+    summary = summarize(values)
+    assert summary["count"] == 5 and summary["max"] == 0.5 and summary["p90"] == 0.5
+    assert summarize([]) == {"count": 0}
+
+
+def test_sheet_pool_weights():
+    pool = sheet_pool(large=50, large_ratio=0.25)
+    assert sum(weight for _, _, weight in pool) == pytest.approx(1)
+    large = [text for name, text, _ in pool if name == "synthetic-50"]
+    assert len(large) == 4 and len(set(large)) == 4
+    assert all(name.endswith(".csv") for name, _, _ in sheet_pool(large=0))
+
+
+def test_missing_websockets(monkeypatch, capsys):
+    monkeypatch.setitem(sys.modules, "websockets", None)
+    with pytest.raises(SystemExit):
+        main([])
+    assert 'pip install "check-my-sample-sheet[loadtest]"' in capsys.readouterr().err
+
+
+def test_concurrent_sessions(tmp_path):
+    pytest.importorskip("websockets")
+    output = tmp_path / "load.json"
+    stdout = io.StringIO()
+    args = ["--sessions", "3", "--submissions", "2", "--large", "200", "--large-ratio", "0.5", "-o", str(output)]
+    assert main(args, stdout=stdout) == 0
+
+    report = json.loads(output.read_text())["report"]
+    assert report["submissions"] == 6
+    assert report["statuses"] == {"ok": 6}
+    assert report["latency"]["count"] == 6
+    assert report["latency"]["p50"] <= report["latency"]["p99"] <= report["latency"]["max"]
+    assert report["throughput"] > 0
+    assert all(sheet["bytes"] > 0 for sheet in report["sheets"].values())
+    if sys.platform.startswith("linux"):
+        assert report["memory"]["server_peak_mb"] > 0
+    assert "submissions/s" in stdout.getvalue()
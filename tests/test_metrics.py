@@ -0,0 +1,66 @@
+"""Tests for the timing instrumentation and the metrics export."""
+import json
+
+from check_my_sample_sheet import metrics
+from check_my_sample_sheet.metrics import (
+    MetricsRegistry,
+    Summary,
+    prometheus_text,
+    request_timings,
+    timed,
+)
+
+
+def test_summary_quantiles():
+    summary = Summary(window=100)
+    for value in range(1, 101):
+        summary.observe(value)
+    assert summary.count == 100
+    assert summary.total == 5050
+    assert summary.quantile(0.5) == 51
+    assert summary.quantile(0.99) == 100
+
+
+def test_timed_feeds_registry_and_request():
+    metrics.registry.clear()
+    with request_timings() as outer:
+        with timed("a"):
+            pass
+        with request_timings() as inner:
+            with timed("b"):
+                pass
+    assert [stage for stage, _ in inner] == ["b"]
+    assert [stage for stage, _ in outer] == ["a", "b"]
+    snapshot = metrics.registry.snapshot()
+    assert snapshot[("stage_seconds", "a")]["count"] == 1
+
+
+def test_prometheus_text():
+    registry = MetricsRegistry()
+    registry.observe("stage_seconds", 0.5, stage="checker")
+    registry.observe("sheet_rows", 10)
+    text = prometheus_text(registry)
+    assert "# TYPE check_my_sample_sheet_stage_seconds summary" in text
+    assert 'check_my_sample_sheet_stage_seconds{stage="checker",quantile="0.5"} 0.5' in text
+    assert 'check_my_sample_sheet_stage_seconds_count{stage="checker"} 1' in text
+    assert "check_my_sample_sheet_sheet_rows_sum 10.0" in text
+    assert "check_my_sample_sheet_cache_hits_total" in text
+
+
+def test_export(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "METRICS_FILE", str(tmp_path / "metrics.prom"))
+    monkeypatch.setattr(metrics, "METRICS_LOG", str(tmp_path / "metrics.ndjson"))
+    metrics.export([("parse", 0.25), ("parse", 0.25)], rows=3)
+    assert "check_my_sample_sheet" in (tmp_path / "metrics.prom").read_text()
+    record = json.loads((tmp_path / "metrics.ndjson").read_text())
+    assert record["rows"] == 3
+    assert record["timings"] == {"parse": 0.5}
+    # the temporary file of the atomic write is gone
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_validation_stages_are_timed(valid_sample_sheet):
+    from check_my_sample_sheet.validation import run_validation
+
+    result = run_validation(valid_sample_sheet)
+    assert [stage for stage, _ in result.timings] == ["parse", "checker", "index_analysis"]
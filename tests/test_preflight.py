@@ -0,0 +1,118 @@
+"""Tests of the streaming pre-flight lint."""
+import io
+
+import pytest
+
+from check_my_sample_sheet.preflight import lint_stream, lint_text
+
+
+class CountingStream(io.BytesIO):
+    """BytesIO recording the number of bytes read."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.consumed = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.consumed += len(chunk)
+        return chunk
+
+
+def names(report):
+    return [issue["name"] for issue in report.issues]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 65536])
+def test_clean_sheets_have_no_issue(examples_dir, chunk_size):
+    for filename in ("sample_sheet.csv", "sample_sheet_v2_bclconvert.csv"):
+        data = (examples_dir / filename).read_bytes()
+        report = lint_stream(io.BytesIO(data), chunk_size=chunk_size)
+        assert report.issues == []
+        assert report.text == data.decode("utf-8")
+        assert report.bytes == len(data)
+        assert report.lines == data.count(b"\n")
+
+
+def test_trailing_semicolons_are_left_to_sequana(examples_dir):
+    # not reported twice: the sheet is validated and check_semi_column_presence reports them
+    data = (examples_dir / "Bad_SampleSheet_extra_semicolons.csv").read_bytes()
+    report = lint_stream(io.BytesIO(data))
+    assert names(report) == []
+    assert not report.fatal
+    assert report.text is not None
+
+    # reported when the sheet is not validated
+    report = lint_stream(io.BytesIO(data.replace(b"[Data]", b"[Samples]")))
+    assert names(report) == ["preflight_data_section", "preflight_semicolons"]
+    assert report.issues[1]["line"] == 1
+    assert "lines 1, 2, 3, 4, 5, ... (16 lines)" in report.issues[1]["msg"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 65536])
+def test_bom_and_mixed_line_endings(chunk_size):
+    data = b"\xef\xbb\xbf[Header]\r\nIEMFileVersion,4\n[Data]\r\nSample_ID,index\r\nA,ACGT\r\n"
+    report = lint_stream(io.BytesIO(data), chunk_size=chunk_size)
+    assert names(report) == ["preflight_bom", "preflight_line_endings"]
+    # a \r\n split over two chunks is one CRLF
+    assert "mostly CRLF (Windows), but LF (Unix) at line 2." in report.issues[1]["msg"]
+    assert report.issues[1]["line"] == 2
+    assert report.text.startswith("[Header]\r\n")
+
+
+def test_encoding_detection():
+    # ASCII then Latin-1: read as Windows-1252, with a warning at the first non UTF-8 byte
+    data = "[Header]\nInvestigator Name,Lemée\n[Data]\nSample_ID\nA\n".encode("cp1252")
+    report = lint_stream(io.BytesIO(data), chunk_size=4)
+    assert not report.fatal
+    assert report.encoding == "cp1252"
+    assert report.text == data.decode("cp1252")
+    assert report.issues[0]["line"] == 2
+    assert "0xe9 at line 2" in report.issues[0]["msg"]
+
+    text = "[Data]\nSample_ID\nÉchantillon\n"
+    for encoding in ("utf-16", "utf-32"):
+        report = lint_stream(io.BytesIO(text.encode(encoding)), chunk_size=3)
+        assert report.encoding == encoding and report.text == text
+        assert names(report) == ["preflight_encoding"] and not report.fatal
+
+
+def test_unknown_encoding():
+    # UTF-8 then Latin-1: mixed encodings
+    data = "[Header]\nInvestigator Name,Lemée\n".encode("utf-8") + "[Data]\nLemée\n".encode("latin-1")
+    report = lint_stream(io.BytesIO(data), chunk_size=4)
+    assert report.fatal
+    assert report.text is None
+    assert report.issues[0]["line"] == 4
+    assert "0xe9 at line 4" in report.error
+    assert "Windows-1252" in report.error
+
+    # byte undefined in Windows-1252
+    report = lint_stream(io.BytesIO(b"[Data]\nSample_ID\n\x81\n"))
+    assert report.error == "The file is not UTF-8 or Windows-1252 text: invalid byte 0x81 at line 3."
+
+
+def test_size_limit_stops_reading():
+    stream = CountingStream(b"[Data]\n" + b"x" * 10**6)
+    report = lint_stream(stream, max_size=1000, chunk_size=100)
+    assert names(report) == ["preflight_size"]
+    assert report.fatal
+    assert stream.consumed <= 1100
+
+
+def test_fatal_structure():
+    assert lint_text(" \n\n").error == "The sample sheet is empty."
+    report = lint_text("[Header]\nIEMFileVersion,4\n[Data;;\n")
+    assert names(report) == ["preflight_data_section", "preflight_semicolons"]
+    assert report.fatal
+    report = lint_text("[Data]\nSample_ID\nA\x00B\n")
+    assert report.issues[0]["line"] == 3
+    # sequana's cleaning of the section titles
+    assert not lint_text("[Data],,,\nSample_ID,index\n").issues
+    assert not lint_text("[bclconvert_data]\nSample_ID,Index\n").issues
+
+
+def test_lint_text_matches_lint_stream(examples_dir):
+    data = b"\xef\xbb\xbf[Data]\r\nSample_ID,index;\nA,ACGT\r"
+    text = data.decode("utf-8")
+    assert lint_text(text) == lint_stream(io.BytesIO(data))
@@ -0,0 +1,102 @@
+"""Tests of the typed check results and their exports."""
+import json
+
+import pytest
+
+from check_my_sample_sheet.results import (
+    CheckReport,
+    Status,
+    check_id,
+    check_report,
+    export_report,
+    get_report_cache,
+)
+from check_my_sample_sheet.synthetic import generate_sample_sheet
+from check_my_sample_sheet.validation import run_validation
+
+
+def test_check_ids():
+    assert check_id({"name": "check_settings", "msg": "", "status": "Success"}, 0) == "check_settings"
+    assert check_id({"caller": "_check_settings", "msg": "", "status": "Error"}, 0) == "check_settings"
+    missing = {"msg": "The [Header] section is missing", "status": "Error"}
+    assert check_id(missing, 3) == "check_header_section"
+    assert check_id({"msg": "?", "status": "Warning"}, 3) == "check_3"
+
+
+def test_report_of_an_invalid_sheet(invalid_sample_sheet):
+    result = run_validation(invalid_sample_sheet)
+    report = CheckReport.from_result(result)
+    assert report.counts == result.counts == {"Error": 1, "Warning": 2, "Success": 14}
+    assert not report.is_valid
+
+    [error] = [check for check in report.checks if check.status is Status.ERROR]
+    assert error.id == "check_alpha_numerical"
+    assert error.status == "Error" and error.status.severity == 2
+    assert error.section == "Data"
+    assert error.rows == (5,) and error.samples == ("3D+LmeA14",)
+    # every check ran under its own timer
+    assert all(check.seconds is not None and check.seconds >= 0 for check in report.checks)
+    assert len({check.id for check in report.checks}) == len(report.checks)
+
+
+def test_file_lines_and_sections(examples_dir):
+    result = run_validation((examples_dir / "Bad_SampleSheet_extra_semicolons.csv").read_text())
+    checks = {check.id: check for check in check_report(result).checks}
+    assert checks["check_semi_column_presence"].lines == (1,)
+    assert checks["check_semi_column_presence"].rows == ()
+    assert checks["check_semi_column_presence"].section is None
+    assert checks["check_settings"].section == "Settings"
+
+
+def test_numbers_that_are_not_rows(examples_dir):
+    # a row with a missing comma: the message quotes the comma counts {4, 5}, not rows
+    lines = (examples_dir / "sample_sheet.csv").read_text().splitlines()
+    row = lines.index("[Data]") + 3
+    lines[row] = lines[row].rsplit(",", 1)[0]
+    checks = {check.id: check for check in check_report(run_validation("\n".join(lines) + "\n")).checks}
+    malformed = checks["check_data_section_csv_format"]
+    assert malformed.status is Status.ERROR and "{4, 5}" in malformed.message
+    assert malformed.rows == malformed.lines == malformed.samples == ()
+
+
+def test_v2_sections(examples_dir):
+    result = run_validation((examples_dir / "sample_sheet_v2_bclconvert.csv").read_text())
+    report = check_report(result)
+    assert report.is_valid and report.version == "v2"
+    assert "BCLConvert_Data" in {check.section for check in report.checks}
+
+
+def test_lanes_are_referenced():
+    result = run_validation(generate_sample_sheet(samples=40, lanes=4, errors=["duplicate_index"], seed=3))
+    [error] = [check for check in check_report(result).checks if check.status is Status.ERROR]
+    assert error.id == "check_unique_indices"
+    assert error.lanes == ("4",)
+    assert len(error.samples) == 1
+
+
+def test_exports(invalid_sample_sheet):
+    result = run_validation(invalid_sample_sheet)
+    data = json.loads(export_report(result, "json"))
+    assert data["digest"] == result.digest
+    assert data["valid"] is False and data["counts"]["Error"] == 1
+    assert data["checks"][0].keys() >= {"id", "status", "section", "rows", "samples", "seconds"}
+
+    lines = export_report(result, "ndjson").splitlines()
+    assert len(lines) == len(data["checks"])
+    assert all(json.loads(line)["digest"] == result.digest for line in lines)
+
+    page = export_report(result, "html")
+    assert page.startswith("<!DOCTYPE html>") and "<script" not in page
+    assert "3D+LmeA14" in page and "check_alpha_numerical" in page
+
+    with pytest.raises(ValueError):
+        export_report(result, "xml")
+
+
+def test_exports_are_cached(valid_sample_sheet):
+    get_report_cache().clear()
+    result = run_validation(valid_sample_sheet)
+    assert check_report(result) is check_report(result)
+    assert export_report(result, "json") is export_report(result, "json")
+    # the same sheet validated again shares the cached report
+    assert check_report(run_validation(valid_sample_sheet)) is check_report(result)
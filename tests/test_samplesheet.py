@@ -0,0 +1,120 @@
+"""The in-memory sample sheets must behave exactly like the sequana file-based ones."""
+import os
+
+import pytest
+from sequana import iem
+
+from check_my_sample_sheet.samplesheet import (
+    SampleSheetFactory,
+    ScratchArea,
+    TextBCLConvert,
+    TextSampleSheet,
+    get_sample_sheet_version,
+    load_sample_sheet,
+    scratch,
+    section_memo,
+)
+from check_my_sample_sheet.synthetic import generate_sample_sheet
+
+EXAMPLES = [
+    "sample_sheet.csv",
+    "sample_sheet_settings_index.csv",
+    "sample_sheet_v2_bclconvert.csv",
+    "Bad_SampleSheet_alphanum.csv",
+    "Bad_SampleSheet_extra_semicolons.csv",
+    "case1.csv",
+    "case2.csv",
+    "case3.csv",
+]
+
+
+@pytest.mark.parametrize("name", EXAMPLES)
+def test_same_results_as_sequana(examples_dir, name, tmp_path):
+    filename = examples_dir / name
+    text = filename.read_text()
+
+    assert get_sample_sheet_version(text) == iem.get_sample_sheet_version(str(filename))
+
+    expected = iem.SampleSheetFactory(str(filename))
+    sheet = SampleSheetFactory(text)
+    assert type(sheet).__bases__[-1] is type(expected)
+    assert sheet.sections == expected.sections
+    assert [(c["status"], str(c["msg"])) for c in sheet.checker()] == [
+        (c["status"], str(c["msg"])) for c in expected.checker()
+    ]
+
+    expected.quick_fix(str(tmp_path / "fixed.csv"))
+    assert sheet.quick_fix_text() == (tmp_path / "fixed.csv").read_text()
+
+
+def test_factory_picks_the_class(valid_sample_sheet, examples_dir):
+    assert isinstance(SampleSheetFactory(valid_sample_sheet), TextSampleSheet)
+    v2 = (examples_dir / "sample_sheet_v2_bclconvert.csv").read_text()
+    assert isinstance(SampleSheetFactory(v2), TextBCLConvert)
+
+
+def test_quick_fix_leaves_no_scratch_file(invalid_sample_sheet):
+    SampleSheetFactory(invalid_sample_sheet).quick_fix_text()
+    assert os.listdir(scratch.directory) == []
+
+
+def test_scratch_area_reuses_and_removes_files(tmp_path):
+    area = ScratchArea(root=str(tmp_path))
+    with area.path() as first:
+        with open(first, "w") as fout:
+            fout.write("data")
+    assert not os.path.exists(first)
+    with area.path() as second:
+        assert second == first
+    area.cleanup()
+    assert list(tmp_path.iterdir()) == []
+
+
+def check_results(sheet):
+    return [(c["status"], str(c["msg"])) for c in sheet.checker()]
+
+
+@pytest.mark.parametrize("version", ["v1", "v2"])
+def test_section_memo_reruns_the_checks_of_changed_sections_only(monkeypatch, version):
+    text = generate_sample_sheet(20, version)
+    memo = section_memo()
+    first = check_results(load_sample_sheet(text, memo=memo)[1])
+
+    calls = []
+    get_df = iem.SampleSheet._get_df
+
+    def counting_get_df(self):
+        calls.append("df")
+        return get_df(self)
+
+    monkeypatch.setattr(iem.SampleSheet, "_get_df", counting_get_df)
+
+    # same sections: every check is reused, the [Data] frame is not parsed again
+    hits = memo.hits
+    assert check_results(load_sample_sheet(text, memo=memo)[1]) == first
+    assert calls == []
+    assert memo.hits - hits >= 15
+
+    # [Settings] edited: the data checks are reused, the settings check sees the change
+    edited = text.replace("AdapterRead2,", "AdapterRead2,N")
+    results = check_results(load_sample_sheet(edited, memo=memo)[1])
+    assert calls == []
+    assert results == check_results(load_sample_sheet(edited)[1])
+    assert results != first
+
+    # [Data] edited: the frame is parsed again and the data checks re-run
+    edited = edited.replace("S000003", "S000003+")
+    calls.clear()
+    results = check_results(load_sample_sheet(edited, memo=memo)[1])
+    assert calls == ["df"]
+    assert results == check_results(load_sample_sheet(edited)[1])
+
+
+@pytest.mark.parametrize("name", EXAMPLES)
+def test_section_memo_gives_the_same_results(examples_dir, name):
+    memo = section_memo()
+    # the memo is shared with the checks of all the other examples
+    for other in EXAMPLES:
+        load_sample_sheet((examples_dir / other).read_text(), memo=memo)[1].checker()
+    text = (examples_dir / name).read_text()
+    assert check_results(load_sample_sheet(text, memo=memo)[1]) == check_results(load_sample_sheet(text)[1])
@@ -0,0 +1,37 @@
+"""Tests for the synthetic sample sheet generator."""
+import pytest
+
+from check_my_sample_sheet.synthetic import ERRORS, generate_sample_sheet
+from check_my_sample_sheet.validation import run_validation
+
+
+@pytest.mark.parametrize("version", ["v1", "v2"])
+@pytest.mark.parametrize("lanes,dual_index", [(1, True), (4, False)])
+def test_clean_sheets_have_no_error(version, lanes, dual_index):
+    result = run_validation(generate_sample_sheet(200, version, lanes, dual_index))
+    assert result.version == version
+    assert result.is_valid
+    assert len(result.df) == 200
+    assert ("lane" in result.df.columns) == (lanes > 1)
+    assert ("index2" in result.df.columns) == dual_index
+
+
+@pytest.mark.parametrize("version", ["v1", "v2"])
+@pytest.mark.parametrize("error", sorted(ERRORS))
+def test_injected_errors_are_reported(version, error):
+    result = run_validation(generate_sample_sheet(50, version, lanes=2, errors=[error]))
+    assert not result.is_valid
+
+
+def test_generation_is_deterministic():
+    assert generate_sample_sheet(20, seed=1) == generate_sample_sheet(20, seed=1)
+    assert generate_sample_sheet(20, seed=1) != generate_sample_sheet(20, seed=2)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        generate_sample_sheet(10, version="v3")
+    with pytest.raises(ValueError):
+        generate_sample_sheet(10, errors=["unknown"])
+    with pytest.raises(ValueError):
+        generate_sample_sheet(17, index_length=2)
@@ -0,0 +1,101 @@
+"""Tests for the reading of uploaded files."""
+import bz2
+import gzip
+import io
+import tracemalloc
+import zipfile
+
+from check_my_sample_sheet.uploads import read_uploads, read_zip
+
+
+class FakeUpload(io.BytesIO):
+    """Stand-in for Streamlit's UploadedFile (a BytesIO with a name)."""
+
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_plain_files():
+    sheets = read_uploads([FakeUpload("a.csv", b"[Data]\n"), FakeUpload("b.txt", b"\x00\x01")])
+    assert [sheet.name for sheet in sheets] == ["a.csv", "b.txt"]
+    assert sheets[0].text == "[Data]\n"
+    assert sheets[1].text is None
+    assert "Binary content" in sheets[1].error
+
+
+def test_zip_members_are_expanded():
+    data = make_zip(
+        {
+            "run1/SampleSheet.csv": "[Data]\n",
+            "run2/SampleSheet.CSV": "[Data]\nSample_ID,index\n",
+            "run2/readme.pdf": "not a sheet",
+            "__MACOSX/run1/._SampleSheet.csv": "metadata",
+            "run1/.hidden.csv": "",
+        }
+    )
+    sheets = read_uploads([FakeUpload("week.zip", data)])
+    assert [sheet.name for sheet in sheets] == ["week.zip/run1/SampleSheet.csv", "week.zip/run2/SampleSheet.CSV"]
+    assert all(sheet.error is None for sheet in sheets)
+
+
+def test_invalid_or_empty_zip():
+    assert read_zip("bad.zip", b"not a zip")[0].error == "Not a valid zip archive"
+    assert "No .csv" in read_zip("empty.zip", make_zip({"notes.md": "x"}))[0].error
+
+
+def test_no_upload():
+    assert read_uploads(None) == []
+
+
+def test_preflight_report_is_attached():
+    data = make_zip({"ok.csv": "\ufeff[Data]\nSample_ID,index\n", "broken.csv": "[Header]\nIEMFileVersion,4\n"})
+    ok, broken = read_uploads([FakeUpload("run.zip", data)])
+    assert ok.text == "[Data]\nSample_ID,index\n"
+    assert [issue["name"] for issue in ok.preflight.issues] == ["preflight_bom"]
+    assert broken.text is None
+    assert broken.error.startswith("No [Data] section")
+    assert read_zip("bad.zip", b"not a zip")[0].preflight is None
+
+
+def test_compressed_sheets(valid_sample_sheet):
+    data = valid_sample_sheet.encode("utf-8")
+    sheets = read_uploads([FakeUpload("a.csv.gz", gzip.compress(data)), FakeUpload("b.csv.bz2", bz2.compress(data))])
+    assert [sheet.text for sheet in sheets] == [valid_sample_sheet, valid_sample_sheet]
+    assert sheets[0].preflight.bytes == len(data)
+
+    broken = read_uploads([FakeUpload("c.csv.gz", b"not gzip"), FakeUpload("d.csv.bz2", bz2.compress(data)[:50])])
+    assert broken[0].text is None and broken[0].error.startswith("Not a valid gzip file")
+    assert broken[1].text is None and broken[1].error.startswith("Not a valid bzip2 file")
+
+
+def test_decompression_bombs_are_stopped(monkeypatch):
+    from check_my_sample_sheet import preflight
+
+    monkeypatch.setattr(preflight, "MAX_SHEET_SIZE", 10**6)
+    # 64 MB of text compressed to about 60 KB
+    bomb = gzip.compress(b"[Data]\n" + b"A" * 64 * 10**6, compresslevel=9)
+    tracemalloc.start()
+    try:
+        [sheet] = read_uploads([FakeUpload("bomb.csv.gz", bomb)])
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert sheet.text is None
+    assert "larger than" in sheet.error
+    # bounded by the text read before the limit, not by the decompressed size
+    assert peak < 3 * 10**6
+
+    # members of an archive share a budget of decompressed bytes
+    archive = make_zip({f"sheet{i}.csv": "[Data]\n" + "A" * 400_000 for i in range(5)})
+    sheets = read_zip("big.zip", archive, max_size=10**6)
+    assert [sheet.text is not None for sheet in sheets] == [True, True, False, False, False]
+    assert sheets[-1].error == "Not read: the archive expands to too many bytes"
@@ -0,0 +1,135 @@
+"""Unit tests for the validation core."""
+import pytest
+from sequana import iem
+
+from check_my_sample_sheet.samplesheet import TextSampleSheet
+from check_my_sample_sheet.validation import (
+    get_validation_cache,
+    normalize_sample_sheet,
+    quick_fix,
+    quick_fix_diff,
+    run_validation,
+    sample_sheet_digest,
+    validate_many,
+    validate_sample_sheet,
+)
+
+
+def test_normalize_line_endings():
+    assert normalize_sample_sheet("a\r\nb\rc\n") == "a\nb\nc\n"
+
+
+def test_digest_ignores_line_endings():
+    assert sample_sheet_digest("[Data]\r\nSample_ID,index\r\n") == sample_sheet_digest("[Data]\nSample_ID,index\n")
+    assert sample_sheet_digest("[Data]\n") != sample_sheet_digest("[Data]\nSample_ID\n")
+
+
+def test_valid_sample_sheet(valid_sample_sheet):
+    result = run_validation(valid_sample_sheet)
+    assert result.version == "v1"
+    assert result.is_valid
+    assert not result.has_errors
+    assert "sample_id" in result.df.columns
+
+
+def test_invalid_sample_sheet(invalid_sample_sheet):
+    result = run_validation(invalid_sample_sheet)
+    assert not result.is_valid
+    assert result.has_errors
+    assert result.error.startswith("❌")
+
+
+def test_v2_sample_sheet(examples_dir):
+    result = run_validation((examples_dir / "sample_sheet_v2_bclconvert.csv").read_text())
+    assert result.version == "v2"
+
+
+def test_repeated_submission_is_served_from_cache(valid_sample_sheet):
+    cache = get_validation_cache()
+    cache.clear()
+    first = validate_sample_sheet(valid_sample_sheet)
+    second = validate_sample_sheet(valid_sample_sheet.replace("\n", "\r\n"))
+    assert first is second
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_use_cache_false_bypasses_cache(valid_sample_sheet):
+    cache = get_validation_cache()
+    cache.clear()
+    validate_sample_sheet(valid_sample_sheet, use_cache=False)
+    assert len(cache) == 0
+
+
+def test_single_pass(monkeypatch, invalid_sample_sheet):
+    """The sheet is scanned once and the check suite runs once."""
+    calls = {"scan": 0, "checker": 0}
+    scan, checker = TextSampleSheet._scan_sections, iem.SampleSheet.checker
+
+    def counting_scan(self):
+        calls["scan"] += 1
+        return scan(self)
+
+    def counting_checker(self):
+        calls["checker"] += 1
+        return checker(self)
+
+    monkeypatch.setattr(TextSampleSheet, "_scan_sections", counting_scan)
+    monkeypatch.setattr(iem.SampleSheet, "checker", counting_checker)
+    result = run_validation(invalid_sample_sheet)
+    assert calls == {"scan": 1, "checker": 1}
+    assert result.seconds > 0
+
+
+def test_error_matches_sequana_validate(examples_dir):
+    for name in ["Bad_SampleSheet_alphanum.csv", "Bad_SampleSheet_extra_semicolons.csv", "case3.csv"]:
+        filename = examples_dir / name
+        with pytest.raises(SystemExit) as err:
+            iem.SampleSheetFactory(str(filename)).validate()
+        assert run_validation(filename.read_text()).error == str(err.value)
+
+
+def test_validate_many(examples_dir):
+    cache = get_validation_cache()
+    cache.clear()
+    sheets = [(examples_dir / name).read_text() for name in ("case1.csv", "case2.csv", "sample_sheet.csv")]
+    validate_sample_sheet(sheets[2])
+    results = validate_many([*sheets, sheets[0]], jobs=2)
+    assert [result.digest for result in results] == [sample_sheet_digest(sheet) for sheet in [*sheets, sheets[0]]]
+    # the same sheet twice is validated once; the cached one is not validated again
+    assert results[0] is results[3]
+    assert results[2] is validate_sample_sheet(sheets[2])
+    assert [result.is_valid for result in results[:3]] == [True, False, True]
+    assert validate_many(sheets, jobs=1)[1] is results[1]
+
+
+def test_quick_fix_is_computed_on_demand(examples_dir):
+    samplesheet = (examples_dir / "Bad_SampleSheet_extra_semicolons.csv").read_text()
+    fixed = quick_fix(samplesheet)
+    assert ";" not in fixed
+    assert quick_fix(samplesheet) is fixed
+
+    diff, omitted = quick_fix_diff(samplesheet, fixed)
+    assert omitted == 0
+    lines = diff.splitlines()
+    assert lines[:2] == ["--- original", "+++ corrected"]
+    removed = [line for line in lines if line.startswith("-") and not line.startswith("---")]
+    added = [line for line in lines if line.startswith("+") and not line.startswith("+++")]
+    assert (
+        len(removed) == len(added) == sum(old != new for old, new in zip(samplesheet.splitlines(), fixed.splitlines()))
+    )
+    assert quick_fix_diff(fixed, fixed) == ("", 0)
+
+
+def test_quick_fix_diff_hunks():
+    before = "\n".join(f"line{i}" for i in range(20))
+    after = before.replace("line3", "LINE3").replace("line5", "LINE5").replace("line15", "LINE15")
+    diff, _ = quick_fix_diff(before, after)
+    lines = diff.splitlines()
+    # lines 3 and 5 share a hunk (one unchanged line between them), line 15 has its own
+    assert [line for line in lines if line.startswith("@@")] == ["@@ -3,5 +3,5 @@", "@@ -15,3 +15,3 @@"]
+    assert lines[3:6] == [" line2", "-line3", "+LINE3"]
+
+    diff, omitted = quick_fix_diff(before, after, max_lines=4)
+    assert len(diff.splitlines()) == 4
+    assert omitted == len(lines) - 4
@@ -0,0 +1,159 @@
+"""Tests for the ``watch`` subcommand."""
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from check_my_sample_sheet import __main__ as entry_point
+from check_my_sample_sheet.watch import (
+    SheetWatcher,
+    _polling_loop,
+    _watchdog_observer,
+    main,
+    report_path,
+)
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def run_folder(tmp_path, valid_sample_sheet):
+    run = tmp_path / "run1"
+    run.mkdir()
+    (run / "SampleSheet.csv").write_text(valid_sample_sheet)
+    (run / "notes.csv").write_text("not a sheet")
+    return tmp_path
+
+
+def test_once_validates_sheets_without_report(run_folder):
+    stdout = io.StringIO()
+    log = run_folder / "checks.ndjson"
+    assert main([str(run_folder), "--once", "--log", str(log)], stdout=stdout) == 0
+
+    sheet = run_folder / "run1" / "SampleSheet.csv"
+    report = json.loads(report_path(sheet).read_text())
+    assert report["file"] == str(sheet)
+    assert report["valid"] is True
+    assert report["preflight"] == []
+    assert json.loads(stdout.getvalue()) == report
+    assert json.loads(log.read_text()) == report
+    assert not (run_folder / "run1" / "notes.csv.check.json").exists()
+
+    # up-to-date reports: nothing to do
+    stdout = io.StringIO()
+    main([str(run_folder), "--once"], stdout=stdout)
+    assert stdout.getvalue() == ""
+
+
+def test_broken_sheet_report(tmp_path):
+    (tmp_path / "SampleSheet_bad.csv").write_bytes(
+        "[Header]\nInvestigator,Lemée,".encode("utf-8") + "Lemée\n".encode("latin-1")
+    )
+    main([str(tmp_path), "--once", "--quiet"])
+    report = json.loads(report_path(tmp_path / "SampleSheet_bad.csv").read_text())
+    assert report["valid"] is False
+    assert "UTF-8" in report["exception"]
+    assert report["preflight"][0]["line"] == 2
+
+
+def test_debounce(tmp_path, valid_sample_sheet):
+    timer = FakeTimer()
+    records = []
+    watcher = SheetWatcher([tmp_path], debounce=2.0, on_record=lambda path, record: records.append(record), timer=timer)
+    sheet = tmp_path / "SampleSheet.csv"
+    sheet.write_text(valid_sample_sheet)
+
+    watcher.notify(str(sheet))
+    watcher.notify(str(tmp_path / "other.txt"))
+    timer.now = 1.5
+    watcher.notify(str(sheet))  # a second write restarts the quiet period
+    timer.now = 3.0
+    assert watcher.due() == ([], 0.5)
+    timer.now = 3.5
+    ready, wait = watcher.due()
+    assert ready == [str(sheet)] and wait is None
+
+    assert watcher.process(ready[0])["valid"] is True
+    # unchanged since the last validation
+    assert watcher.process(ready[0]) is None
+    assert watcher.validations == 1
+
+
+def test_polling_detects_new_and_modified_sheets(tmp_path, valid_sample_sheet, invalid_sample_sheet):
+    records = []
+    watcher = SheetWatcher([tmp_path], debounce=0.05, on_record=lambda path, record: records.append(record))
+    thread = threading.Thread(target=watcher.run, daemon=True)
+    thread.start()
+    threading.Thread(target=_polling_loop, args=(watcher, 0.05), daemon=True).start()
+    try:
+        sheet = tmp_path / "deep" / "run" / "SampleSheet.csv"
+        sheet.parent.mkdir(parents=True)
+        sheet.write_text(valid_sample_sheet)
+        _wait_for(lambda: len(records) == 1)
+        assert records[0]["valid"] is True
+
+        sheet.write_text(invalid_sample_sheet)
+        os.utime(sheet, ns=(time.time_ns(), time.time_ns() + 10**9))
+        _wait_for(lambda: len(records) == 2)
+        assert records[1]["valid"] is False
+    finally:
+        watcher.stop()
+        thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_inotify_events(tmp_path, valid_sample_sheet):
+    pytest.importorskip("watchdog")
+    records = []
+    watcher = SheetWatcher([tmp_path], debounce=0.05, on_record=lambda path, record: records.append(record))
+    observer = _watchdog_observer(watcher)
+    thread = threading.Thread(target=watcher.run, daemon=True)
+    thread.start()
+    try:
+        (tmp_path / "SampleSheet.csv").write_text(valid_sample_sheet)
+        _wait_for(lambda: len(records) == 1)
+        assert records[0]["valid"] is True
+    finally:
+        watcher.stop()
+        observer.stop()
+        observer.join()
+        thread.join(5)
+
+
+def test_events_require_watchdog(monkeypatch, capsys, tmp_path):
+    from check_my_sample_sheet import watch
+
+    monkeypatch.setattr(watch, "_watchdog_observer", lambda watcher: None)
+    with pytest.raises(SystemExit):
+        main([str(tmp_path), "--events"])
+    assert 'pip install "check-my-sample-sheet[watch]"' in capsys.readouterr().err
+
+
+def test_missing_directory(tmp_path):
+    with pytest.raises(SystemExit):
+        main([str(tmp_path / "missing")])
+
+
+def test_entry_point_dispatches_watch(monkeypatch, run_folder):
+    monkeypatch.setattr(sys, "argv", ["check-my-sample-sheet", "watch", "--once", "-q", str(run_folder)])
+    with pytest.raises(SystemExit) as err:
+        entry_point.main()
+    assert err.value.code == 0
+    assert report_path(run_folder / "run1" / "SampleSheet.csv").exists()
+
+
+def _wait_for(condition, timeout=20):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
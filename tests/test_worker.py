@@ -0,0 +1,105 @@
+"""Tests of the background validation jobs (time and memory limits, cancellation)."""
+import sys
+import time
+import types
+
+import pytest
+
+from check_my_sample_sheet import worker
+from check_my_sample_sheet.samplesheet import section_memo
+from check_my_sample_sheet.validation import run_validation
+from check_my_sample_sheet.worker import (
+    ValidationCancelled,
+    ValidationFailed,
+    ValidationJob,
+    ValidationMemoryError,
+    ValidationTimeout,
+)
+
+
+# run in the worker process: must be importable
+def sleep(samplesheet, digest, memo=None):
+    time.sleep(30)
+
+
+def allocate(samplesheet, digest, memo=None):
+    return bytearray(4 * 1024**3)
+
+
+def fail(samplesheet, digest, memo=None):
+    raise ValueError("bad sheet")
+
+
+def test_job_result(valid_sample_sheet):
+    memo = section_memo()
+    job = ValidationJob(valid_sample_sheet, memo=memo)
+    result = job.result()
+    assert job.state == "done"
+    assert job.elapsed > 0
+    assert result.checks == run_validation(valid_sample_sheet).checks
+    # the memo filled by the worker comes back with the job
+    assert len(job.memo) > 0
+    assert len(memo) == 0
+
+    edited = valid_sample_sheet.replace("Investigator Name,", "Investigator Name,someone", 1)
+    again = ValidationJob(edited, memo=job.memo)
+    again.result()
+    assert again.memo.hits > job.memo.hits
+
+
+def test_main_script_is_not_run_by_the_worker(monkeypatch, tmp_path, valid_sample_sheet):
+    # as under ``streamlit run``, where __main__ is the page script: the worker imports it
+    # as __mp_main__, and the page behind its main guard does not run
+    script = tmp_path / "page.py"
+    script.write_text("if __name__ == '__main__':\n    raise RuntimeError('page script run in the worker')\n")
+    main = types.ModuleType("__main__")
+    main.__file__ = str(script)
+    monkeypatch.setitem(sys.modules, "__main__", main)
+    assert ValidationJob(valid_sample_sheet + "\n").result().is_valid
+    assert sys.modules["__main__"] is main
+
+
+def test_time_limit(valid_sample_sheet):
+    job = ValidationJob(valid_sample_sheet, time_limit=0.5, function=sleep)
+    with pytest.raises(ValidationTimeout, match="longer than 0.5 seconds"):
+        job.result()
+    assert job.elapsed < 10
+
+
+def test_memory_limit(valid_sample_sheet):
+    job = ValidationJob(valid_sample_sheet, memory_limit=1024, function=allocate)
+    with pytest.raises(ValidationMemoryError, match="1024 MB"):
+        job.result()
+
+
+def test_error_in_worker(valid_sample_sheet):
+    with pytest.raises(ValidationFailed, match="ValueError: bad sheet"):
+        ValidationJob(valid_sample_sheet, function=fail).result()
+
+
+def test_cancel(valid_sample_sheet):
+    job = ValidationJob(valid_sample_sheet, function=sleep)
+    while job.state == "queued":
+        time.sleep(0.01)
+    job.cancel()
+    assert job.wait(1)
+    with pytest.raises(ValidationCancelled):
+        job.result()
+
+
+def test_jobs_wait_for_a_slot(monkeypatch, valid_sample_sheet):
+    monkeypatch.setattr(worker, "_slots", worker.threading.BoundedSemaphore(1))
+    first = ValidationJob(valid_sample_sheet, function=sleep)
+    second = ValidationJob(valid_sample_sheet, function=sleep)
+    while first.state == "queued":
+        time.sleep(0.01)
+    assert second.state == "queued"
+    assert second.elapsed == 0
+
+    # cancelled while queued: never started
+    second.cancel()
+    first.cancel()
+    assert first.wait(5)
+    with pytest.raises(ValidationCancelled):
+        second.result()
+    assert second.started is None